@@ -7,12 +7,12 @@ from datetime import datetime, date
 import time
 import streamlit as st
 import tempfile
-from azure.storage.blob import BlobServiceClient, ContentSettings
 import uuid, hashlib, os, tempfile
 import dotenv
 from pathlib import Path
 import requests
 import base64
+import random
 from PIL import Image
 import io
 
@@ -29,12 +29,27 @@ from db_utils import (
     insert_policy, fetch_data, insert_claim, insert_upload_document, update_document_unique_id
 )
 from db_utils import (
-    insert_policy, fetch_data, insert_claim, insert_upload_document, update_document_unique_id,
+    insert_policy, fetch_data, fetch_latest_policy, fetch_latest_claim, insert_claim,
+    insert_upload_document, update_document_unique_id,
     log_app_event, log_document_operation, log_error, log_performance, insert_cv_metadata,
     update_cv_metadata_claim_link, fetch_cv_metadata_by_claim_uid, fetch_cv_metadata_by_reference,
     insert_ml_prediction_metadata, update_ml_prediction_policy_link, 
-    fetch_ml_predictions_by_policy_uid, fetch_ml_predictions_by_reference
+    fetch_ml_predictions_by_policy_uid, fetch_ml_predictions_by_reference,
+    lookup_duplicate_documents, reusable_extraction, lookup_cv_analysis
 )
+from blob_storage import download_bytes, upload_bytes, upload_stream
+from concurrent.futures import as_completed
+from concurrency import script_context_executor
+from document_ai import (
+    EXTRACTION_JOB_KIND, cancel_extraction_job, enqueue_extraction_job, enqueue_record_documents_job,
+    record_extracted_documents, start_extraction_workers
+)
+from extraction_cache import get_cached_extraction
+from image_preprocessing import prepare_cv_image
+from ingest import ingest_upload
+from session_blob_store import get_session_blob_store
+from thumbnail_cache import base64_key, get_thumbnail_cache
+from job_queue import JOB_FAILED, JOB_SUCCEEDED, get_job_queue
 
 dotenv.load_dotenv(Path(__file__).parent.parent / ".env")
 
@@ -42,6 +57,14 @@ AZURE_CONNECTION_STRING = os.getenv("AZURE_CONNECTION_STRING")
 AZURE_CONTAINER_NAME = os.getenv("AZURE_CONTAINER_NAME")
 API_URL = os.getenv("API_URL")
 API_CODE = os.getenv("API_CODE")
+UPLOAD_MAX_WORKERS = int(os.getenv("UPLOAD_MAX_WORKERS", "4"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "2"))
+CV_MAX_WORKERS = int(os.getenv("CV_MAX_WORKERS", "4"))
+CV_MAX_RETRIES = int(os.getenv("CV_MAX_RETRIES", "2"))
+CV_RETRY_BACKOFF = float(os.getenv("CV_RETRY_BACKOFF", "1"))
+CV_TIMEOUT = float(os.getenv("CV_TIMEOUT", "120"))
+CV_CACHE_ENABLED = os.getenv("CV_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+CV_LATENCY_SAMPLE_RATE = float(os.getenv("CV_LATENCY_SAMPLE_RATE", "0"))
 
 
 # Ensure the parent directory is in sys.path for imports
@@ -74,39 +97,6 @@ def _clear_new_claim_generated_keys():
         if k in st.session_state:
             del st.session_state[k]
 
-def _fetch_latest_policy(policy_no: str):
-    """Pick the newest row for this policy number"""
-    query = f"""
-        SELECT TOP 1 *
-        FROM New_Policy
-        WHERE POLICY_NO = '{policy_no}'
-        ORDER BY 
-            CASE WHEN Submission_Date IS NULL THEN 1 ELSE 0 END ASC,
-            Submission_Date DESC,
-            Unique_ID DESC
-    """
-    return fetch_data(query)
-
-def _fetch_latest_claims(claim_no: str):
-    """Pick the newest row for this claim number"""
-    query = f"""
-        SELECT TOP 1 *
-        FROM New_Claims
-        WHERE CLAIM_NO = '{claim_no}'
-        ORDER BY 
-            CASE WHEN Submission_Date IS NULL THEN 1 ELSE 0 END ASC,
-            Submission_Date DESC,
-            Unique_ID DESC
-    """
-    return fetch_data(query)
-
-
-
-
-
-
-
-
 
 # Add this helper function at the top of your file after imports
 def clear_session_state():
@@ -126,12 +116,23 @@ def clear_session_state():
         "claim_no",
 
         # GUID storage keys
-        "document_guids"  # NEW: Store GUIDs for form submission
+        "document_guids",  # NEW: Store GUIDs for form submission
+
+        # Background extraction job
+        "extraction_job_id", "extraction_file_count"
     ]
     
     for key in keys_to_delete:
         if key in st.session_state:
             del st.session_state[key]
+
+    # Damage analyses and image toggles hold handles into the session blob store
+    for key in list(st.session_state.keys()):
+        if key.startswith(("damage_analysis_", "show_full_image_", "show_full_annotated_")):
+            del st.session_state[key]
+    if "blob_session_id" in st.session_state:
+        get_session_blob_store().release_session(st.session_state.blob_session_id)
+        del st.session_state["blob_session_id"]
             
     # Hard reset for page state
     st.session_state.policy_edit_page = "main"
@@ -177,275 +178,510 @@ def display_upload_summary(document_records, json_data):
     with col3:
         st.metric("Transaction Type", document_records[0]['Transaction_Type'] if document_records else "N/A")
 
-def compute_file_hash(file_path):
-    """Compute SHA-256 hash of file"""
-    hasher = hashlib.sha256()
-    with open(file_path, 'rb') as f:
-        hasher.update(f.read())
-    return hasher.hexdigest()
-
 def compute_image_hash(image_bytes):
     """Compute SHA-256 hash of image bytes"""
     hasher = hashlib.sha256()
     hasher.update(image_bytes)
     return hasher.hexdigest()
 
-def upload_to_blob(file_path, blob_name, metadata):
-    """Upload file to Azure Blob Storage"""
-    blob_service_client = BlobServiceClient.from_connection_string(AZURE_CONNECTION_STRING)
-    blob_client = blob_service_client.get_blob_client(container=AZURE_CONTAINER_NAME, blob=blob_name)
+def upload_to_blob(data, blob_name, metadata, length=None):
+    """Stream file data to Azure Blob Storage"""
+    return upload_stream(data, blob_name, metadata=metadata, content_type="application/octet-stream", length=length)
 
-    with open(file_path, "rb") as data:
-        blob_client.upload_blob(data, overwrite=True, metadata=metadata,
-            content_settings=ContentSettings(content_type="application/octet-stream"))
 
-    return blob_client.url
+def upload_ingested_file(document, existing=None):
+    """Push one ingested upload (see ingest.IngestedFile) to blob storage.
 
+    ``existing`` is a prior document row with the same hash; its blob is
+    linked instead of uploading the bytes again.
+
+    Runs on an upload worker thread, so it must not render anything with st.*;
+    the caller logs and displays the returned result.
+    """
+    file_start_time = time.time()
+
+    original_filename = document.name
+    file_extension = os.path.splitext(original_filename)[1]
+    guid = str(uuid.uuid4())
+    file_hash = document.sha256
+
+    if existing:
+        # Point at the blob that is already stored, under the name it was stored as
+        unique_filename = existing["Unique_File_Name"]
+        blob_url = existing["Blob_Link"]
+    else:
+        # Create unique filename with timestamp
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")[:17]
+        unique_filename = f"{timestamp}_{file_hash[:8]}_{guid[:4]}{file_extension}"
+
+        # Upload to Azure Blob Storage
+        metadata = {
+            "guid": guid,
+            "original_filename": original_filename,
+            "unique_filename": unique_filename,
+            "file_hash": file_hash,
+            "upload_date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "file_size": str(document.size)
+        }
+        with document.open() as data:
+            blob_url = upload_to_blob(
+                data=data,
+                blob_name=unique_filename,
+                metadata=metadata,
+                length=document.size
+            )
+
+    return {
+        "document_record": {
+            "Hash": file_hash,
+            "Unique_File_Name": unique_filename,
+            "Original_File_Name": original_filename,
+            "GUID": guid,
+            "Blob_Link": blob_url,
+            "UploadDate": datetime.now(),
+            "ProcessingStatus": "Processing"
+        },
+        "deduplicated": bool(existing),
+        "execution_time_ms": int((time.time() - file_start_time) * 1000)
+    }
 
-def upload_image_to_blob_storage(image_bytes, blob_name, metadata):
-    """Upload image to Azure Blob Storage with metadata"""
-    try:
-        blob_service_client = BlobServiceClient.from_connection_string(AZURE_CONNECTION_STRING)
-        blob_client = blob_service_client.get_blob_client(
-            container=AZURE_CONTAINER_NAME, 
-            blob=blob_name
-        )
-        
-        # Upload the blob with metadata
-        blob_client.upload_blob(
-            image_bytes, 
-            overwrite=True,
-            metadata=metadata,
-            content_settings=ContentSettings(content_type="image/jpeg")
-        )
-        
-        # Return the blob URL
-        return blob_client.url
-        
-    except Exception as e:
-        st.error(f"Failed to upload to blob storage: {e}")
-        return None
 
 ####################CV END POINT#######################
 
 
-def analyze_image_damage(image_data, filename):
-    """Send image to CV endpoint for damage analysis"""
-    try:
-        # CV API endpoint
-        cv_endpoint = os.getenv("CV_ENDPOINT")
+def call_cv_endpoint(image_bytes, filename, max_retries=None):
+    """POST one image to the CV endpoint and return its JSON response.
 
+    The image is downscaled and re-encoded first (see prepare_cv_image); the
+    caller's original bytes are what gets archived. Timeouts, connection
+    errors, 429 and 5xx responses are retried with exponential backoff up to
+    ``max_retries`` times (CV_MAX_RETRIES by default); anything else raises
+    straight away. Makes no st.* calls, so it is safe to run on worker threads.
+    """
+    if max_retries is None:
+        max_retries = CV_MAX_RETRIES
+    cv_endpoint = os.getenv("CV_ENDPOINT")
+    payload, payload_name, content_type, stats = prepare_cv_image(image_bytes, filename)
+    attempt = 0
+    while True:
+        request_start = time.time()
         try:
-            # payload = {
-            #     "image": image_data, 
-            #     "filename": filename
-            # }
-            image_bytes = base64.b64decode(image_data)
             files = {
-                'file': (filename, image_bytes, 'image/jpeg')  # Use 'file' as field name
+                'file': (payload_name, payload, content_type)  # Use 'file' as field name
             }
-            
-            
-            headers = {
-                "Content-Type": "application/json",
-                "Accept": "application/json"
+            response = requests.post(cv_endpoint, files=files, timeout=CV_TIMEOUT)
+            if response.status_code == 200:
+                cv_request_ms = int((time.time() - request_start) * 1000)
+                original_request_ms = None
+                if stats["preprocessed"] and random.random() < CV_LATENCY_SAMPLE_RATE:
+                    original_request_ms = time_original_cv_request(cv_endpoint, image_bytes, filename)
+                log_cv_preprocessing(filename, stats, cv_request_ms, attempt, original_request_ms)
+                return response.json()
+            error = requests.exceptions.HTTPError(
+                f"CV endpoint returned {response.status_code} - {response.text}", response=response
+            )
+            retryable = response.status_code == 429 or response.status_code >= 500
+        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+            error = e
+            retryable = True
+
+        if not retryable or attempt >= max_retries:
+            raise error
+        attempt += 1
+        delay = CV_RETRY_BACKOFF * (2 ** (attempt - 1))
+        log_app_event(
+            log_level="WARNING",
+            message=f"CV analysis of {filename} failed; retry {attempt}/{max_retries} in {delay:.1f}s",
+            module_name="auto_loader",
+            action_type="CV_RETRY",
+            function_name="call_cv_endpoint",
+            file_name=filename,
+            additional_data={
+                "attempt": attempt,
+                "max_retries": max_retries,
+                "delay_seconds": round(delay, 2),
+                "error": str(error),
             }
-            
-            with st.spinner("Analyzing damage with Computer Vision..."):
-                # response = requests.post(cv_endpoint, json=payload, headers=headers, timeout=30)
-                response = requests.post(cv_endpoint, files=files, timeout=120)
+        )
+        time.sleep(delay)
 
 
-            
-            if response.status_code == 200:
-                return response.json()
-            else:
-                print(f"JSON method failed: {response.status_code} - {response.text}")
-        except Exception as json_error:
-            print(f"JSON method error: {json_error}")
-            
+def time_original_cv_request(cv_endpoint, image_bytes, filename):
+    """Milliseconds to send the original image once, or None if the request fails"""
+    request_start = time.time()
+    try:
+        response = requests.post(cv_endpoint, files={'file': (filename, image_bytes, "image/jpeg")}, timeout=CV_TIMEOUT)
+    except requests.exceptions.RequestException:
+        return None
+    return int((time.time() - request_start) * 1000) if response.status_code == 200 else None
+
+
+def log_cv_preprocessing(filename, stats, cv_request_ms, retries, original_request_ms=None):
+    """Record what preprocessing saved for one image and what it cost.
+
+    For the CV_LATENCY_SAMPLE_RATE share of images the original is sent as
+    well, and latency_delta_ms is the time saved including preprocessing.
+    """
+    latency_delta_ms = None
+    if original_request_ms is not None:
+        latency_delta_ms = original_request_ms - (cv_request_ms + stats["preprocess_ms"])
+    log_app_event(
+        log_level="INFO",
+        message=f"CV image preprocessing saved {stats['bytes_saved']} bytes for {filename}",
+        module_name="auto_loader",
+        action_type="CV_IMAGE_PREPROCESS",
+        function_name="call_cv_endpoint",
+        file_name=filename,
+        file_size_kb=round(stats["original_bytes"] / 1024, 2),
+        execution_time_ms=stats["preprocess_ms"] + cv_request_ms,
+        additional_data={
+            **stats,
+            "cv_request_ms": cv_request_ms,
+            "original_request_ms": original_request_ms,
+            "latency_delta_ms": latency_delta_ms,
+            "retries": retries,
+        }
+    )
+
+
+def analyze_image_damage(image_data, filename):
+    """Send image to CV endpoint for damage analysis"""
+    try:
+        image_bytes = base64.b64decode(image_data)
+        with st.spinner("Analyzing damage with Computer Vision..."):
+            return call_cv_endpoint(image_bytes, filename)
     except requests.exceptions.Timeout:
         st.error("Request timed out. The analysis is taking longer than expected.")
         return None
     except requests.exceptions.ConnectionError:
         st.error("Connection error. Please check your internet connection.")
         return None
+    except requests.exceptions.HTTPError as e:
+        print(f"CV analysis failed: {e}")
+        return None
     except Exception as e:
         st.error(f"Error analyzing image: {str(e)}")
         return None
-    
-##################
-def analyze_image_damage_with_storage(image_data, filename, created_by="system", claim_uid=None):
-    """Send image to CV endpoint for damage analysis and store results in database and blob"""
-    try:
-        # Generate unique identifiers
-        normal_guid = str(uuid.uuid4())
-        annotated_guid = str(uuid.uuid4())
-        
-        # Create unique names with timestamp
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")[:17]
-        file_extension = filename.split('.')[-1] if '.' in filename else 'jpg'
-        normal_unique_name = f"normal_{timestamp}_{normal_guid[:8]}.{file_extension}"
-        annotated_unique_name = f"annotated_{timestamp}_{annotated_guid[:8]}.{file_extension}"
-        
-        # Call CV API
-        cv_response = analyze_image_damage(image_data, filename)
-        
-        if cv_response:
-            # Decode normal image and compute hash
-            normal_blob_link = None
-            normal_image_hash = None
-            if image_data:
-                try:
-                    # Decode and upload normal image
-                    image_bytes = base64.b64decode(image_data)
-                    normal_image_hash = compute_image_hash(image_bytes)
-                    
-                    # Create metadata for normal image
-                    normal_metadata = {
-                        "type": "normal_image",
-                        "guid": normal_guid,
-                        "original_filename": filename,
-                        "unique_filename": normal_unique_name,
-                        "upload_date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                        "file_size": str(len(image_bytes)),
-                        "claim_uid": claim_uid or "",
-                        "created_by": created_by,
-                        "image_type": "damage_assessment",
-                        "hash": normal_image_hash
-                    }
-                    
-                    normal_blob_link = upload_image_to_blob_storage(
-                        image_bytes, 
-                        normal_unique_name, 
-                        normal_metadata
-                    )
-                    
-                    if normal_blob_link:
-                        st.success(f"✅ Normal image uploaded to blob storage")
-                    
-                except Exception as blob_error:
-                    st.warning(f"Failed to upload normal image to blob: {blob_error}")
-            
-            # Upload annotated image to blob storage
-            annotated_blob_link = None
-            annotated_image_hash = None
-            annotated_image_b64 = cv_response.get("annotated_image_b64")
-            if annotated_image_b64:
-                try:
-                    # Decode and upload annotated image
-                    annotated_bytes = base64.b64decode(annotated_image_b64)
-                    annotated_image_hash = compute_image_hash(annotated_bytes)
-                    
-                    # Create metadata for annotated image
-                    annotated_metadata = {
-                        "type": "annotated_image",
-                        "guid": annotated_guid,
-                        "original_filename": f"annotated_{filename}",
-                        "unique_filename": annotated_unique_name,
-                        "upload_date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                        "file_size": str(len(annotated_bytes)),
-                        "claim_uid": claim_uid or "",
-                        "created_by": created_by,
-                        "image_type": "damage_assessment_annotated",
-                        "hash": annotated_image_hash
-                    }
-                    
-                    annotated_blob_link = upload_image_to_blob_storage(
-                        annotated_bytes, 
-                        annotated_unique_name, 
-                        annotated_metadata
-                    )
-                    
-                    if annotated_blob_link:
-                        # st.success(f"Annotated image uploaded to blob storage")
-                        print(f"Annotated image uploaded to blob storage")
 
-                    
-                except Exception as blob_error:
-                    st.warning(f"Failed to upload annotated image to blob: {blob_error}")
-            
-            # Extract CV analysis data from response
-            analysis = cv_response.get("analysis", cv_response)
-            detection_result = analysis.get("detection_result", {})
-            severity_assessment = analysis.get("severity_assessment", {})
-            damage_summary = detection_result.get("damage_summary", {})
-
-            cv_analysis_json = {
-                "analysis": {
-                    "detection_result": {
-                        "damage_summary": damage_summary,
-                        "total_detections": detection_result.get("total_detections", 0)
-                    },
-                    "filename": analysis.get("filename", filename),
-                    "severity_assessment": {
-                        "reason": severity_assessment.get("reason", ""),
-                        "severity": severity_assessment.get("severity", "")
-                    }
-                }
-                # ✅ NOTE: Deliberately excluding "annotated_image_b64" to save space
+
+def _upload_cv_image(image_bytes, blob_name, metadata):
+    """Upload one CV image, returning its blob URL (raises on failure)"""
+    return upload_bytes(image_bytes, blob_name, metadata=metadata, content_type="image/jpeg")
+
+
+def reuse_cv_analysis(cached, claim_uid, reference_number, created_by):
+    """Build a CV response from an earlier APP_CV_DATA row for the same image.
+
+    Inserts a new APP_CV_DATA row for this submission that points at the
+    stored JSON and blobs, so linking it to a claim never touches the row
+    another claim owns. The annotated image is not downloaded here; the
+    dashboard loads it from ``annotated_image_unique_name`` when shown.
+    Returns ``(cv_response, warnings)``, or ``(None, [])`` if the stored JSON
+    is unusable and the image should be analyzed again.
+    """
+    try:
+        cv_response = json.loads(cached["JSON"])
+    except (TypeError, ValueError):
+        return None, []
+    if not isinstance(cv_response, dict) or "analysis" not in cv_response:
+        return None, []
+
+    warnings = []
+    cv_response.update({
+        "normal_guid": cached.get("Normal_Image_GUID"),
+        "annotated_guid": cached.get("Annotated_Image_GUID"),
+        "normal_blob_link": cached.get("Normal_Image_Blob_Link"),
+        "annotated_blob_link": cached.get("Annotated_Image_Blob_Link"),
+        "annotated_image_unique_name": cached.get("Annotated_Image_Unique_Name"),
+        "claim_uid": claim_uid,
+        "normal_image_hash": cached.get("Normal_Image_Hash"),
+        "annotated_image_hash": cached.get("Annotated_Image_Hash"),
+        "cache_hit": True
+    })
+
+    cv_metadata = {
+        "normal_image_hash": cached.get("Normal_Image_Hash"),
+        "annotated_image_hash": cached.get("Annotated_Image_Hash"),
+        "normal_image_name": cached.get("Normal_Image_Name"),
+        "normal_image_unique_name": cached.get("Normal_Image_Unique_Name"),
+        "annotated_image_name": cached.get("Annotated_Image_Name"),
+        "annotated_image_unique_name": cached.get("Annotated_Image_Unique_Name"),
+        "normal_image_blob_link": cached.get("Normal_Image_Blob_Link"),
+        "annotated_image_blob_link": cached.get("Annotated_Image_Blob_Link"),
+        "json": cached["JSON"],
+        "normal_image_guid": cached.get("Normal_Image_GUID"),
+        "annotated_image_guid": cached.get("Annotated_Image_GUID"),
+        "total_detections": cached.get("Total_Detections") or 0,
+        "severity": cached.get("Severity"),
+        "severity_reason": cached.get("Severity_Reason"),
+        "dent_count": cached.get("Dent_Count") or 0,
+        "crack_count": cached.get("Crack_Count") or 0,
+        "scratch_count": cached.get("Scratch_Count") or 0,
+        "broken_light_count": cached.get("Broken_Light_Count") or 0,
+        "flat_tire_count": cached.get("Flat_Tire_Count") or 0,
+        "shattered_glass_count": cached.get("Shattered_Glass_Count") or 0,
+        "reference_number": reference_number,
+        "unique_id": claim_uid,
+        "created_by": created_by
+    }
+    try:
+        cv_response["cv_uid"] = insert_cv_metadata(cv_metadata)
+    except Exception as db_error:
+        warnings.append(f"Failed to save CV analysis to database: {db_error}")
+    return cv_response, warnings
+
+
+def analyze_and_store_image(image_bytes, filename, created_by, claim_uid, reference_number, upload_executor):
+    """Analyze one image and store the images and CV metadata.
+
+    An identical image analyzed before (same hash in APP_CV_DATA) reuses
+    that analysis without calling the CV endpoint. Otherwise the normal
+    image is uploaded on ``upload_executor`` while the CV request runs and
+    the annotated image is uploaded as soon as the response arrives.
+    Makes no st.* calls (the reference number is resolved by the caller), so
+    it can run on a worker thread. Returns ``(cv_response, warnings)``;
+    cv_response is None when the analysis itself failed.
+    """
+    normal_image_hash = compute_image_hash(image_bytes)
+    if CV_CACHE_ENABLED:
+        cached = lookup_cv_analysis(normal_image_hash)
+        if cached:
+            cv_response, warnings = reuse_cv_analysis(cached, claim_uid, reference_number, created_by)
+            if cv_response:
+                log_app_event(
+                    log_level="INFO",
+                    message=f"Reused CV analysis {cached['UID']} for {filename}",
+                    module_name="auto_loader",
+                    action_type="CV_CACHE_REUSED",
+                    function_name="analyze_and_store_image",
+                    file_name=filename,
+                    file_hash=normal_image_hash,
+                    additional_data={"cached_cv_uid": cached["UID"], "cv_uid": cv_response.get("cv_uid")}
+                )
+                return cv_response, warnings
+
+    warnings = []
+
+    # Generate unique identifiers
+    normal_guid = str(uuid.uuid4())
+    annotated_guid = str(uuid.uuid4())
+
+    # Create unique names with timestamp
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")[:17]
+    file_extension = filename.split('.')[-1] if '.' in filename else 'jpg'
+    normal_unique_name = f"normal_{timestamp}_{normal_guid[:8]}.{file_extension}"
+    annotated_unique_name = f"annotated_{timestamp}_{annotated_guid[:8]}.{file_extension}"
+
+    normal_metadata = {
+        "type": "normal_image",
+        "guid": normal_guid,
+        "original_filename": filename,
+        "unique_filename": normal_unique_name,
+        "upload_date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "file_size": str(len(image_bytes)),
+        "claim_uid": claim_uid or "",
+        "created_by": created_by,
+        "image_type": "damage_assessment",
+        "hash": normal_image_hash
+    }
+    normal_upload = upload_executor.submit(_upload_cv_image, image_bytes, normal_unique_name, normal_metadata)
+
+    # Call CV API while the normal image uploads
+    try:
+        cv_response = call_cv_endpoint(image_bytes, filename)
+    except Exception as e:
+        # Nothing to link the original to; drop the upload if it has not started
+        normal_upload.cancel()
+        return None, [f"CV analysis failed for {filename}: {e}"]
+
+    # Upload annotated image to blob storage
+    annotated_blob_link = None
+    annotated_image_hash = None
+    annotated_image_b64 = cv_response.get("annotated_image_b64")
+    if annotated_image_b64:
+        try:
+            annotated_bytes = base64.b64decode(annotated_image_b64)
+            annotated_image_hash = compute_image_hash(annotated_bytes)
+            annotated_metadata = {
+                "type": "annotated_image",
+                "guid": annotated_guid,
+                "original_filename": f"annotated_{filename}",
+                "unique_filename": annotated_unique_name,
+                "upload_date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "file_size": str(len(annotated_bytes)),
+                "claim_uid": claim_uid or "",
+                "created_by": created_by,
+                "image_type": "damage_assessment_annotated",
+                "hash": annotated_image_hash
             }
-            
-            # Prepare CV metadata for database storage
-            cv_metadata = {
-                "normal_image_hash": normal_image_hash,
-                "annotated_image_hash": annotated_image_hash,
-                "normal_image_name": filename,
-                "normal_image_unique_name": normal_unique_name,
-                "annotated_image_name": f"annotated_{filename}",
-                "annotated_image_unique_name": annotated_unique_name,
-                "normal_image_blob_link": normal_blob_link,
-                "annotated_image_blob_link": annotated_blob_link,
-                "json": json.dumps(cv_analysis_json) ,  # Store complete JSON
-                "normal_image_guid": normal_guid,
-                "annotated_image_guid": annotated_guid,
-                "total_detections": detection_result.get("total_detections", 0),
-                "severity": severity_assessment.get("severity", ""),
-                "severity_reason": severity_assessment.get("reason", ""),
-                
-                "dent_count": damage_summary.get("dent", {}).get("count", 0),
-                "crack_count": damage_summary.get("crack", {}).get("count", 0),
-                "scratch_count": damage_summary.get("scratch", {}).get("count", 0),
-                "broken_light_count": damage_summary.get("broken_light", {}).get("count", 0),
-                "shattered_glass_count": damage_summary.get("shattered_glass", {}).get("count", 0),
-                "flat_tire_count": damage_summary.get("flat_tire", {}).get("count", 0),
-
-                "reference_number": get_reference_number_from_session(),  # Get policy/claim number
-                "unique_id": claim_uid,  # Link to claim
-                "created_by": created_by
+            annotated_blob_link = _upload_cv_image(annotated_bytes, annotated_unique_name, annotated_metadata)
+            print(f"Annotated image uploaded to blob storage")
+        except Exception as blob_error:
+            warnings.append(f"Failed to upload annotated image to blob: {blob_error}")
+
+    normal_blob_link = None
+    try:
+        normal_blob_link = normal_upload.result()
+    except Exception as blob_error:
+        warnings.append(f"Failed to upload normal image to blob: {blob_error}")
+
+    # Extract CV analysis data from response
+    analysis = cv_response.get("analysis", cv_response)
+    detection_result = analysis.get("detection_result", {})
+    severity_assessment = analysis.get("severity_assessment", {})
+    damage_summary = detection_result.get("damage_summary", {})
+
+    cv_analysis_json = {
+        "analysis": {
+            "detection_result": {
+                "damage_summary": damage_summary,
+                "total_detections": detection_result.get("total_detections", 0)
+            },
+            "filename": analysis.get("filename", filename),
+            "severity_assessment": {
+                "reason": severity_assessment.get("reason", ""),
+                "severity": severity_assessment.get("severity", "")
             }
-            
-            # Insert CV metadata into database
-            try:
-                cv_uid = insert_cv_metadata(cv_metadata)
-                print(f"✅ CV analysis saved to database with UID: {cv_uid}")
-                # st.success(f"✅ CV analysis saved to database with UID")
-                
-                # Update the CV response with database info
-                cv_response.update({
-                    "cv_uid": cv_uid,
-                    "normal_guid": normal_guid,
-                    "annotated_guid": annotated_guid,
-                    "normal_blob_link": normal_blob_link,
-                    "annotated_blob_link": annotated_blob_link,
-                    "claim_uid": claim_uid,
-                    "normal_image_hash": normal_image_hash,
-                    "annotated_image_hash": annotated_image_hash
-                })
-                
-                return cv_response
-                
-            except Exception as db_error:
-                st.error(f"Failed to save CV analysis to database: {db_error}")
-                return cv_response  # Return CV response even if DB save fails
-        
-        return None
-        
+        }
+        # ✅ NOTE: Deliberately excluding "annotated_image_b64" to save space
+    }
+
+    # Prepare CV metadata for database storage
+    cv_metadata = {
+        "normal_image_hash": normal_image_hash,
+        "annotated_image_hash": annotated_image_hash,
+        "normal_image_name": filename,
+        "normal_image_unique_name": normal_unique_name,
+        "annotated_image_name": f"annotated_{filename}",
+        "annotated_image_unique_name": annotated_unique_name,
+        "normal_image_blob_link": normal_blob_link,
+        "annotated_image_blob_link": annotated_blob_link,
+        "json": json.dumps(cv_analysis_json) ,  # Store complete JSON
+        "normal_image_guid": normal_guid,
+        "annotated_image_guid": annotated_guid,
+        "total_detections": detection_result.get("total_detections", 0),
+        "severity": severity_assessment.get("severity", ""),
+        "severity_reason": severity_assessment.get("reason", ""),
+
+        "dent_count": damage_summary.get("dent", {}).get("count", 0),
+        "crack_count": damage_summary.get("crack", {}).get("count", 0),
+        "scratch_count": damage_summary.get("scratch", {}).get("count", 0),
+        "broken_light_count": damage_summary.get("broken_light", {}).get("count", 0),
+        "shattered_glass_count": damage_summary.get("shattered_glass", {}).get("count", 0),
+        "flat_tire_count": damage_summary.get("flat_tire", {}).get("count", 0),
+
+        "reference_number": reference_number,  # Policy/claim number
+        "unique_id": claim_uid,  # Link to claim
+        "created_by": created_by
+    }
+
+    # Insert CV metadata into database
+    try:
+        cv_uid = insert_cv_metadata(cv_metadata)
+        print(f"✅ CV analysis saved to database with UID: {cv_uid}")
+
+        # Update the CV response with database info
+        cv_response.update({
+            "cv_uid": cv_uid,
+            "normal_guid": normal_guid,
+            "annotated_guid": annotated_guid,
+            "normal_blob_link": normal_blob_link,
+            "annotated_blob_link": annotated_blob_link,
+            "claim_uid": claim_uid,
+            "normal_image_hash": normal_image_hash,
+            "annotated_image_hash": annotated_image_hash
+        })
+    except Exception as db_error:
+        warnings.append(f"Failed to save CV analysis to database: {db_error}")
+
+    return cv_response, warnings  # Return CV response even if DB save fails
+
+
+def analyze_image_damage_with_storage(image_bytes, filename, created_by="system", claim_uid=None):
+    """Send image to CV endpoint for damage analysis and store results in database and blob"""
+    try:
+        upload_executor = script_context_executor(1, "cv-upload")
+        try:
+            with st.spinner("Analyzing damage with Computer Vision..."):
+                cv_response, warnings = analyze_and_store_image(
+                    image_bytes, filename, created_by, claim_uid,
+                    get_reference_number_from_session(), upload_executor
+                )
+        finally:
+            upload_executor.shutdown(wait=True)
+
+        for warning in warnings:
+            st.warning(warning)
+        if cv_response and cv_response.get("cache_hit"):
+            st.info("ℹ️ This image was analyzed before; reused the stored analysis")
+        elif cv_response and cv_response.get("normal_blob_link"):
+            st.success(f"✅ Normal image uploaded to blob storage")
+        return cv_response
+
     except Exception as e:
         st.error(f"Error in CV analysis with storage: {e}")
         return None
 
 
+def analyze_images_concurrently(images, created_by, claim_uid, on_progress=None):
+    """Analyze and store many images on a bounded worker pool.
+
+    ``images`` is a list of ``(key, image_bytes, filename)``. Up to
+    CV_MAX_WORKERS images are in flight at once, each with its own uploads
+    overlapping its CV request. ``on_progress(done, total)`` is called on the
+    calling (script) thread as each image finishes. Returns
+    ``({key: cv_response}, warnings)``.
+    """
+    reference_number = get_reference_number_from_session()
+    results = {}
+    warnings = []
+    total = len(images)
+    if not total:
+        return results, warnings
+
+    workers = min(CV_MAX_WORKERS, total)
+    # Uploads get their own pool: a worker waiting on an upload queued behind
+    # other workers' uploads in the same pool could deadlock
+    analysis_executor = script_context_executor(workers, "cv-analysis")
+    upload_executor = script_context_executor(workers, "cv-upload")
+    start_time = time.time()
+    try:
+        futures = {
+            analysis_executor.submit(
+                analyze_and_store_image, image_bytes, filename, created_by,
+                claim_uid, reference_number, upload_executor
+            ): (key, filename)
+            for key, image_bytes, filename in images
+        }
+        done = 0
+        for future in as_completed(futures):
+            key, filename = futures[future]
+            try:
+                cv_response, image_warnings = future.result()
+            except Exception as e:
+                cv_response, image_warnings = None, [f"Error in CV analysis of {filename}: {e}"]
+            if cv_response:
+                results[key] = cv_response
+            warnings.extend(image_warnings)
+            done += 1
+            if on_progress:
+                on_progress(done, total)
+    finally:
+        analysis_executor.shutdown(wait=True)
+        upload_executor.shutdown(wait=True)
+
+    log_performance(
+        "CV_BULK_ANALYSIS", int((time.time() - start_time) * 1000),
+        additional_data={
+            "images": total,
+            "analyzed": len(results),
+            "cache_hits": sum(1 for r in results.values() if r.get("cache_hit")),
+            "workers": workers
+        }
+    )
+    return results, warnings
+
+
 def get_reference_number_from_session():
     """Extract reference number (Policy/Claim) from current session context"""
     try:
@@ -480,7 +716,7 @@ def get_claim_uid_from_session():
             claim_no = defaults.get("CLAIM_NO")
             if claim_no:
                 # Fetch the latest claim to get its UID
-                claim_data = _fetch_latest_claims(claim_no)
+                claim_data = fetch_latest_claim(claim_no)
                 if claim_data and len(claim_data) > 0:
                     return claim_data[0].get("Unique_ID")
         
@@ -727,6 +963,70 @@ def get_claim_uid_from_session():
 #         st.error(f"Failed to display image: {e}")
 
 
+def _blob_session_id():
+    """Id of this browser session's area in the session blob store"""
+    if "blob_session_id" not in st.session_state:
+        st.session_state.blob_session_id = uuid.uuid4().hex
+    return st.session_state.blob_session_id
+
+
+def offload_json_data(json_data):
+    """Copy of an extraction result with attachment payloads moved to the session blob store.
+
+    Each attachment's base64 ``data`` is replaced by a ``data_ref`` handle
+    (plus its ``size``), so session state keeps only the small fields.
+    """
+    if not isinstance(json_data, dict) or not json_data.get("attachments"):
+        return json_data
+    store = get_session_blob_store()
+    session_id = _blob_session_id()
+    attachments = []
+    for attachment in json_data["attachments"]:
+        if attachment.get("data"):
+            attachment = dict(attachment)
+            payload = base64.b64decode(attachment.pop("data"))
+            attachment["data_ref"] = store.put(session_id, payload)
+            attachment["size"] = len(payload)
+        attachments.append(attachment)
+    return {**json_data, "attachments": attachments}
+
+
+def store_damage_analysis(i, analysis_result):
+    """Keep a CV result in session state with its annotated image moved to the session blob store"""
+    analysis_result = dict(analysis_result)
+    annotated_image_b64 = analysis_result.pop("annotated_image_b64", None)
+    if annotated_image_b64:
+        analysis_result["annotated_image_ref"] = get_session_blob_store().put(
+            _blob_session_id(), base64.b64decode(annotated_image_b64)
+        )
+    st.session_state[f"damage_analysis_{i}"] = analysis_result
+
+
+def load_session_blob(ref=None, data=None):
+    """Bytes behind a session blob handle (or inline base64 ``data``)"""
+    if data:
+        return base64.b64decode(data)
+    payload = get_session_blob_store().get(_blob_session_id(), ref) if ref else None
+    if payload is None:
+        raise ValueError("Image is no longer available in this session; please upload it again")
+    return payload
+
+
+def get_attachment_thumbnail(image_key, load_image):
+    """Cached preview bytes for an image; ``load_image()`` is only called when the preview is not cached"""
+    return get_thumbnail_cache().get(image_key, load_image)
+
+
+def show_full_image_toggle(key):
+    """Button that shows/hides a full-size image; returns whether it is shown"""
+    state_key = f"show_{key}"
+    label = "🔽 Hide full size" if st.session_state.get(state_key) else "🖼️ Full size"
+    if st.button(label, key=f"toggle_{key}", use_container_width=True):
+        st.session_state[state_key] = not st.session_state.get(state_key, False)
+        st.rerun()
+    return st.session_state.get(state_key, False)
+
+
 def display_severity_dashboard(num_images):
     """Display a dashboard summarizing all severity analyses"""
     analyses = []
@@ -806,19 +1106,26 @@ def display_severity_dashboard(num_images):
                 with tabs[tab_idx]:
                     # Get annotated image
                     annotated_image_b64 = analysis.get("annotated_image_b64", "")
+                    annotated_image_ref = analysis.get("annotated_image_ref")
+                    annotated_image_name = analysis.get("annotated_image_unique_name")
                     analysis_data = analysis.get("analysis", analysis)
                     filename = analysis_data.get("filename", f"Image_{img_idx+1}")
                     
-                    if annotated_image_b64:
+                    if annotated_image_b64 or annotated_image_ref or annotated_image_name:
                         try:
-                            # Display annotated image
-                            annotated_image_bytes = base64.b64decode(annotated_image_b64)
-                            annotated_image = Image.open(io.BytesIO(annotated_image_bytes))
+                            # Display a cached preview of the annotated image
+                            thumbnail_key = (analysis.get("annotated_image_hash") or annotated_image_ref
+                                             or annotated_image_name or base64_key(annotated_image_b64))
+                            if annotated_image_b64 or annotated_image_ref:
+                                load_annotated = lambda: load_session_blob(annotated_image_ref, annotated_image_b64)
+                            else:
+                                # Reused analysis: read the stored blob only when it is not in the thumbnail cache
+                                load_annotated = lambda: download_bytes(annotated_image_name)
                             
                             col_img, col_info = st.columns([1, 1])
                             
                             with col_img:
-                                st.image(annotated_image, width=512)
+                                st.image(get_attachment_thumbnail(thumbnail_key, load_annotated), width=512)
 
                             with col_info:
                                 # Quick stats for this image
@@ -830,15 +1137,18 @@ def display_severity_dashboard(num_images):
                                 st.metric("Damage Points", total_detections)
                                 st.write("Reason: ", reason)
 
-                                # Download annotated image
-                                st.download_button(
-                                    label="📥 Download Annotated",
-                                    data=annotated_image_bytes,
-                                    file_name=f"annotated_{filename}",
-                                    mime="image/jpeg",
-                                    key=f"download_annotated_{img_idx}",
-                                    use_container_width=True
-                                )
+                                # Full annotated image and download, loaded only when asked for
+                                if show_full_image_toggle(f"full_annotated_{img_idx}"):
+                                    annotated_image_bytes = load_annotated()
+                                    st.image(annotated_image_bytes)
+                                    st.download_button(
+                                        label="📥 Download Annotated",
+                                        data=annotated_image_bytes,
+                                        file_name=f"annotated_{filename}",
+                                        mime="image/jpeg",
+                                        key=f"download_annotated_{img_idx}",
+                                        use_container_width=True
+                                    )
                                 
                                 # Show full analysis
                                 # if st.button(f"📊 View Full Analysis", key=f"full_analysis_{img_idx}", use_container_width=True):
@@ -1021,25 +1331,34 @@ def display_attachments(attachments):
             col1, col2 = st.columns([1, 3])
             with col1:
                 if st.button("🔍 Analyze All Images", key="bulk_analyze"):
-                    progress_bar = st.progress(0)
-                    
+                    progress_bar = st.progress(0, text=f"Analyzing {len(images)} images...")
+
+                    pending = []
                     for i, image_attachment in enumerate(images):
                         filename = image_attachment.get("filename", f"Image_{i+1}")
-                        data = image_attachment.get("data", "")
-                        
-                        if data:
-                            # analysis_result = analyze_image_damage(data, filename)
-                            # ✅ USE THE NEW FUNCTION WITH STORAGE
-                            analysis_result = analyze_image_damage_with_storage(
-                                data, filename, current_user, claim_uid
-                            )
-                            if analysis_result:
-                                st.session_state[f"damage_analysis_{i}"] = analysis_result
-                        
-                        progress_bar.progress((i + 1) / len(images))
-                    
-                    st.success(f"✅ Analyzed {len(images)} images!")
-                    st.rerun()
+                        if image_attachment.get("data") or image_attachment.get("data_ref"):
+                            try:
+                                image_bytes = load_session_blob(image_attachment.get("data_ref"), image_attachment.get("data"))
+                            except ValueError as e:
+                                st.warning(f"{filename}: {e}")
+                                continue
+                            pending.append((i, image_bytes, filename))
+
+                    # ✅ ANALYZE CONCURRENTLY; PROGRESS ADVANCES AS EACH IMAGE COMPLETES
+                    results, warnings = analyze_images_concurrently(
+                        pending, current_user, claim_uid,
+                        on_progress=lambda done, total: progress_bar.progress(
+                            done / total, text=f"Analyzed {done} of {total} images"
+                        )
+                    )
+                    for i, analysis_result in results.items():
+                        store_damage_analysis(i, analysis_result)
+                    for warning in warnings:
+                        st.warning(warning)
+
+                    st.success(f"✅ Analyzed {len(results)} of {len(images)} images!")
+                    if not warnings:
+                        st.rerun()
         
         # Create columns for image display
         cols = st.columns(min(len(images), 3))  # Max 3 images per row
@@ -1051,23 +1370,21 @@ def display_attachments(attachments):
                     filename = image_attachment.get("filename", f"Image_{i+1}")
                     content_type = image_attachment.get("content_type", "")
                     data = image_attachment.get("data", "")
+                    data_ref = image_attachment.get("data_ref")
                     
-                    if data:
-                        # Decode base64 image
-                        image_bytes = base64.b64decode(data)
-                        image = Image.open(io.BytesIO(image_bytes))
-                        
-                        # Display image with filename
-                        st.image(image, width=512)
+                    if data or data_ref:
+                        # Display a cached preview; the full image is only loaded on request
+                        load_image = lambda data=data, data_ref=data_ref: load_session_blob(data_ref, data)
+                        st.image(get_attachment_thumbnail(data_ref or base64_key(data), load_image), width=512)
                         
                         # Quick analysis button
                         if st.button(f"🔍 Analyze", key=f"quick_analyze_{i}", use_container_width=True):
                             # analysis_result = analyze_image_damage(data, filename)
                             analysis_result = analyze_image_damage_with_storage(
-                                data, filename, current_user, claim_uid
+                                load_image(), filename, current_user, claim_uid
                             )
                             if analysis_result:
-                                st.session_state[f"damage_analysis_{i}"] = analysis_result
+                                store_damage_analysis(i, analysis_result)
                                 st.success("✅ Analysis complete!")
                                 st.rerun()
                         
@@ -1100,15 +1417,18 @@ def display_attachments(attachments):
                                 else:
                                     st.info(f"ℹ️ {severity}")
                         
-                        # Download button
-                        st.download_button(
-                            label=f"📥 Download",
-                            data=image_bytes,
-                            file_name=filename,
-                            mime=content_type,
-                            key=f"download_image_{i}",
-                            use_container_width=True
-                        )
+                        # Full image and download, loaded only when asked for
+                        if show_full_image_toggle(f"full_image_{i}"):
+                            image_bytes = load_image()
+                            st.image(image_bytes)
+                            st.download_button(
+                                label=f"📥 Download",
+                                data=image_bytes,
+                                file_name=filename,
+                                mime=content_type,
+                                key=f"download_image_{i}",
+                                use_container_width=True
+                            )
                         
                         # Display image info
                         # st.caption(f"**Type:** {content_type}")
@@ -1118,127 +1438,90 @@ def display_attachments(attachments):
                     st.error(f"Failed to display image {filename}: {e}")
 
 
-def process_multiple_documents_with_api(file_paths, file_names):
-    """Send multiple documents to API for processing and return the extracted JSON data"""
-    correlation_id = str(uuid.uuid4())
-    start_time = time.time()
-    
-    try:
-        log_app_event(
-            log_level="INFO",
-            message=f"API call started for {len(file_paths)} documents",
-            module_name="Document_AI",
-            action_type="API_CALL_START",
-            function_name="process_multiple_documents_with_api",
-            api_endpoint=API_URL,
-            correlation_id=correlation_id
-        )
-        
-        # Validate inputs
-        if not file_paths or not file_names:
-            raise ValueError("file_paths and file_names cannot be empty")
-        
-        if len(file_paths) != len(file_names):
-            raise ValueError("file_paths and file_names must have the same length")
-        
-        # Prepare the files for the API request
-        files = {}
-        
-        # Add each file to the files dictionary with a different key
-        for i, (file_path, file_name) in enumerate(zip(file_paths, file_names)):
-            try:
-                with open(file_path, 'rb') as f:
-                    file_content = f.read()
-                    if not file_content:
-                        raise ValueError(f"File {file_path} is empty")
-                    
-                    # Create a unique key for each file (file1, file2, etc.)
-                    files[f'file{i+1}'] = (file_name, file_content, 'application/octet-stream')
-            except Exception as file_error:
-                raise Exception(f"Error reading file {file_path}: {file_error}")
-        
-        if not files:
-            raise ValueError("No valid files to process")
-        
-        params = {
-            'code': API_CODE
-        }
-        
-        # Validate API configuration
-        if not API_URL:
-            raise ValueError("API_URL is not configured")
-        if not API_CODE:
-            raise ValueError("API_CODE is not configured")
-        
-        # Make the API request
-        print(f"DEBUG: Making API request to {API_URL} with {len(files)} files")
-        response = requests.post(API_URL, files=files, params=params, timeout=300)
-        
-        api_time = int((time.time() - start_time) * 1000)
-        
-        # Log API completion
-        log_app_event(
-            log_level="INFO" if response.status_code == 200 else "ERROR",
-            message=f"API call completed with status {response.status_code}",
-            module_name="Document_AI",
-            action_type="API_CALL_COMPLETE",
-            api_endpoint=API_URL,
-            api_response_code=response.status_code,
-            api_response_time_ms=api_time,
-            correlation_id=correlation_id
-        )
-        
-        # Check if the request was successful
-        if response.status_code == 200:
-            try:
-                result = response.json()
-                print(f"DEBUG: API response received: {type(result)}")
-                return result
-            except ValueError as json_error:
-                raise Exception(f"Invalid JSON response from API: {json_error}")
-        else:
-            error_msg = f"API Error: {response.status_code} - {response.text}"
-            print(f"DEBUG: {error_msg}")
-            raise Exception(error_msg)
-            
-    except requests.exceptions.Timeout:
-        error_msg = "API request timed out after 300 seconds"
-        log_error(
-            error=Exception(error_msg),
-            module_name="Document_AI",
-            function_name="process_multiple_documents_with_api",
-            api_endpoint=API_URL,
-            correlation_id=correlation_id,
-            additional_data={"timeout": 300}
-        )
-        raise Exception(error_msg)
-        
-    except requests.exceptions.ConnectionError:
-        error_msg = f"Cannot connect to API at {API_URL}"
-        log_error(
-            error=Exception(error_msg),
-            module_name="Document_AI",
-            function_name="process_multiple_documents_with_api",
-            api_endpoint=API_URL,
-            correlation_id=correlation_id
-        )
-        raise Exception(error_msg)
-        
-    except Exception as e:
-        print(f"DEBUG: Exception in process_multiple_documents_with_api: {e}")
-        log_error(
-            error=e,
-            module_name="Document_AI",
-            function_name="process_multiple_documents_with_api",
-            api_endpoint=API_URL,
-            correlation_id=correlation_id,
-            additional_data={
-                "file_count": len(file_paths) if file_paths else 0,
-                "file_names": file_names if file_names else []
-            }
+def show_recorded_documents(inserted, failures, file_count, json_data):
+    """Report which document records were written after an extraction"""
+    for record in inserted:
+        st.success(f"Document {record['Original_File_Name']} logged successfully!")
+    for failure in failures:
+        st.warning(f"Failed to log document {failure['file_name']}: {failure['error']}")
+
+    st.success(f"{len(inserted)}/{file_count} document(s) uploaded successfully!")
+
+    if inserted:
+        display_upload_summary(inserted, json_data)
+
+
+def poll_extraction_job():
+    """Show the state of this session's extraction job; returns True while it is still pending"""
+    job_id = st.session_state.get("extraction_job_id")
+    if not job_id:
+        return False
+
+    job = get_job_queue().get(job_id)
+    if job is None:
+        st.warning("The extraction job could not be found.")
+        del st.session_state["extraction_job_id"]
+        return False
+
+    if job["status"] == JOB_SUCCEEDED:
+        result = job["result"]
+        del st.session_state["extraction_job_id"]
+        file_count = st.session_state.pop("extraction_file_count", len(result["document_records"]))
+        if result.get("extraction_error"):
+            st.error(f"API processing failed: {result['extraction_error']}")
+            return False
+        # The extracted JSON is kept once, in the extraction job's result
+        extraction = get_job_queue().get(result["extraction_job_id"]) if "extraction_job_id" in result else job
+        if extraction is None or not extraction.get("result"):
+            st.error("The extraction result is no longer available; please upload the documents again.")
+            return False
+        json_data = extraction["result"]["json_data"]
+        st.session_state.json_data = offload_json_data(json_data)
+        show_recorded_documents(result["document_records"], result["failures"], file_count, json_data)
+        return False
+
+    if job["status"] == JOB_FAILED:
+        del st.session_state["extraction_job_id"]
+        st.session_state.pop("extraction_file_count", None)
+        st.error(f"Recording the documents failed: {job['error']}")
+        return False
+
+    # Queued or running: make sure a worker is alive in this process, then keep polling.
+    # The record job waits on the extraction job, whose progress is what the user cares about
+    start_extraction_workers()
+    extraction = get_job_queue().get(job["payload"].get("extraction_job_id")) or job
+    if extraction["status"] in (JOB_SUCCEEDED, JOB_FAILED):
+        st.info("Recording documents...")
+        return True
+    message = (f"Extracting data from documents... ({extraction['status']}, "
+               f"attempt {max(extraction['attempts'], 1)} of {extraction['max_attempts']})")
+    st.info(message)
+    if extraction["error"]:
+        st.caption(f"Previous attempt failed, retrying: {extraction['error']}")
+    return True
+
+
+def show_extraction_jobs(limit=20):
+    """Recent extraction jobs from the background queue"""
+    with st.expander("Extraction jobs", expanded=False):
+        jobs = get_job_queue().list_jobs(limit=limit, kind=EXTRACTION_JOB_KIND)
+        if not jobs:
+            st.write("No extraction jobs yet.")
+            return
+        st.dataframe(
+            [
+                {
+                    "Job": job["job_id"][:8],
+                    "Status": job["status"],
+                    "Attempts": f"{job['attempts']}/{job['max_attempts']}",
+                    "Created": job.get("created_at_dt"),
+                    "Finished": job.get("finished_at_dt"),
+                    "Error": job["error"],
+                }
+                for job in jobs
+            ],
+            use_container_width=True
         )
-        # Re-raise the exception instead of swallowing it
-        raise Exception(f"Error processing documents with API: {e}")
 
 
 def upload_document():
@@ -1267,8 +1550,11 @@ def upload_document():
             st.success("Form submitted successfully!")
             st.rerun()
 
+        extraction_pending = poll_extraction_job()
+
         with st.form("document_upload_form"):
             uploaded_files = st.file_uploader("Upload File *", type=["pdf", "docx", "eml"], accept_multiple_files=True)
+            refresh_extraction = st.checkbox("Re-run extraction (ignore cached results)", value=False)
             submit = st.form_submit_button("Upload Document")
             back = st.form_submit_button("Back")
             
@@ -1276,84 +1562,67 @@ def upload_document():
                 if not uploaded_files or len(uploaded_files) == 0:
                     st.error("Please upload a file.")
                 else:
+                    job_enqueued = False
+                    staged_documents = []
+                    executor = None
+                    extraction_job_id = None
                     try:
                         upload_start_time = time.time()
 
                         with st.spinner("Uploading documents..."):
                             # Initialize collections
-                            temp_file_paths = []
-                            file_names = []
                             file_hashes = []
                             guids = []
                             document_records = []
-                            
-                            # Process each file in the list
-                            for i, uploaded_file in enumerate(uploaded_files):
-                                file_start_time = time.time()
-                                
-                                try:
-                                    # Save uploaded file to temp location
-                                    with tempfile.NamedTemporaryFile(delete=False) as temp_file:
-                                        temp_file.write(uploaded_file.read())
-                                        temp_file_paths.append(temp_file.name)
-                                    
-                                    # Generate unique identifiers
-                                    file_name_without_ext = os.path.splitext(uploaded_file.name)[0]
-                                    file_extension = os.path.splitext(uploaded_file.name)[1]
-                                    original_filename = f"{file_name_without_ext}{file_extension}"
-
-                                    guid = str(uuid.uuid4())
-                                    guids.append(guid)
-                                    file_hash = compute_file_hash(temp_file_paths[-1])
-                                    file_hashes.append(file_hash)
-                                    file_names.append(uploaded_file.name)
-
-                                    # Create unique filename with timestamp
-                                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")[:17]
-                                    unique_filename = f"{timestamp}_{file_hash[:8]}_{guid[:4]}{file_extension}"
-
-                                    # Upload to Azure Blob Storage
-                                    metadata = {
-                                        "guid": guid,
-                                        "original_filename": original_filename,
-                                        "unique_filename": unique_filename,
-                                        "file_hash": file_hash,
-                                        "upload_date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                                        "file_size": str(uploaded_file.size)
-                                    }
-                                    
-                                    blob_url = upload_to_blob(
-                                        file_path=temp_file_paths[-1],
-                                        blob_name=unique_filename,
-                                        metadata=metadata
-                                    )
+                            staged_files = []
 
-                                    # Prepare document record
-                                    document_record = {
-                                        "Hash": file_hash,
-                                        "Unique_File_Name": unique_filename,
-                                        "Original_File_Name": original_filename,
-                                        "GUID": guid,
-                                        "Blob_Link": blob_url,
-                                        "UploadDate": datetime.now(),
-                                        "ProcessingStatus": "Processing"
-                                    }
-                                    document_records.append(document_record)
-                                    
-                                    # FIXED: Log each file upload correctly
-                                    log_document_operation(
-                                        action_type="FILE_UPLOADED",
-                                        document_info={
-                                            'file_name': uploaded_file.name,
-                                            'file_size_kb': uploaded_file.size / 1024,
-                                            'file_hash': file_hash,
-                                            'blob_url': blob_url,
-                                            'guid': guid
-                                        },
+                            executor = script_context_executor(UPLOAD_MAX_WORKERS, "upload")
+
+                            # Read every upload once, hashing it on the way; the ingested copy
+                            # feeds both the blob uploads and the Document AI call
+                            ingest_futures = [executor.submit(ingest_upload, uploaded_file) for uploaded_file in uploaded_files]
+                            for i, (uploaded_file, future) in enumerate(zip(uploaded_files, ingest_futures)):
+                                try:
+                                    document = future.result()
+                                    staged_documents.append(document)
+                                    staged_files.append((i, uploaded_file, document))
+                                except Exception as file_error:
+                                    log_error(
+                                        error=file_error,
+                                        module_name="Document_Upload",
+                                        function_name="upload_document",
                                         correlation_id=correlation_id,
-                                        execution_time_ms=int((time.time() - file_start_time) * 1000)
+                                        additional_data={"file_name": uploaded_file.name, "file_index": i}
                                     )
-                                    
+                                    st.error(f"Failed to process file {uploaded_file.name}: {file_error}")
+
+                            # Files that were uploaded before are linked instead of
+                            # re-uploaded and re-extracted
+                            staged_hashes = [document.sha256 for document in staged_documents]
+                            duplicates = lookup_duplicate_documents(staged_hashes, correlation_id=correlation_id)
+                            reused_json = None
+                            if not refresh_extraction:
+                                reused_json = reusable_extraction(staged_hashes, duplicates)
+                                if reused_json is None:
+                                    reused_json = get_cached_extraction(staged_hashes)
+
+                            # Start extraction now so the Document AI call overlaps the blob
+                            # uploads; the documents are recorded by a follow-up job
+                            if staged_documents and reused_json is None:
+                                start_extraction_workers()
+                                extraction_job_id = enqueue_extraction_job(
+                                    staged_documents, bypass_cache=refresh_extraction, correlation_id=correlation_id
+                                )
+
+                            upload_futures = [
+                                executor.submit(upload_ingested_file, document, existing=duplicates.get(document.sha256))
+                                for _, _, document in staged_files
+                            ]
+
+                            # Collect in upload order; a failed file does not affect the others
+                            for (i, uploaded_file, _), future in zip(staged_files, upload_futures):
+                                try:
+                                    upload_result = future.result()
                                 except Exception as file_error:
                                     log_error(
                                         error=file_error,
@@ -1365,6 +1634,25 @@ def upload_document():
                                     st.error(f"Failed to process file {uploaded_file.name}: {file_error}")
                                     continue
 
+                                document_record = upload_result["document_record"]
+                                guids.append(document_record["GUID"])
+                                file_hashes.append(document_record["Hash"])
+                                document_records.append(document_record)
+
+                                # FIXED: Log each file upload correctly
+                                log_document_operation(
+                                    action_type="FILE_DEDUPLICATED" if upload_result["deduplicated"] else "FILE_UPLOADED",
+                                    document_info={
+                                        'file_name': uploaded_file.name,
+                                        'file_size_kb': uploaded_file.size / 1024,
+                                        'file_hash': document_record["Hash"],
+                                        'blob_url': document_record["Blob_Link"],
+                                        'guid': document_record["GUID"]
+                                    },
+                                    correlation_id=correlation_id,
+                                    execution_time_ms=upload_result["execution_time_ms"]
+                                )
+
                             # FIXED: Performance logging OUTSIDE the loop
                             total_upload_time = int((time.time() - upload_start_time) * 1000)
                             log_performance("upload_multiple_documents", total_upload_time, correlation_id=correlation_id)
@@ -1372,93 +1660,26 @@ def upload_document():
                             # Store GUIDs in session state for later use
                             st.session_state.document_guids = guids
                             
-                            # Process all files with API together
-                            if temp_file_paths:  # Only if we have successfully processed files
+                            if staged_documents:  # Only if we have successfully processed files
                                 st.session_state.json_data = None
-                                with st.spinner("Extracting data from documents..."):
-                                    try:
-                                        json_data = process_multiple_documents_with_api(
-                                            file_paths=temp_file_paths,
-                                            file_names=file_names
-                                        )
-                                        st.session_state.json_data = json_data
-                                    except Exception as api_error:
-                                        log_error(
-                                            error=api_error,
-                                            module_name="Document_AI",
-                                            function_name="process_multiple_documents_with_api",
-                                            correlation_id=correlation_id
-                                        )
-                                        st.error(f"API processing failed: {api_error}")
-                                        json_data = {"error": "API processing failed"}
-
-                                # Extract document classification
-                                document_type = None
-                                transaction_type = None
-                                reference_number = None
-
-                                if "classification" in json_data:
-                                    classification = json_data.get("classification", {})
-                                    document_type = classification.get("category", "")
-                                    transaction_type = classification.get("subcategory", "")
-                                elif "Type" in json_data:
-                                    transaction_type = json_data.get("Type", "")
-                                    if "Policy" in transaction_type or "Business" in transaction_type:
-                                        document_type = "policy"
-                                    elif "Claim" in transaction_type:
-                                        document_type = "claim"
-
-                                # Extract reference numbers
-                                extracted_fields = json_data.get("extracted_fields", {})
-                                if document_type == "policy":
-                                    reference_number = extracted_fields.get("POLICY_NO", None)
-                                elif document_type == "claim":
-                                    reference_number = extracted_fields.get("CLAIM_NO", None)
-                                
-                                # Fallback extraction
-                                if not reference_number:
-                                    if document_type == "policy":
-                                        reference_number = json_data.get("POLICY_NO", None)
-                                    elif document_type == "claim":
-                                        reference_number = json_data.get("CLAIM_NO", None)
-
-                                # Update document records and insert into database
-                                successful_inserts = 0
-                                for i, record in enumerate(document_records):
-                                    try:
-                                        record.update({
-                                            "JSON": json.dumps(json_data),
-                                            "Type": document_type,
-                                            "Transaction_Type": transaction_type,
-                                            "Reference_Number": reference_number,
-                                            "ProcessingStatus": "Completed"
-                                        })
-                                        
-                                        insert_upload_document(record)
-                                        successful_inserts += 1
-                                        st.success(f"Document {record['Original_File_Name']} logged successfully!")
-                                        
-                                    except Exception as db_error:
-                                        log_error(
-                                            error=db_error,
-                                            module_name="Document_Upload",
-                                            function_name="insert_upload_document",
-                                            correlation_id=correlation_id,
-                                            additional_data={"document_guid": record.get("GUID")}
-                                        )
-                                        st.warning(f"Failed to log document {record['Original_File_Name']}: {db_error}")
-
-                                # Clean up temp files
-                                for file_path in temp_file_paths:
-                                    try:
-                                        os.remove(file_path)
-                                    except Exception as cleanup_error:
-                                        print(f"Warning: Could not remove temp file {file_path}: {cleanup_error}")
-                                
-                                st.success(f"{successful_inserts}/{len(uploaded_files)} document(s) uploaded successfully!")
-                                
-                                if successful_inserts > 0:
-                                    display_upload_summary(document_records, json_data)
+                                if reused_json is not None:
+                                    st.info("These documents were processed before - reusing the previous extraction.")
+                                    inserted, failures = record_extracted_documents(
+                                        document_records, reused_json, correlation_id=correlation_id
+                                    )
+                                    st.session_state.json_data = offload_json_data(reused_json)
+                                    show_recorded_documents(inserted, failures, len(uploaded_files), reused_json)
+                                elif extraction_job_id and document_records:
+                                    # Recorded on a background worker once extraction finishes;
+                                    # the page polls that job
+                                    st.session_state.extraction_job_id = enqueue_record_documents_job(
+                                        extraction_job_id, document_records, correlation_id=correlation_id
+                                    )
+                                    st.session_state.extraction_file_count = len(uploaded_files)
+                                    job_enqueued = True
+                                elif extraction_job_id:
+                                    # Nothing to record the extraction against; the finally block cancels it
+                                    st.error("None of the files could be uploaded, so their extraction was cancelled.")
                             else:
                                 st.error("No files were successfully processed.")
 
@@ -1470,6 +1691,18 @@ def upload_document():
                             correlation_id=correlation_id
                         )
                         st.error(f"Upload failed: {e}")
+                    finally:
+                        if extraction_job_id and not job_enqueued:
+                            cancel_extraction_job(extraction_job_id)
+                        # Let any upload still running finish before its file is closed
+                        if executor is not None:
+                            executor.shutdown(wait=True)
+                        # Release buffers and spool files; the job has its own copies
+                        for document in staged_documents:
+                            document.close()
+
+                    if job_enqueued:
+                        st.rerun()
             
             if back:
                 clear_session_state()
@@ -1477,6 +1710,12 @@ def upload_document():
                 if "json_data" in st.session_state:
                     del st.session_state.json_data
                 st.rerun()
+
+        show_extraction_jobs()
+
+        if extraction_pending:
+            time.sleep(JOB_POLL_INTERVAL)
+            st.rerun()
                 
         return st.session_state.json_data if 'json_data' in st.session_state else None
 
@@ -1683,8 +1922,7 @@ def load_policy_from_json():
             if policy_no:
                 # Fetch complete policy data from DB
                 try:
-                    query = f"SELECT * FROM New_Policy WHERE POLICY_NO = '{policy_no}'"
-                    result = fetch_data(query)
+                    result = fetch_latest_policy(policy_no)
                     if result:
                         # Store the original policy data in session state for renewal processing
                         st.session_state.renewal_policy_data = result[0]
@@ -1722,7 +1960,7 @@ def load_policy_from_json():
                 try:
                     # query = f"SELECT * FROM Policy WHERE POLICY_NO = '{policy_no}'"
                     # result = fetch_data(query)
-                    result = _fetch_latest_policy(policy_no)
+                    result = fetch_latest_policy(policy_no)
                     if result:
                         # Show already cancelled or Lapsed warning at initial state
                         if result[0].get("isCancelled", 0) == 1:
@@ -1760,7 +1998,7 @@ def load_policy_from_json():
                 try:
                     # query = f"SELECT * FROM New_Policy WHERE POLICY_NO = '{policy_no}'"
                     # result = fetch_data(query)
-                    result = _fetch_latest_policy(policy_no)
+                    result = fetch_latest_policy(policy_no)
                     if result:
                         # Show already cancelled or Lapsed warning
                         if result[0].get("isCancelled", 0) == 1:
@@ -1804,7 +2042,7 @@ def load_policy_from_json():
                 try:
                     # query = f"SELECT * FROM Claims WHERE CLAIM_NO = '{claim_no}'"
                     # result = fetch_data(query)
-                    result = _fetch_latest_claims(claim_no)
+                    result = fetch_latest_claim(claim_no)
                     if result:
                         # Check if claim is already closed
                         claim_status = result[0].get("CLAIM_STATUS", "")
@@ -1843,7 +2081,7 @@ def load_policy_from_json():
                 try:
                     # query = f"SELECT * FROM Claims WHERE CLAIM_NO = '{claim_no}'"
                     # result = fetch_data(query)
-                    result = _fetch_latest_claims(claim_no)
+                    result = fetch_latest_claim(claim_no)
                     if result:
                         # Check if claim is already closed
                         claim_status = result[0].get("CLAIM_STATUS", "")
@@ -1882,7 +2120,7 @@ def load_policy_from_json():
                 try:
                     # query = f"SELECT * FROM Claims WHERE CLAIM_NO = '{claim_no}'"
                     # result = fetch_data(query)
-                    result = _fetch_latest_claims(claim_no)
+                    result = fetch_latest_claim(claim_no)
                     if result:
                         # Check if claim is currently closed (must be closed to reopen)
                         claim_status = result[0].get("CLAIM_STATUS", "")
@@ -1943,7 +2181,7 @@ def show_policy_form():
             if policy_no_to_check:
                 try:
                     # Check if policy already exists in database
-                    existing_policy = _fetch_latest_policy(policy_no_to_check)
+                    existing_policy = fetch_latest_policy(policy_no_to_check, use_cache=False)
                     
                     if existing_policy and len(existing_policy) > 0:
                         # Policy already exists - show warning and don't open form
@@ -2974,7 +3212,7 @@ def show_claims_form(defaults):
     if claim_no_to_check:
         try:
             # Check if claim already exists in database
-            existing_claim = _fetch_latest_claims(claim_no_to_check)
+            existing_claim = fetch_latest_claim(claim_no_to_check, use_cache=False)
             
             if existing_claim and len(existing_claim) > 0:
                 # Claim already exists - show warning and don't open form
@@ -3080,7 +3318,7 @@ def show_claims_form(defaults):
                 st.error("Please fill all mandatory fields marked with *")
             else:
                 try:
-                    policy_result = _fetch_latest_policy(policy_no)
+                    policy_result = fetch_latest_policy(policy_no)
                     if policy_result:
                         policy_data = policy_result[0]
                         drv_dob = policy_data.get("DRV_DOB", None)
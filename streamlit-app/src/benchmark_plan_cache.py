@@ -0,0 +1,141 @@
+"""Compare plan-cache reuse and latency of literal vs parameterized lookups.
+
+    python src/benchmark_plan_cache.py --lookups 500
+
+Runs the latest-policy lookup once per policy number in three ways: with the
+number formatted into the SQL (how the app used to query), with pymssql's
+client-side ``%s`` substitution, and through ``fetch`` (sp_executesql). After
+each run it reports latency percentiles and how many plans SQL Server cached
+for the statement, read from sys.dm_exec_cached_plans.
+
+Point DB_SERVER/DB_DATABASE/DB_USERNAME/DB_PASSWORD at a local SQL Server
+container, e.g.
+
+    docker run -e ACCEPT_EULA=Y -e MSSQL_SA_PASSWORD=... -p 1433:1433 \\
+        mcr.microsoft.com/mssql/server:2022-latest
+
+``--free-proc-cache`` clears the whole plan cache between runs (needs
+sysadmin); never use it against a shared server.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+# Add the utils directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'utils')))
+
+from db_utils import as_sp_executesql, get_db_connection
+
+LOOKUP_SQL = """
+    SELECT TOP 1 *
+    FROM New_Policy
+    WHERE POLICY_NO = %s
+    ORDER BY
+        CASE WHEN Submission_Date IS NULL THEN 1 ELSE 0 END ASC,
+        Submission_Date DESC,
+        Unique_ID DESC
+"""
+
+# Cached plans whose text contains the lookup; the marker comment keeps each run's plans apart
+PLAN_STATS_SQL = """
+    SELECT
+        COUNT(*) AS plans,
+        SUM(CASE WHEN cp.usecounts = 1 THEN 1 ELSE 0 END) AS single_use_plans,
+        SUM(cp.usecounts) AS total_uses,
+        SUM(CAST(cp.size_in_bytes AS BIGINT)) AS plan_bytes
+    FROM sys.dm_exec_cached_plans cp
+    CROSS APPLY sys.dm_exec_sql_text(cp.plan_handle) st
+    WHERE st.text LIKE %s AND st.text NOT LIKE '%%dm_exec_cached_plans%%'
+"""
+
+
+def _literal(query, policy_no):
+    return query.replace("%s", "'" + policy_no.replace("'", "''") + "'"), None
+
+
+def _client_side(query, policy_no):
+    return query, (policy_no,)
+
+
+def _sp_executesql(query, policy_no):
+    return as_sp_executesql(query, (policy_no,))
+
+
+MODES = {
+    "literal": _literal,
+    "client_params": _client_side,
+    "sp_executesql": _sp_executesql,
+}
+
+
+def run_mode(conn, mode, policy_numbers):
+    marker = f"/* plan-cache-benchmark:{mode}:{int(time.time())} */"
+    query = marker + LOOKUP_SQL
+    timings = []
+    with conn.cursor() as cursor:
+        for policy_no in policy_numbers:
+            sql, params = MODES[mode](query, policy_no)
+            start = time.perf_counter()
+            cursor.execute(sql, params)
+            cursor.fetchall()
+            timings.append((time.perf_counter() - start) * 1000)
+
+        cursor.execute(PLAN_STATS_SQL, (f"%{marker}%",))
+        plans, single_use, total_uses, plan_bytes = cursor.fetchone()
+
+    plans = plans or 0
+    total_uses = total_uses or 0
+    timings.sort()
+    return {
+        "mode": mode,
+        "lookups": len(timings),
+        "p50_ms": round(statistics.median(timings), 2),
+        "p95_ms": round(timings[int(len(timings) * 0.95) - 1], 2),
+        "mean_ms": round(statistics.mean(timings), 2),
+        "cached_plans": plans,
+        "single_use_plans": single_use or 0,
+        # Executions served by an already cached plan
+        "plan_reuse_rate": round((total_uses - plans) / total_uses, 4) if total_uses else 0.0,
+        "plan_cache_kb": round((plan_bytes or 0) / 1024, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark plan-cache reuse of literal vs parameterized lookups")
+    parser.add_argument("--lookups", type=int, default=500, help="lookups per mode")
+    parser.add_argument("--modes", nargs="+", choices=list(MODES), default=list(MODES),
+                        help="which query styles to run")
+    parser.add_argument("--free-proc-cache", action="store_true",
+                        help="run DBCC FREEPROCCACHE before each mode (local test server only)")
+    args = parser.parse_args()
+
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT DISTINCT TOP (%s) POLICY_NO FROM New_Policy WHERE POLICY_NO IS NOT NULL",
+                           (args.lookups,))
+            policy_numbers = [row[0] for row in cursor.fetchall()]
+        if not policy_numbers:
+            print("New_Policy has no policy numbers to look up")
+            return
+        # Repeat the sample so every mode runs the requested number of lookups
+        policy_numbers = (policy_numbers * (args.lookups // len(policy_numbers) + 1))[:args.lookups]
+
+        print(f"{'mode':<15}{'lookups':>8}{'p50 ms':>9}{'p95 ms':>9}{'mean ms':>9}"
+              f"{'plans':>7}{'single':>8}{'reuse':>8}{'plan KB':>9}")
+        for mode in args.modes:
+            if args.free_proc_cache:
+                with conn.cursor() as cursor:
+                    cursor.execute("DBCC FREEPROCCACHE")
+            result = run_mode(conn, mode, policy_numbers)
+            print(f"{result['mode']:<15}{result['lookups']:>8}{result['p50_ms']:>9}{result['p95_ms']:>9}"
+                  f"{result['mean_ms']:>9}{result['cached_plans']:>7}{result['single_use_plans']:>8}"
+                  f"{result['plan_reuse_rate']:>8.1%}{result['plan_cache_kb']:>9}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
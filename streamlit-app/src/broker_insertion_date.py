@@ -1,39 +1,57 @@
-import pandas as pd
+"""Back-fill broker Submission_Date as 1-3 days before Date_Of_Onboarding.
+
+    python src/broker_insertion_date.py --dry-run
+    python src/broker_insertion_date.py --seed 42
+
+Values are computed for all brokers at once in pandas and applied with one
+set-based update through bulk_backfill (see utils/bulk_backfill.py, which
+other back-fills on New_Policy/New_Claims can use the same way).
+"""
+import argparse
+import os
+import sys
+
 import numpy as np
-from dotenv import load_dotenv
-from db_utils import get_db_connection
-
-# Load environment variables
-load_dotenv()
-
-# Connect to SQL Server using your existing method
-conn = get_db_connection()
-
-if conn:
-    print("✅ Database connected successfully")
-    
-    # Load broker table
-    df = pd.read_sql("SELECT * FROM [dbo].[broker]", conn)
-    print(f"Loaded {len(df)} broker records")
-    
-    # Convert onboarding date
-    df['Date_Of_Onboarding'] = pd.to_datetime(df['Date_Of_Onboarding'])
-    
-    # Generate Submission_Date
-    random_days = np.random.choice([1, 2, 3], size=len(df))
-    df['Submission_Date'] = df['Date_Of_Onboarding'] - pd.to_timedelta(random_days, unit='days')
-    
-    # Push back into SQL
-    cursor = conn.cursor()
-    for idx, row in df.iterrows():
-        cursor.execute("""
-            UPDATE [dbo].[broker]
-            SET Submission_Date = ?
-            WHERE Broker_ID = ?
-        """, row['Submission_Date'], row['Broker_ID'])
-    
-    conn.commit()
-    print("✅ Database updated successfully")
-    conn.close()
-else:
-    print("❌ Failed to connect to database")
\ No newline at end of file
+import pandas as pd
+
+# Add the utils directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'utils')))
+
+from bulk_backfill import bulk_backfill
+from db_utils import fetch
+
+
+def compute_submission_dates(brokers, seed=None):
+    """Broker_ID and Submission_Date (onboarding minus 1-3 random days) for brokers with an onboarding date"""
+    df = pd.DataFrame(brokers, columns=["Broker_ID", "Date_Of_Onboarding"])
+    df["Date_Of_Onboarding"] = pd.to_datetime(df["Date_Of_Onboarding"], errors="coerce")
+    df = df.dropna(subset=["Date_Of_Onboarding"])
+    random_days = np.random.default_rng(seed).integers(1, 4, size=len(df))
+    df["Submission_Date"] = df["Date_Of_Onboarding"] - pd.to_timedelta(random_days, unit="D")
+    return df[["Broker_ID", "Submission_Date"]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Back-fill broker Submission_Date from Date_Of_Onboarding")
+    parser.add_argument("--dry-run", action="store_true", help="report what would change without writing")
+    parser.add_argument("--seed", type=int, help="random seed, for a repeatable back-fill")
+    parser.add_argument("--batch-size", type=int, default=5000, help="rows updated per transaction")
+    args = parser.parse_args()
+
+    brokers = fetch("SELECT Broker_ID, Date_Of_Onboarding FROM [dbo].[broker]")
+    print(f"Loaded {len(brokers)} broker records")
+    updates = compute_submission_dates(brokers, seed=args.seed)
+
+    stats = bulk_backfill(
+        "dbo.broker", ["Broker_ID"], ["Submission_Date"],
+        updates.itertuples(index=False, name=None),
+        dry_run=args.dry_run, batch_size=args.batch_size,
+    )
+    action = "would change" if args.dry_run else "updated"
+    print(f"{stats['staged']} staged, {stats['matched']} matched, "
+          f"{stats['changed'] if args.dry_run else stats['updated']} {action} "
+          f"in {stats['stage_seconds'] + stats['apply_seconds']:.2f}s ({stats['rows_per_second']} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
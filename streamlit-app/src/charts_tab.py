@@ -1,105 +1,112 @@
+import calendar
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-from db_utils import fetch_data
+from db_utils import active_policy_counts
+from rollups import ROLLUPS, rollup_date_range, rollup_series
+
+MONTHS = list(calendar.month_abbr)[1:]
+
+ACTIVITY_SOURCES = {"Policies": "policy", "Claims": "claims"}
+
 
 def charts_tab():
     st.header("Charts & Analytics")
+    active_policy_section()
+    activity_section()
 
-    # Fetch data for charts
-    policy_df = pd.DataFrame(fetch_data("SELECT TOP 1000 * FROM New_Policy"))
-    claims_df = pd.DataFrame(fetch_data("SELECT TOP 20 * FROM New_Claims"))
 
-    # Convert date columns to datetime
-    if not policy_df.empty and "POL_EFF_DATE" in policy_df.columns:
-        policy_df["POL_EFF_DATE"] = pd.to_datetime(policy_df["POL_EFF_DATE"], errors='coerce')
-
-    # Active Policy Count
-    active_policy_count = policy_df[policy_df["isCancelled"] == 0].shape[0] if not policy_df.empty else 0
-    # active_policy_count = policy_df[(policy_df["isCancelled"] == 0) & (policy_df["isLapsed"] == 0)].shape[0] if not policy_df.empty else 0
-    st.metric("Active Policies", active_policy_count)
+def active_policy_section():
+    """Active policy counts by period and policy type, aggregated from New_Policy"""
+    # Filled in once the counts are loaded below the granularity selector
+    metric_slot = st.empty()
 
     # Create two columns for charts and controls
     chart_col1, chart_col2 = st.columns(2)
 
-    if not policy_df.empty and "POL_EFF_DATE" in policy_df.columns:
-        # Filter active policies
-        active_policies = policy_df[policy_df["isCancelled"] == 0].copy()
-        # active_policies = policy_df[(policy_df["isCancelled"] == 0) & (policy_df["isLapsed"] == 0)].copy()
-        
-        # --- LEFT COLUMN: Bar Chart + Time Granularity Selector ---
-        with chart_col1:
-            st.subheader("Active Policy Analysis")
-            time_granularity = st.selectbox("Select Time Granularity", ["Year", "Month"], key="time_granularity")
-
-            # Group data based on time granularity
-            if time_granularity == "Year":
-                active_policies["Period"] = active_policies["POL_EFF_DATE"].dt.year
-                period_counts = active_policies.groupby("Period").size().reset_index(name="Active Policies")
-                period_counts["Period"] = period_counts["Period"].astype(str)
-                bar_title = "Active Policies by Year"
-                period_col = "Period"
-            elif time_granularity == "Month":
-                active_policies["Month"] = active_policies["POL_EFF_DATE"].dt.strftime("%b")
-                period_counts = active_policies.groupby("Month").size().reindex(
-                    ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
-                ).reset_index(name="Active Policies").dropna()
-                period_counts["Month"] = pd.Categorical(period_counts["Month"], categories=[
-                    "Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"
-                ], ordered=True)
-                period_counts = period_counts.sort_values("Month")
-                bar_title = "Active Policies by Month (All Years)"
-                period_col = "Month"
-            else:
-                period_counts = pd.DataFrame()
-                period_col = "Period"
-                bar_title = ""
-
-            # Bar Chart
-            if not period_counts.empty:
-                fig_bar = px.bar(
-                    period_counts,
-                    x=period_col,
-                    y="Active Policies",
-                    title=bar_title
-                )
-                fig_bar.update_layout(xaxis_tickangle=45)
-                st.plotly_chart(fig_bar, use_container_width=True)
-
-        # --- RIGHT COLUMN: Pie Chart + Period Selector ---
-        with chart_col2:
-            st.subheader("Select Period for Policy Type Analysis")
-            available_periods = period_counts[period_col].astype(str).tolist() if not period_counts.empty else []
-            selected_period = st.selectbox(
-                f"Select {time_granularity}",
-                options=["All"] + available_periods,
-                key="period_selector"
+    with chart_col1:
+        st.subheader("Active Policy Analysis")
+        time_granularity = st.selectbox("Select Time Granularity", ["Year", "Month"], key="time_granularity")
+
+    # (period, policy type, count) rows aggregated in SQL over the whole book
+    try:
+        counts = pd.DataFrame(
+            active_policy_counts(time_granularity), columns=["Period", "POLICYTYPE", "Active_Policies"]
+        )
+    except Exception as e:
+        st.error(f"Error fetching policy counts: {e}")
+        return
+
+    # Active Policy Count
+    metric_slot.metric("Active Policies", int(counts["Active_Policies"].sum()) if not counts.empty else 0)
+    if counts.empty:
+        return
+
+    # Policies without an effective date count as active but have no period to chart
+    dated = counts.dropna(subset=["Period"]).copy()
+    if time_granularity == "Year":
+        period_col = "Period"
+        dated[period_col] = dated["Period"].astype(int).astype(str)
+        bar_title = "Active Policies by Year"
+    else:
+        period_col = "Month"
+        dated[period_col] = dated["Period"].astype(int).map(lambda month: MONTHS[month - 1])
+        bar_title = "Active Policies by Month (All Years)"
+    dated = dated.sort_values("Period")
+
+    # --- LEFT COLUMN: Bar Chart ---
+    period_counts = (
+        dated.groupby([period_col], sort=False)["Active_Policies"].sum()
+        .reset_index(name="Active Policies")
+    )
+    with chart_col1:
+        if not period_counts.empty:
+            fig_bar = px.bar(
+                period_counts,
+                x=period_col,
+                y="Active Policies",
+                title=bar_title
+            )
+            fig_bar.update_layout(xaxis_tickangle=45)
+            st.plotly_chart(fig_bar, use_container_width=True)
+
+    # --- RIGHT COLUMN: Pie Chart + Period Selector ---
+    with chart_col2:
+        st.subheader("Select Period for Policy Type Analysis")
+        available_periods = period_counts[period_col].tolist()
+        selected_period = st.selectbox(
+            f"Select {time_granularity}",
+            options=["All"] + available_periods,
+            key="period_selector"
+        )
+
+        # Filter data based on selected period
+        if selected_period != "All":
+            filtered_for_pie = dated[dated[period_col] == selected_period]
+            pie_title = f"Policy Types Distribution - {selected_period}"
+        else:
+            filtered_for_pie = counts
+            pie_title = f"Policy Types Distribution - All {time_granularity}s"
+
+        policy_type_counts = (
+            filtered_for_pie.dropna(subset=["POLICYTYPE"])
+            .groupby("POLICYTYPE")["Active_Policies"].sum()
+            .sort_values(ascending=False)
+            .reset_index()
+        )
+        policy_type_counts.columns = ["Policy Type", "Count"]
+
+        if not policy_type_counts.empty:
+            fig_pie = px.pie(
+                policy_type_counts,
+                values="Count",
+                names="Policy Type",
+                title=pie_title
             )
+            st.plotly_chart(fig_pie, use_container_width=True)
+        else:
+            st.info(f"No policy data available for {selected_period}")
 
-            if "POLICYTYPE" in active_policies.columns:
-                # Filter data based on selected period
-                if selected_period != "All":
-                    filtered_for_pie = active_policies[active_policies[period_col].astype(str) == selected_period]
-                    pie_title = f"Policy Types Distribution - {selected_period}"
-                else:
-                    filtered_for_pie = active_policies
-                    pie_title = f"Policy Types Distribution - All {time_granularity}s"
-                
-                if not filtered_for_pie.empty:
-                    policy_type_counts = filtered_for_pie["POLICYTYPE"].value_counts().reset_index()
-                    policy_type_counts.columns = ["Policy Type", "Count"]
-                    
-                    fig_pie = px.pie(
-                        policy_type_counts,
-                        values="Count",
-                        names="Policy Type",
-                        title=pie_title
-                    )
-                    st.plotly_chart(fig_pie, use_container_width=True)
-                else:
-                    st.info(f"No policy data available for {selected_period}")
-            else:
-                st.info("Policy Type data not available for pie chart")
 
     # # Cross-filter UI
     # st.subheader("Cross Filter")
@@ -149,4 +156,60 @@ def charts_tab():
     #         x="POLICY_NO",
     #         title="Claims Count by Policy"
     #     )
-    #     st.plotly_chart(fig2, use_container_width=True)
\ No newline at end of file
+    #     st.plotly_chart(fig2, use_container_width=True)
+
+
+def _label(column):
+    return column.replace("_", " ").title()
+
+
+def activity_section():
+    """Policy and claim activity over time, read from the daily rollup tables"""
+    st.subheader("Policy & Claims Activity")
+
+    col1, col2, col3, col4 = st.columns(4)
+    source = col1.selectbox("Data", list(ACTIVITY_SOURCES), key="activity_source")
+    rollup_name = ACTIVITY_SOURCES[source]
+    rollup = ROLLUPS[rollup_name]
+    measure = col2.selectbox("Measure", list(rollup["measures"]), format_func=_label, key=f"activity_measure_{rollup_name}")
+    dimension = col3.selectbox(
+        "Breakdown", [None] + list(rollup["dimensions"]),
+        format_func=lambda column: "None" if column is None else _label(column),
+        key=f"activity_dimension_{rollup_name}"
+    )
+    granularity = col4.selectbox("Granularity", ["Month", "Year", "Day"], key="activity_granularity")
+
+    try:
+        first_day, last_day = rollup_date_range(rollup_name)
+        if first_day is None:
+            st.info("No rollup data yet. Run `python src/rollup_worker.py refresh` to build it.")
+            return
+        date_range = st.date_input(
+            "Date Range", value=(first_day, last_day), min_value=first_day, max_value=last_day,
+            key=f"activity_range_{rollup_name}"
+        )
+        start, end = date_range if len(date_range) == 2 else (date_range[0], date_range[0])
+        series = pd.DataFrame(
+            rollup_series(rollup_name, measure, granularity, dimension, start, end),
+            columns=["Period", "Dimension", "Value"]
+        )
+    except Exception as e:
+        st.error(f"Error fetching activity data: {e}")
+        return
+
+    if series.empty:
+        st.info("No activity in the selected range.")
+        return
+
+    series["Value"] = pd.to_numeric(series["Value"])
+    series["Dimension"] = series["Dimension"].fillna("Unknown")
+    fig = px.bar(
+        series,
+        x="Period",
+        y="Value",
+        color="Dimension" if dimension else None,
+        labels={"Value": _label(measure), "Dimension": _label(dimension) if dimension else ""},
+        title=f"{_label(measure)} by {granularity}" + (f" and {_label(dimension)}" if dimension else "")
+    )
+    st.plotly_chart(fig, use_container_width=True)
+    st.caption(f"From the daily rollups, {first_day} to {last_day}.")
@@ -1,103 +1,143 @@
+import os
 import streamlit as st
 import pandas as pd
-from db_utils import fetch_data
+from db_utils import count_claims, fetch_claim_statuses, fetch_claims_page
+
+CLAIMS_PAGE_TTL = int(os.getenv("CLAIMS_PAGE_TTL", "30"))
+
+column_mapping = {
+    'Account_Code': 'Account Code',
+    'DATE_OF_INTIMATION': 'Intimation Date',
+    'DATE_OF_ACCIDENT': 'Accident Date',
+    'PLACE_OF_LOSS': 'Loss Location',
+    'CLAIM_NO': 'Claim Number',
+    'AGE': 'Driver Age',
+    'TYPE': 'Claim Type',
+    'DRIVING_LICENSE_ISSUE': 'License Issue Date',
+    'BODY_TYPE': 'Vehicle Body Type',
+    'MAKE': 'Vehicle Make',
+    'MODEL': 'Vehicle Model',
+    'YEAR': 'Model Year',
+    'CHASIS_NO': 'Chassis Number',
+    'REG': 'Registration Number',
+    'SUM_INSURED': 'Sum Insured',
+    'POLICY_NO': 'Policy Number',
+    'POLICY_START': 'Policy Start Date',
+    'POLICY_END': 'Policy End Date',
+    'INTIMATED_AMOUNT': 'Intimated Amount',
+    'INTIMATED_SF': 'Intimated SF',
+    'EXECUTIVE': 'Executive',
+    'PRODUCT': 'Product Type',
+    'POLICYTYPE': 'Policy Type',
+    'NATIONALITY': 'Nationality',
+    'Broker_ID': 'Broker ID',
+    'Broker_Name': 'Broker Name',
+    'Facility_ID': 'Facility ID',
+    'Facility_Name': 'Facility Name',
+    'CLAIM_STAGE': 'Claim Stage',
+    'CLAIM_STATUS': 'Claim Status',
+    'FINAL_SETTLEMENT_AMOUNT': 'Final Settlement',
+    'CLAIM_CLOSURE_DATE': 'Closure Date',
+    'REOPEN_REASON': 'Reopen Reason',
+    'CLAIM_REMARKS': 'Remarks',
+    'UPDATE_DATE': 'Last Updated'
+}
+
+# Keyset columns are fetched for paging but not displayed. Mapped columns the
+# table lacks (e.g. UPDATE_DATE, which no insert path writes) are left out of
+# the SELECT by fetch_claims_page rather than failing the query.
+KEYSET_COLUMNS = ['Submission_Date', 'Unique_ID']
+CLAIM_COLUMNS = list(column_mapping) + KEYSET_COLUMNS
+
+
+def _reset_claims_paging(filters, page_size):
+    """Start from page 1 whenever the filters or page size change"""
+    paging_key = (tuple(sorted(filters.items())), page_size)
+    if st.session_state.get("claims_paging_key") != paging_key:
+        st.session_state.claims_paging_key = paging_key
+        st.session_state.claims_page = 1
+        st.session_state.claims_page_cursors = []
+
 
 def claims_tab():
     st.header("Claims Overview")
-    claims_query = "SELECT TOP 100 * FROM New_Claims"
-    claims = fetch_data(claims_query)
-    df_claims = pd.DataFrame(claims) if claims else pd.DataFrame()
 
     col1, col2 = st.columns([7, 3])
     with col2:
         search_col1, search_col2 = st.columns([40, 10])
-        claims_search = search_col1.text_input("Search", key="claims_search", placeholder="Search", label_visibility="collapsed")
+        claims_search = search_col1.text_input("Search", key="claims_search", placeholder="Claim or policy number", label_visibility="collapsed")
         search_button = search_col2.button("🔎", key="claims_search_button")
     with col1:
         st.markdown('<span style="font-size: 2em;"></span>', unsafe_allow_html=True)
 
     try:
-        if claims_search and not df_claims.empty:
-            mask = df_claims.apply(lambda row: row.astype(str).str.contains(claims_search, case=False, na=False).any(), axis=1)
-            df_claims = df_claims[mask]
+        with st.expander("Filters"):
+            filter_col1, filter_col2, filter_col3, filter_col4 = st.columns(4)
+            claim_status = filter_col1.selectbox("Claim Status", ["All"] + fetch_claim_statuses(), key="claims_status_filter")
+            executive = filter_col2.text_input("Executive", key="claims_executive_filter")
+            accident_from = filter_col3.date_input("Accident From", value=None, key="claims_accident_from")
+            accident_to = filter_col4.date_input("Accident To", value=None, key="claims_accident_to")
+
+        filters = {
+            "search": (claims_search or "").strip() or None,
+            "claim_status": None if claim_status == "All" else claim_status,
+            "executive": (executive or "").strip() or None,
+            "accident_from": accident_from,
+            "accident_to": accident_to,
+        }
+        page_size = st.session_state.get("claims_page_size", 10)
+        _reset_claims_paging(filters, page_size)
+
+        # Keyset pagination: page N starts after the last row of page N-1
+        page_num = st.session_state.claims_page
+        cursors = st.session_state.claims_page_cursors
+        after = cursors[page_num - 2] if page_num > 1 else None
+        # One extra row tells whether a next page exists without trusting the cached count.
+        # Pages come from the shared query cache, which a claim insert invalidates
+        claims = fetch_claims_page(filters, CLAIM_COLUMNS, page_size=page_size + 1, after=after, ttl=CLAIMS_PAGE_TTL)
+        has_next = len(claims) > page_size
+        claims = claims[:page_size]
+        df_claims = pd.DataFrame(claims) if claims else pd.DataFrame()
 
         if not df_claims.empty:
-            total_rows = len(df_claims)
-            # Default page size
-            page_size = st.session_state.get("claims_page_size", 10)
-            total_pages = (total_rows - 1) // page_size + 1
-            page_num = st.session_state.get("claims_page", 1)
             start_idx = (page_num - 1) * page_size
-            end_idx = start_idx + page_size
+            end_idx = start_idx + len(df_claims)
+            total_rows = max(count_claims(filters, ttl=CLAIMS_PAGE_TTL), end_idx + (1 if has_next else 0))
 
             # Show caption above the table
-            st.caption(f"Showing {start_idx+1}-{min(end_idx, total_rows)} of {total_rows} records")
+            st.caption(f"Showing {start_idx+1}-{end_idx} of {total_rows} records")
 
-            column_mapping = {
-                'Account_Code': 'Account Code',
-                'DATE_OF_INTIMATION': 'Intimation Date',
-                'DATE_OF_ACCIDENT': 'Accident Date',
-                'PLACE_OF_LOSS': 'Loss Location',
-                'CLAIM_NO': 'Claim Number',
-                'AGE': 'Driver Age',
-                'TYPE': 'Claim Type',
-                'DRIVING_LICENSE_ISSUE': 'License Issue Date',
-                'BODY_TYPE': 'Vehicle Body Type',
-                'MAKE': 'Vehicle Make',
-                'MODEL': 'Vehicle Model',
-                'YEAR': 'Model Year',
-                'CHASIS_NO': 'Chassis Number',
-                'REG': 'Registration Number',
-                'SUM_INSURED': 'Sum Insured',
-                'POLICY_NO': 'Policy Number',
-                'POLICY_START': 'Policy Start Date',
-                'POLICY_END': 'Policy End Date',
-                'INTIMATED_AMOUNT': 'Intimated Amount',
-                'INTIMATED_SF': 'Intimated SF',
-                'EXECUTIVE': 'Executive',
-                'PRODUCT': 'Product Type',
-                'POLICYTYPE': 'Policy Type',
-                'NATIONALITY': 'Nationality',
-                'Broker_ID': 'Broker ID',
-                'Broker_Name': 'Broker Name',
-                'Facility_ID': 'Facility ID',
-                'Facility_Name': 'Facility Name',
-                'CLAIM_STAGE': 'Claim Stage',
-                'CLAIM_STATUS': 'Claim Status',
-                'FINAL_SETTLEMENT_AMOUNT': 'Final Settlement',
-                'CLAIM_CLOSURE_DATE': 'Closure Date',
-                'REOPEN_REASON': 'Reopen Reason',
-                'CLAIM_REMARKS': 'Remarks',
-                'UPDATE_DATE': 'Last Updated'
-            }
             # Show table
             # Rename columns that exist in the dataframe
-            display_df = df_claims.iloc[start_idx:end_idx].reset_index(drop=True)
+            display_df = df_claims.drop(columns=KEYSET_COLUMNS, errors="ignore").reset_index(drop=True)
             display_df = display_df.rename(columns=column_mapping)
             # Set index to start from 1
             display_df.index = display_df.index + 1
             st.dataframe(display_df, use_container_width=True, height=410, hide_index=True)
 
-            # Show page size and page selection below the table
-            space, col_page, space, col_size = st.columns([10, 2, 10, 2])
+            # Show page size and page navigation below the table
+            total_pages = (total_rows - 1) // page_size + 1
+            space, col_prev, col_page, col_next, space, col_size = st.columns([10, 1, 2, 1, 10, 2])
             with col_size:
-                page_size = st.selectbox(
+                st.selectbox(
                     "Records",
-                    options=[10, 25, 50, 100, len(df_claims) if len(df_claims) > 0 else 1],
-                    index=0,
+                    options=[10, 25, 50, 100],
                     key="claims_page_size"
                 )
             with col_page:
-                total_pages = (total_rows - 1) // page_size + 1
-                page_num = st.number_input(
-                    "Page",
-                    min_value=1,
-                    max_value=total_pages,
-                    value=page_num,
-                    step=1,
-                    key="claims_page",
-                )
+                st.markdown(f"Page {page_num} of {total_pages}")
+            with col_prev:
+                if st.button("◀", key="claims_prev_page", disabled=page_num <= 1):
+                    st.session_state.claims_page = page_num - 1
+                    st.rerun()
+            with col_next:
+                if st.button("▶", key="claims_next_page", disabled=not has_next):
+                    last = claims[-1]
+                    del cursors[page_num - 1:]
+                    cursors.append((last.get("Submission_Date"), last.get("Unique_ID")))
+                    st.session_state.claims_page = page_num + 1
+                    st.rerun()
         else:
             st.info("No claims data found.")
     except Exception as e:
-        st.error(f"Error fetching claims: {e}")
\ No newline at end of file
+        st.error(f"Error fetching claims: {e}")
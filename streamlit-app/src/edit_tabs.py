@@ -6,6 +6,7 @@ from datetime import datetime, date
 # from upload_doc import upload_document
 
 from auto_loader import load_policy_from_json, show_policy_form
+from policy_import_tab import policy_import_tab
 
 
 from policy_forms import (
@@ -18,7 +19,7 @@ from policy_forms import (
     renewal_summary_display
 )
 
-from db_utils import insert_policy, fetch_data, insert_claim
+from db_utils import insert_policy, fetch_data, fetch_latest_policy, fetch_latest_claim, insert_claim
 
 
 def _build_unique_id(policy_no: str, submission_dt: datetime) -> str:
@@ -47,34 +48,6 @@ def _clear_new_claim_generated_keys():
             del st.session_state[k]
 
 
-def _fetch_latest_policy(policy_no: str):
-    # Pick the newest row for this policy number
-    query = f"""
-        SELECT TOP 1 *
-        FROM New_Policy
-        WHERE POLICY_NO = '{policy_no}'
-        ORDER BY 
-            CASE WHEN Submission_Date IS NULL THEN 1 ELSE 0 END ASC,
-            Submission_Date DESC,
-            Unique_ID DESC
-    """
-    return fetch_data(query)
-
-
-def _fetch_latest_claims(claim_no: str):
-    # Pick the newest row for this claim number
-    query = f"""
-        SELECT TOP 1 *
-        FROM New_Claims
-        WHERE CLAIM_NO = '{claim_no}'
-        ORDER BY 
-            CASE WHEN Submission_Date IS NULL THEN 1 ELSE 0 END ASC,
-            Submission_Date DESC,
-            Unique_ID DESC
-    """
-    return fetch_data(query)
-
-
 def new_submission_tab():
     st.header("New Submission")
     st.markdown("<br>", unsafe_allow_html=True)
@@ -82,7 +55,7 @@ def new_submission_tab():
     if "submission_mode" not in st.session_state:
         st.session_state.submission_mode = None
 
-    col1, col2, col3 = st.columns(3)
+    col1, col2, col3, col4 = st.columns(4)
     with col1:
         st.markdown("""
         <div style="border: 1px solid #ccc; border-radius: 30px; padding: 10px; margin-bottom: 10px; background-color: #144074; height: 120px;">
@@ -107,6 +80,14 @@ def new_submission_tab():
         </div>
         """, unsafe_allow_html=True)
         upload_btn = st.button("Upload Document", use_container_width=True, type="primary")
+    with col4:
+        st.markdown("""
+        <div style="border: 1px solid #ccc; border-radius: 30px; padding: 10px; margin-bottom: 10px; background-color: #144074; height: 120px;">
+            <h4 style="color: #23E4BA;">Bulk Policy Import</h4>
+            <p>Import New Business, MTA and Renewal policies from a CSV or Excel file.</p>
+        </div>
+        """, unsafe_allow_html=True)
+        import_btn = st.button("Bulk Import", use_container_width=True, type="primary")
 
     if policy_btn:
         st.session_state.submission_mode = "policy"
@@ -117,6 +98,9 @@ def new_submission_tab():
     elif upload_btn:
         st.session_state.submission_mode = "upload"
         st.rerun()
+    elif import_btn:
+        st.session_state.submission_mode = "bulk_import"
+        st.rerun()
 
     # Show the corresponding tab
     if st.session_state.submission_mode == "policy":
@@ -126,6 +110,8 @@ def new_submission_tab():
     elif st.session_state.submission_mode == "upload":
         load_policy_from_json()
         show_policy_form()
+    elif st.session_state.submission_mode == "bulk_import":
+        policy_import_tab()
         
 
 def policy_edit_tab():
@@ -210,7 +196,7 @@ def policy_edit_tab():
                         else:
                             # query = f"SELECT * FROM New_Policy WHERE POLICY_NO = '{policy_no}'"
                             # result = fetch_data(query)
-                            result = _fetch_latest_policy(policy_no)
+                            result = fetch_latest_policy(policy_no)
 
                             if result:
                                 # Show already cancelled or Lapsed warning at initial state
@@ -330,7 +316,7 @@ def policy_edit_tab():
                         else:
                             # query = f"SELECT * FROM New_Policy WHERE POLICY_NO = '{policy_no}'"
                             # result = fetch_data(query)
-                            result = _fetch_latest_policy(policy_no)
+                            result = fetch_latest_policy(policy_no)
                             if result:
                                 # Show already cancelled or Lapsed warning at initial state
                                 if result[0].get("isCancelled", 0) == 1:
@@ -525,7 +511,7 @@ def policy_edit_tab():
                         else:
                             # query = f"SELECT * FROM New_Policy WHERE POLICY_NO = '{policy_no}'"
                             # result = fetch_data(query)
-                            result = _fetch_latest_policy(policy_no)
+                            result = fetch_latest_policy(policy_no)
                             if result:
                                 # Show already cancelled or Lapsed warning at initial state
                                 if result[0].get("isCancelled", 0) == 1:
@@ -774,7 +760,7 @@ def claims_edit_tab():
                         try:
                             # query = f"SELECT * FROM New_Policy WHERE POLICY_NO = '{policy_no}'"
                             # policy_result = fetch_data(query)
-                            policy_result = _fetch_latest_policy(policy_no)
+                            policy_result = fetch_latest_policy(policy_no)
                             
                             if policy_result:
                                 policy_data = policy_result[0]
@@ -875,7 +861,7 @@ def claims_edit_tab():
                     if fetch_btn and claim_no.strip():
                         # query = f"SELECT * FROM Claims WHERE CLAIM_NO = '{claim_no}'"
                         # result = fetch_data(query)
-                        result = _fetch_latest_claims(claim_no)
+                        result = fetch_latest_claim(claim_no)
                         if result:
                             if result[0].get("STATUS", "").lower() == "closed":
                                 st.warning(f"Claim {claim_no} is already closed.")
@@ -985,7 +971,7 @@ def claims_edit_tab():
                     if fetch_btn_closure and claim_no.strip():
                         # query = f"SELECT * FROM Claims WHERE CLAIM_NO = '{claim_no}'"
                         # result = fetch_data(query)
-                        result = _fetch_latest_claims(claim_no)
+                        result = fetch_latest_claim(claim_no)
                         if result:
                             if result[0].get("STATUS", "").lower() == "closed":
                                 st.warning(f"Claim {claim_no} is already closed.")
@@ -1094,7 +1080,7 @@ def claims_edit_tab():
                     if fetch_btn_reopen and claim_no.strip():
                         # query = f"SELECT * FROM Claims WHERE CLAIM_NO = '{claim_no}'"
                         # result = fetch_data(query)
-                        result = _fetch_latest_claims(claim_no)
+                        result = fetch_latest_claim(claim_no)
                         if result:
                             if result[0].get("CLAIM_STATUS", "") != "Closed":
                                 st.warning(f"Claim {claim_no} is not closed. Only closed claims can be reopened.")
@@ -0,0 +1,57 @@
+"""Run document extraction workers outside the Streamlit process.
+
+    python src/extraction_worker.py --workers 2
+
+Workers share the SQLite job queue (JOB_QUEUE_PATH) with the app, and the
+queue's JOB_MAX_RUNNING limit applies across all of them. When dedicated
+workers are running, set JOB_EMBEDDED_WORKERS=0 for the app.
+"""
+import argparse
+import os
+import sys
+import time
+
+# Add the utils directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'utils')))
+
+from document_ai import EXTRACTION_FAILURE_HANDLERS, EXTRACTION_JOB_HANDLERS, EXTRACTION_SUCCESS_HANDLERS
+from job_queue import JobWorker, get_job_queue
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Process queued document extraction jobs")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("JOB_WORKERS", "2")),
+                        help="number of worker threads in this process")
+    parser.add_argument("--poll-interval", type=float, default=1.0,
+                        help="seconds to wait when no job is ready")
+    args = parser.parse_args()
+
+    queue = get_job_queue()
+    workers = [
+        JobWorker(
+            queue,
+            EXTRACTION_JOB_HANDLERS,
+            EXTRACTION_FAILURE_HANDLERS,
+            EXTRACTION_SUCCESS_HANDLERS,
+            poll_interval=args.poll_interval,
+            name=f"extraction-worker-{i + 1}",
+        )
+        for i in range(max(1, args.workers))
+    ]
+    for worker in workers:
+        worker.start()
+    print(f"Started {len(workers)} extraction worker(s) on {queue.path} (max running: {queue.max_running})")
+
+    try:
+        while any(worker.is_alive() for worker in workers):
+            time.sleep(5)
+    except KeyboardInterrupt:
+        print("Stopping workers after their current job...")
+        for worker in workers:
+            worker.stop()
+        for worker in workers:
+            worker.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Bulk-import New Business, MTA and Renewal policies from a CSV or XLSX file.
+
+    python src/import_policies.py policies.csv --dry-run
+    python src/import_policies.py policies.xlsx --errors-csv import_errors.csv
+
+Columns are named as in New_Policy (POLICY_NO, CUST_ID, EXECUTIVE, Broker_Name,
+Facility_Name, ...) plus an optional TransactionType (default New Business).
+Rows are validated with the manual form's rules and inserted one transaction
+per chunk; rows that fail are skipped and listed in the error report. Exits
+with status 1 when any row was rejected.
+"""
+import argparse
+import os
+import sys
+
+# Add the utils directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'utils')))
+
+from policy_import import POLICY_IMPORT_CHUNK_SIZE, import_policies
+
+
+def _print_progress(rows_read, accepted, rejected):
+    print(f"{rows_read} row(s) read: {accepted} accepted, {rejected} rejected")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-import policies from a CSV or XLSX file")
+    parser.add_argument("file", help="CSV or XLSX file with one policy transaction per row")
+    parser.add_argument("--chunk-size", type=int, default=POLICY_IMPORT_CHUNK_SIZE,
+                        help="rows validated and inserted per transaction")
+    parser.add_argument("--dry-run", action="store_true", help="validate only, write nothing")
+    parser.add_argument("--errors-csv", help="write the per-row error report to this CSV file")
+    args = parser.parse_args()
+
+    with open(args.file, "rb") as source:
+        summary = import_policies(source, os.path.basename(args.file), chunk_size=args.chunk_size,
+                                  dry_run=args.dry_run, on_progress=_print_progress)
+    errors = summary.pop("errors")
+
+    action = "would be inserted" if args.dry_run else "inserted"
+    count = summary["valid"] if args.dry_run else summary["inserted"]
+    print(f"{args.file}: {summary['rows']} row(s), {count} {action}, {summary['rejected']} rejected "
+          f"in {summary['seconds']} s ({summary['rows_per_minute']} rows/min)")
+    print("By transaction type: " + ", ".join(f"{name} {n}" for name, n in summary["by_type"].items()))
+    if len(errors):
+        if args.errors_csv:
+            errors.to_csv(args.errors_csv, index=False)
+            print(f"Error report written to {args.errors_csv}")
+        else:
+            print(errors.head(20).to_string(index=False))
+            if len(errors) > 20:
+                print(f"... {len(errors) - 20} more; use --errors-csv for the full report")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
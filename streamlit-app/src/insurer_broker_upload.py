@@ -16,11 +16,14 @@ import dotenv
 # Use absolute import for testing
 from broker_form import broker_form
 from insurer_form import insurer_form
+from blob_storage import upload_stream
+from extraction_cache import get_cached_extraction, store_extraction
+from ingest import ingest_upload
 
 from db_utils import (
     fetch_data, insert_broker, insert_insurer, insert_upload_document, 
     update_document_unique_id, log_app_event, log_document_operation, 
-    log_error, log_performance
+    log_error, log_performance, lookup_duplicate_documents, reusable_extraction
 )
 
 # Load environment variables
@@ -48,35 +51,41 @@ def clear_session_state():
     
     st.session_state.last_reset = datetime.now().timestamp()
 
-def compute_file_hash(file_path):
-    """Compute SHA-256 hash of file"""
-    hasher = hashlib.sha256()
-    with open(file_path, 'rb') as f:
-        hasher.update(f.read())
-    return hasher.hexdigest()
+def upload_to_blob(data, blob_name, metadata, length=None):
+    """Stream file data to Azure Blob Storage"""
+    return upload_stream(data, blob_name, metadata=metadata, content_type="application/octet-stream", length=length)
 
-def upload_to_blob(file_path, blob_name, metadata):
-    """Upload file to Azure Blob Storage"""
-    from azure.storage.blob import BlobServiceClient, ContentSettings
-    
-    blob_service_client = BlobServiceClient.from_connection_string(AZURE_CONNECTION_STRING)
-    blob_client = blob_service_client.get_blob_client(container=AZURE_CONTAINER_NAME, blob=blob_name)
-
-    with open(file_path, "rb") as data:
-        blob_client.upload_blob(data, overwrite=True, metadata=metadata,
-            content_settings=ContentSettings(content_type="application/octet-stream"))
-
-    return blob_client.url
+def process_multiple_documents_with_api(documents, bypass_cache=False):
+    """Send ingested documents (see ingest.IngestedFile) to API for processing and return the extracted JSON data.
 
-def process_multiple_documents_with_api(file_paths, file_names):
-    """Send multiple documents to API for processing and return the extracted JSON data"""
+    Results are cached by the files' SHA-256s (see extraction_cache); pass
+    ``bypass_cache=True`` to force a fresh extraction.
+    """
     correlation_id = str(uuid.uuid4())
     start_time = time.time()
     
     try:
+        # Validate inputs
+        if not documents:
+            raise ValueError("documents cannot be empty")
+
+        cached_result = get_cached_extraction([document.sha256 for document in documents], bypass=bypass_cache)
+        if cached_result is not None:
+            log_app_event(
+                log_level="INFO",
+                message=f"TOBA API call skipped, extraction cache hit for {len(documents)} documents",
+                module_name="TOBA_Document_AI",
+                action_type="API_CACHE_HIT",
+                function_name="process_multiple_documents_with_api",
+                api_endpoint=API_URL,
+                execution_time_ms=int((time.time() - start_time) * 1000),
+                correlation_id=correlation_id
+            )
+            return cached_result
+
         log_app_event(
             log_level="INFO",
-            message=f"TOBA API call started for {len(file_paths)} documents",
+            message=f"TOBA API call started for {len(documents)} documents",
             module_name="TOBA_Document_AI",
             action_type="API_CALL_START",
             function_name="process_multiple_documents_with_api",
@@ -84,30 +93,6 @@ def process_multiple_documents_with_api(file_paths, file_names):
             correlation_id=correlation_id
         )
         
-        # Validate inputs
-        if not file_paths or not file_names:
-            raise ValueError("file_paths and file_names cannot be empty")
-        
-        if len(file_paths) != len(file_names):
-            raise ValueError("file_paths and file_names must have the same length")
-        
-        # Prepare the files for the API request
-        files = {}
-        
-        for i, (file_path, file_name) in enumerate(zip(file_paths, file_names)):
-            try:
-                with open(file_path, 'rb') as f:
-                    file_content = f.read()
-                    if not file_content:
-                        raise ValueError(f"File {file_path} is empty")
-                    
-                    files[f'file{i+1}'] = (file_name, file_content, 'application/octet-stream')
-            except Exception as file_error:
-                raise Exception(f"Error reading file {file_path}: {file_error}")
-        
-        if not files:
-            raise ValueError("No valid files to process")
-        
         params = {'code': API_CODE}
         
         # Validate API configuration
@@ -116,8 +101,18 @@ def process_multiple_documents_with_api(file_paths, file_names):
         if not API_CODE:
             raise ValueError("API_CODE is not configured")
         
+        # One reader per document; in-memory uploads are not copied
+        files = {
+            f'file{i+1}': (document.name, document.open(), 'application/octet-stream')
+            for i, document in enumerate(documents)
+        }
+
         print(f"DEBUG: Making TOBA API request to {API_URL} with {len(files)} files")
-        response = requests.post(API_URL, files=files, params=params, timeout=300)
+        try:
+            response = requests.post(API_URL, files=files, params=params, timeout=300)
+        finally:
+            for _, reader, _ in files.values():
+                reader.close()
         
         api_time = int((time.time() - start_time) * 1000)
         
@@ -142,6 +137,7 @@ def process_multiple_documents_with_api(file_paths, file_names):
             try:
                 result = response.json()
                 print(f"DEBUG: TOBA API response received: {type(result)}")
+                store_extraction([document.sha256 for document in documents], result)
                 return result
             except ValueError as json_error:
                 print(f"DEBUG: JSON parse error: {json_error}")
@@ -183,8 +179,8 @@ def process_multiple_documents_with_api(file_paths, file_names):
             api_endpoint=API_URL,
             correlation_id=correlation_id,
             additional_data={
-                "file_count": len(file_paths) if file_paths else 0,
-                "file_names": file_names if file_names else []
+                "file_count": len(documents) if documents else 0,
+                "file_names": [document.name for document in documents] if documents else []
             }
         )
         raise Exception(f"Error processing TOBA documents with API: {e}")
@@ -278,6 +274,7 @@ def upload_toba_document():
                 accept_multiple_files=True,
                 help="Upload TOBA (Terms of Business Agreement) documents for Broker or Insurer onboarding"
             )
+            refresh_extraction = st.checkbox("Re-run extraction (ignore cached results)", value=False)
             submit = st.form_submit_button("Upload TOBA Slip")
             back = st.form_submit_button("Back")
             
@@ -285,27 +282,47 @@ def upload_toba_document():
                 if not uploaded_files or len(uploaded_files) == 0:
                     st.error("Please upload a TOBA Slip.")
                 else:
+                    staged_documents = []
                     try:
                         upload_start_time = time.time()
 
                         with st.spinner("Uploading TOBA Slip..."):
                             # Initialize collections
-                            temp_file_paths = []
                             file_names = []
                             file_hashes = []
                             guids = []
                             document_records = []
+                            duplicates = {}
                             
-                            # Process each file in the list
+                            # Read each upload once, hashing it on the way
+                            ingested = []
                             for i, uploaded_file in enumerate(uploaded_files):
+                                try:
+                                    document = ingest_upload(uploaded_file)
+                                except Exception as file_error:
+                                    log_error(
+                                        error=file_error,
+                                        module_name="TOBA_Document_Upload",
+                                        function_name="upload_toba_document",
+                                        correlation_id=correlation_id,
+                                        additional_data={"file_name": uploaded_file.name, "file_index": i}
+                                    )
+                                    st.error(f"Failed to process file {uploaded_file.name}: {file_error}")
+                                    continue
+                                staged_documents.append(document)
+                                ingested.append((i, uploaded_file, document))
+
+                            # One lookup for all files: ones uploaded before link the existing blob
+                            if ingested:
+                                duplicates = lookup_duplicate_documents(
+                                    [document.sha256 for _, _, document in ingested], correlation_id=correlation_id
+                                )
+
+                            # Process each file in the list
+                            for i, uploaded_file, document in ingested:
                                 file_start_time = time.time()
                                 
                                 try:
-                                    # Save uploaded file to temp location
-                                    with tempfile.NamedTemporaryFile(delete=False) as temp_file:
-                                        temp_file.write(uploaded_file.read())
-                                        temp_file_paths.append(temp_file.name)
-                                    
                                     # Generate unique identifiers
                                     file_name_without_ext = os.path.splitext(uploaded_file.name)[0]
                                     file_extension = os.path.splitext(uploaded_file.name)[1]
@@ -313,30 +330,37 @@ def upload_toba_document():
 
                                     guid = str(uuid.uuid4())
                                     guids.append(guid)
-                                    file_hash = compute_file_hash(temp_file_paths[-1])
+                                    file_hash = document.sha256
                                     file_hashes.append(file_hash)
                                     file_names.append(uploaded_file.name)
 
-                                    # Create unique filename with timestamp
-                                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")[:17]
-                                    unique_filename = f"TOBA_{timestamp}_{file_hash[:8]}_{guid[:4]}{file_extension}"
-
-                                    # Upload to Azure Blob Storage
-                                    metadata = {
-                                        "guid": guid,
-                                        "original_filename": original_filename,
-                                        "unique_filename": unique_filename,
-                                        "file_hash": file_hash,
-                                        "upload_date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                                        "file_size": str(uploaded_file.size),
-                                        "document_category": "TOBA"
-                                    }
-                                    
-                                    blob_url = upload_to_blob(
-                                        file_path=temp_file_paths[-1],
-                                        blob_name=unique_filename,
-                                        metadata=metadata
-                                    )
+                                    existing = duplicates.get(file_hash)
+                                    if existing:
+                                        # Point at the blob that is already stored, under the name it was stored as
+                                        unique_filename = existing["Unique_File_Name"]
+                                        blob_url = existing["Blob_Link"]
+                                    else:
+                                        # Create unique filename with timestamp
+                                        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")[:17]
+                                        unique_filename = f"TOBA_{timestamp}_{file_hash[:8]}_{guid[:4]}{file_extension}"
+
+                                        # Upload to Azure Blob Storage
+                                        metadata = {
+                                            "guid": guid,
+                                            "original_filename": original_filename,
+                                            "unique_filename": unique_filename,
+                                            "file_hash": file_hash,
+                                            "upload_date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                                            "file_size": str(uploaded_file.size),
+                                            "document_category": "TOBA"
+                                        }
+                                        with document.open() as data:
+                                            blob_url = upload_to_blob(
+                                                data=data,
+                                                blob_name=unique_filename,
+                                                metadata=metadata,
+                                                length=document.size
+                                            )
 
                                     # Prepare document record for document metadata table
                                     document_record = {
@@ -352,7 +376,7 @@ def upload_toba_document():
                                     
                                     # Log each file upload
                                     log_document_operation(
-                                        action_type="TOBA_FILE_UPLOADED",
+                                        action_type="TOBA_FILE_DEDUPLICATED" if existing else "TOBA_FILE_UPLOADED",
                                         document_info={
                                             'file_name': uploaded_file.name,
                                             'file_size_kb': uploaded_file.size / 1024,
@@ -384,36 +408,42 @@ def upload_toba_document():
                             st.session_state.document_guids = guids
                             
                             # Process all files with API together
-                            if temp_file_paths:  # Only if we have successfully processed files
+                            if staged_documents:  # Only if we have successfully processed files
                                 st.session_state.json_data = None
-                                with st.spinner("Extracting TOBA data from documents..."):
-                                    try:
-                                        json_data = process_multiple_documents_with_api(
-                                            file_paths=temp_file_paths,
-                                            file_names=file_names
-                                        )
-                                        st.session_state.json_data = json_data
-                                    except Exception as api_error:
-                                        log_error(
-                                            error=api_error,
-                                            module_name="TOBA_Document_AI",
-                                            function_name="process_multiple_documents_with_api",
-                                            correlation_id=correlation_id
-                                        )
-                                        st.warning(f"API processing failed: {api_error}. Using fallback processing...")
+                                reused_json = None if refresh_extraction else reusable_extraction(file_hashes, duplicates)
+                                if reused_json is not None:
+                                    json_data = reused_json
+                                    st.session_state.json_data = json_data
+                                    st.info("These TOBA documents were uploaded before - reusing the previous extraction.")
+                                else:
+                                    with st.spinner("Extracting TOBA data from documents..."):
+                                        try:
+                                            json_data = process_multiple_documents_with_api(
+                                                documents=staged_documents,
+                                                bypass_cache=refresh_extraction
+                                            )
+                                            st.session_state.json_data = json_data
+                                        except Exception as api_error:
+                                            log_error(
+                                                error=api_error,
+                                                module_name="TOBA_Document_AI",
+                                                function_name="process_multiple_documents_with_api",
+                                                correlation_id=correlation_id
+                                            )
+                                            st.warning(f"API processing failed: {api_error}. Using fallback processing...")
                                         
-                                        # Try to determine TOBA type from filename
-                                        toba_type = "Unknown"
-                                        for name in file_names:
-                                            name_lower = name.lower()
-                                            if "broker" in name_lower:
-                                                toba_type = "Broker"
-                                                break
-                                            elif "insurer" in name_lower:
-                                                toba_type = "Insurer"
-                                                break
+                                            # Try to determine TOBA type from filename
+                                            toba_type = "Unknown"
+                                            for name in file_names:
+                                                name_lower = name.lower()
+                                                if "broker" in name_lower:
+                                                    toba_type = "Broker"
+                                                    break
+                                                elif "insurer" in name_lower:
+                                                    toba_type = "Insurer"
+                                                    break
                                         
-                                        json_data = handle_toba_fallback(file_names, toba_type)
+                                            json_data = handle_toba_fallback(file_names, toba_type)
 
                                 # Extract document classification with defaults
                                 document_type = "toba"  # DEFAULT VALUE
@@ -484,13 +514,6 @@ def upload_toba_document():
                                         )
                                         st.error(f"Failed to log TOBA document {record['Original_File_Name']}: {db_error}")
 
-                                # Clean up temp files
-                                for file_path in temp_file_paths:
-                                    try:
-                                        os.remove(file_path)
-                                    except Exception as cleanup_error:
-                                        print(f"Warning: Could not remove temp file {file_path}: {cleanup_error}")
-                                
                                 st.success(f"{successful_inserts}/{len(uploaded_files)} TOBA document(s) uploaded successfully!")
                                 
                                 if successful_inserts > 0:
@@ -506,6 +529,10 @@ def upload_toba_document():
                             correlation_id=correlation_id
                         )
                         st.error(f"TOBA Upload failed: {e}")
+                    finally:
+                        # Release buffers and spool files
+                        for document in staged_documents:
+                            document.close()
             
             if back:
                 clear_session_state()
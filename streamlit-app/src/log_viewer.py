@@ -6,7 +6,7 @@ import os
 
 # Add the utils directory to sys.path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'utils')))
-from db_utils import fetch_data
+from db_utils import fetch
 
 def log_viewer_tab():
     st.header("📊 Application Logs")
@@ -29,7 +29,7 @@ def log_viewer_tab():
     if st.button("🔍 Search Logs"):
         try:
             # Build query
-            query = f"""
+            query = """
             SELECT TOP 1000
                 Log_Timestamp,
                 Log_Level,
@@ -42,19 +42,22 @@ def log_viewer_tab():
                 Execution_Time_MS,
                 Error_Code
             FROM App_Logs 
-            WHERE Log_Date BETWEEN '{start_date}' AND '{end_date}'
+            WHERE Log_Date BETWEEN %s AND %s
             """
+            params = [start_date, end_date]
             
             if selected_level != "ALL":
-                query += f" AND Log_Level = '{selected_level}'"
+                query += " AND Log_Level = %s"
+                params.append(selected_level)
             
             if selected_module != "ALL":
-                query += f" AND Module_Name = '{selected_module}'"
+                query += " AND Module_Name = %s"
+                params.append(selected_module)
             
             query += " ORDER BY Log_Timestamp DESC"
             
             # Fetch and display logs
-            logs = fetch_data(query)
+            logs = fetch(query, tuple(params))
             
             if logs:
                 df = pd.DataFrame(logs)
@@ -78,17 +81,17 @@ def log_viewer_tab():
     st.subheader("📈 Quick Stats")
     
     try:
-        stats_query = f"""
+        stats_query = """
         SELECT 
             COUNT(*) as Total_Logs,
             SUM(CASE WHEN Log_Level = 'ERROR' THEN 1 ELSE 0 END) as Error_Count,
             AVG(Execution_Time_MS) as Avg_Execution_Time,
             COUNT(DISTINCT Module_Name) as Active_Modules
         FROM App_Logs 
-        WHERE Log_Date >= '{start_date}'
+        WHERE Log_Date >= %s
         """
         
-        stats = fetch_data(stats_query)
+        stats = fetch(stats_query, (start_date,), ttl=15)  # new logs arrive constantly; keep this short
         if stats:
             col1, col2, col3, col4 = st.columns(4)
             col1.metric("Total Logs", stats[0]['Total_Logs'])
@@ -0,0 +1,69 @@
+import streamlit as st
+
+from policy_import import FILE_COLUMNS, POLICY_IMPORT_CHUNK_SIZE, import_policies
+
+
+def policy_import_tab():
+    st.header("Bulk Policy Import")
+    st.caption(
+        "Upload a CSV or Excel file with one policy transaction per row. Columns are named as in "
+        "the policy table; TransactionType is New Business (default), MTA or Renewal. MTA and "
+        "Renewal rows only need POLICY_NO and the fields that change."
+    )
+    with st.expander("Expected columns"):
+        st.code(",".join(FILE_COLUMNS))
+
+    uploaded_file = st.file_uploader("Policy file *", type=["csv", "xlsx"], key="policy_import_file")
+    col1, col2 = st.columns(2)
+    chunk_size = col1.number_input("Rows per transaction", min_value=100, max_value=50000,
+                                   value=POLICY_IMPORT_CHUNK_SIZE, step=500)
+    dry_run = col2.checkbox("Validate only (don't insert)", value=False)
+
+    if st.button("Import", type="primary", disabled=uploaded_file is None, key="policy_import_btn"):
+        progress = st.progress(0.0, text="Reading file...")
+
+        def on_progress(rows_read, accepted, rejected):
+            # The row count isn't known up front, so show progress through the file's bytes
+            position = uploaded_file.tell() / max(uploaded_file.size, 1)
+            progress.progress(min(position, 1.0), text=f"{rows_read:,} rows read: {accepted:,} accepted, {rejected:,} rejected")
+
+        try:
+            summary = import_policies(uploaded_file, uploaded_file.name, chunk_size=int(chunk_size),
+                                      dry_run=dry_run, on_progress=on_progress)
+        except Exception as e:
+            progress.empty()
+            st.error(f"Import failed: {e}")
+            return
+        progress.progress(1.0, text="Done")
+        st.session_state.policy_import_summary = summary
+
+    summary = st.session_state.get("policy_import_summary")
+    if not summary:
+        return
+    errors = summary["errors"]
+    m1, m2, m3, m4 = st.columns(4)
+    m1.metric("Rows", f"{summary['rows']:,}")
+    if summary["dry_run"]:
+        m2.metric("Valid", f"{summary['valid']:,}")
+    else:
+        m2.metric("Inserted", f"{summary['inserted']:,}")
+    m3.metric("Rejected", f"{summary['rejected']:,}")
+    m4.metric("Rows / minute", f"{summary['rows_per_minute']:,}")
+    st.caption(
+        f"{summary['file']}: " + ", ".join(f"{name} {count:,}" for name, count in summary["by_type"].items())
+        + f" in {summary['seconds']} s"
+    )
+
+    if len(errors):
+        st.warning(f"{summary['rejected']:,} row(s) were not imported. Fix them and re-import just those rows.")
+        st.dataframe(errors, use_container_width=True, hide_index=True)
+        st.download_button(
+            "Download error report",
+            data=errors.to_csv(index=False).encode("utf-8"),
+            file_name=f"{summary['file'].rsplit('.', 1)[0]}_errors.csv",
+            mime="text/csv",
+        )
+    elif summary["dry_run"]:
+        st.success("All rows are valid.")
+    else:
+        st.success("All rows were imported.")
@@ -0,0 +1,44 @@
+"""Scheduled refresh of dbo.Policy.isLapsed.
+
+    python src/policy_status_job.py                # once, e.g. from a daily cron entry
+    python src/policy_status_job.py --every 3600   # keep running, refreshing hourly
+    python src/policy_status_job.py --full         # reconcile every row
+
+Each run only examines policies whose effective or expiry date was crossed
+since the previous run (kept in Scheduled_Job_State) and writes in batches of
+LAPSE_BATCH_SIZE rows.
+"""
+import argparse
+import os
+import sys
+import time
+
+# Add the utils directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'utils')))
+
+from policy_status_utils import LAPSE_BATCH_SIZE, update_policy_lapsed_status
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Refresh the isLapsed flag on dbo.Policy")
+    parser.add_argument("--full", action="store_true",
+                        help="check every policy instead of only those whose dates were crossed")
+    parser.add_argument("--batch-size", type=int, default=LAPSE_BATCH_SIZE,
+                        help="rows updated per transaction")
+    parser.add_argument("--every", type=float, default=0,
+                        help="repeat every N seconds instead of running once")
+    args = parser.parse_args()
+
+    full = args.full
+    while True:
+        metrics = update_policy_lapsed_status(full=full, batch_size=args.batch_size)
+        print(f"Lapse refresh ({metrics['mode']}): {metrics['rows_touched']} row(s) updated "
+              f"in {metrics['batches']} batch(es), {metrics['duration_ms']} ms")
+        if not args.every:
+            return
+        full = False  # later passes only need the boundary crossings
+        time.sleep(args.every)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,29 @@
+import os
 import streamlit as st
 import pandas as pd
 import sys
-from db_utils import fetch_data
+from db_utils import count_policies, fetch_policy_page
 from pathlib import Path
 
+POLICY_COUNT_TTL = int(os.getenv("POLICY_COUNT_TTL", "30"))
+
+
+@st.cache_data(ttl=POLICY_COUNT_TTL, show_spinner=False)
+def _cached_policy_count(search):
+    # Only feeds the "of N" caption, so a slightly stale total is fine
+    return count_policies(search)
+
+
+def _reset_policy_paging(search, page_size):
+    """Start from page 1 whenever the search or page size changes"""
+    if st.session_state.get("policy_paging_key") != (search, page_size):
+        st.session_state.policy_paging_key = (search, page_size)
+        st.session_state.policy_page = 1
+        st.session_state.policy_page_cursors = []
 
 
 def policy_tab():
     st.header("Policy Overview")
-    policy_query = "SELECT TOP 100 * FROM New_Policy"
-    policies = fetch_data(policy_query)
-    df_policies = pd.DataFrame(policies) if policies else pd.DataFrame()
-    
 
     col1, col2 = st.columns([7, 3])
     with col2:
@@ -22,24 +34,31 @@ def policy_tab():
         st.markdown('<span style="font-size: 2em;"></span>', unsafe_allow_html=True)
 
     try:
-        if policy_search and not df_policies.empty:
-            mask = df_policies.apply(lambda row: row.astype(str).str.contains(policy_search, case=False, na=False).any(), axis=1)
-            df_policies = df_policies[mask]
+        policy_search = (policy_search or "").strip()
+        page_size = st.session_state.get("policy_page_size", 10)
+        _reset_policy_paging(policy_search, page_size)
+
+        # Keyset pagination: page N starts after the last row of page N-1
+        page_num = st.session_state.policy_page
+        cursors = st.session_state.policy_page_cursors
+        after = cursors[page_num - 2] if page_num > 1 else None
+        # One extra row tells whether a next page exists without trusting the cached count
+        policies = fetch_policy_page(policy_search, page_size=page_size + 1, after=after)
+        has_next = len(policies) > page_size
+        policies = policies[:page_size]
+        df_policies = pd.DataFrame(policies) if policies else pd.DataFrame()
 
         if not df_policies.empty:
-            total_rows = len(df_policies)
-            # Default page size
-            page_size = st.session_state.get("policy_page_size", 10)
-            total_pages = (total_rows - 1) // page_size + 1
-            page_num = st.session_state.get("policy_page", 1)
+            total_rows = _cached_policy_count(policy_search)
             start_idx = (page_num - 1) * page_size
-            end_idx = start_idx + page_size
+            end_idx = start_idx + len(df_policies)
+            total_rows = max(total_rows, end_idx + (1 if has_next else 0))
 
             # Caption
-            st.caption(f"Showing {start_idx+1}-{min(end_idx, total_rows)} of {total_rows} records")
+            st.caption(f"Showing {start_idx+1}-{end_idx} of {total_rows} records")
             
             # Table with renamed columns
-            display_df = df_policies.iloc[start_idx:end_idx].reset_index(drop=True)
+            display_df = df_policies.reset_index(drop=True)
             
             # Define column name mappings (customize as needed)
             column_mapping = {
@@ -81,25 +100,28 @@ def policy_tab():
             display_df.index = display_df.index + 1
             st.dataframe(display_df, use_container_width=True, height=410, hide_index=True)
 
-            # Show page size and page selection below the table
-            space, col_page, space, col_size = st.columns([10, 2,10,2])
+            # Show page size and page navigation below the table
+            total_pages = (total_rows - 1) // page_size + 1
+            space, col_prev, col_page, col_next, space, col_size = st.columns([10, 1, 2, 1, 10, 2])
             with col_size:
-                page_size = st.selectbox(
+                st.selectbox(
                     "Records",
-                    options=[10, 25, 50, 100, len(df_policies) if len(df_policies) > 0 else 1],
-                    index=0,
+                    options=[10, 25, 50, 100],
                     key="policy_page_size"
                 )
             with col_page:
-                total_pages = (total_rows - 1) // page_size + 1
-                page_num = st.number_input(
-                    "Page",
-                    min_value=1,
-                    max_value=total_pages,
-                    value=page_num,
-                    step=1,
-                    key="policy_page"
-                )
+                st.markdown(f"Page {page_num} of {total_pages}")
+            with col_prev:
+                if st.button("◀", key="policy_prev_page", disabled=page_num <= 1):
+                    st.session_state.policy_page = page_num - 1
+                    st.rerun()
+            with col_next:
+                if st.button("▶", key="policy_next_page", disabled=not has_next):
+                    last = policies[-1]
+                    del cursors[page_num - 1:]
+                    cursors.append((last.get("Submission_Date"), last.get("Unique_ID")))
+                    st.session_state.policy_page = page_num + 1
+                    st.rerun()
         else:
             st.info("No policy data found.")
     except Exception as e:
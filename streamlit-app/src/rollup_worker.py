@@ -0,0 +1,89 @@
+"""Maintain the daily policy/claims rollup tables used by Charts & Analytics.
+
+    python src/rollup_worker.py refresh                 # catch up from the watermark
+    python src/rollup_worker.py refresh --every 900     # keep refreshing every 15 minutes
+    python src/rollup_worker.py backfill --from 2015-01-01 --to 2024-12-31
+    python src/rollup_worker.py check --from 2024-01-01 [--repair]
+
+Run ``refresh`` from cron or a scheduler (or with --every) so the charts
+stay current. ``check`` exits with status 1 when a day's totals in the
+rollup differ from the base table; ``--repair`` rebuilds those days.
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import date
+
+# Add the utils directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'utils')))
+
+from rollups import ROLLUPS, backfill_rollup, check_rollup, refresh_rollup
+
+
+def _print_progress(name, chunk_start, chunk_end, written):
+    print(f"{name}: rebuilt {chunk_start} to {chunk_end} ({written} rollup rows so far)")
+
+
+def refresh(names, every):
+    while True:
+        for name in names:
+            summary = refresh_rollup(name)
+            print(f"{name}: {summary}")
+        if not every:
+            return
+        time.sleep(every)
+
+
+def backfill(names, start, end):
+    for name in names:
+        written = backfill_rollup(name, start, end, on_progress=_print_progress)
+        print(f"{name}: backfill wrote {written} rollup rows")
+
+
+def check(names, start, end, repair):
+    consistent = True
+    for name in names:
+        mismatches = check_rollup(name, start, end)
+        if not mismatches:
+            print(f"{name}: consistent from {start} to {end}")
+            continue
+        consistent = False
+        print(f"{name}: {len(mismatches)} day(s) differ from {ROLLUPS[name]['source']}")
+        for row in mismatches:
+            print(f"  {row}")
+        if repair:
+            for row in mismatches:
+                backfill_rollup(name, row["Day"], row["Day"])
+            print(f"{name}: rebuilt {len(mismatches)} day(s)")
+    return consistent or repair
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Refresh, backfill or check the daily rollup tables")
+    parser.add_argument("command", choices=["refresh", "backfill", "check"])
+    parser.add_argument("--rollup", choices=list(ROLLUPS), action="append",
+                        help="rollup to process (repeatable; default: all)")
+    parser.add_argument("--from", dest="start", type=date.fromisoformat,
+                        help="first day (YYYY-MM-DD) for backfill/check")
+    parser.add_argument("--to", dest="end", type=date.fromisoformat, default=date.today(),
+                        help="last day for backfill/check (default: today)")
+    parser.add_argument("--every", type=float, default=0,
+                        help="refresh: repeat every N seconds instead of running once")
+    parser.add_argument("--repair", action="store_true", help="check: rebuild days that differ")
+    args = parser.parse_args()
+
+    names = args.rollup or list(ROLLUPS)
+    if args.command == "refresh":
+        refresh(names, args.every)
+        return
+    if args.start is None:
+        parser.error(f"{args.command} needs --from")
+    if args.command == "backfill":
+        backfill(names, args.start, args.end)
+    elif not check(names, args.start, args.end, args.repair):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -18,7 +18,7 @@ from insurer_broker_upload import (
     show_insurer_broker_form
 )
 
-from db_utils import insert_broker, insert_insurer, fetch_data
+from db_utils import insert_broker, insert_insurer, fetch_data, QUERY_CACHE_TTL
 
 
 def toba_tab():
@@ -191,7 +191,7 @@ def toba_tab():
         st.subheader("All Brokers")
         
         try:
-            brokers = fetch_data("SELECT * FROM Broker")
+            brokers = fetch_data("SELECT * FROM Broker", ttl=QUERY_CACHE_TTL)
             if brokers:
                 # Set index to start from 1
                 df = pd.DataFrame(brokers)
@@ -230,7 +230,7 @@ def toba_tab():
         
         try:
             # Order by Facility_ID in ascending order
-            insurers = fetch_data("SELECT * FROM insurer ORDER BY Facility_ID ASC")
+            insurers = fetch_data("SELECT * FROM insurer ORDER BY Facility_ID ASC", ttl=QUERY_CACHE_TTL)
             if insurers:
                 df = pd.DataFrame(insurers)
                 
@@ -1,6 +1,7 @@
 import streamlit as st
 import tempfile
-from azure.storage.blob import BlobServiceClient, ContentSettings
+from blob_storage import upload_stream
+from ingest import ingest_upload
 import uuid, hashlib, os, tempfile
 import dotenv
 from pathlib import Path
@@ -14,23 +15,10 @@ API_KEY = os.getenv("API_KEY")
 API_CODE = os.getenv("API_CODE")
 
 
-def compute_file_hash(file_path):
-    """Compute SHA-256 hash of file"""
-    hasher = hashlib.sha256()
-    with open(file_path, 'rb') as f:
-        hasher.update(f.read())
-    return hasher.hexdigest()
-
-def upload_to_blob(file_path, blob_name, metadata):
-    """Upload file to Azure Blob Storage"""
-    blob_service_client = BlobServiceClient.from_connection_string(AZURE_CONNECTION_STRING)
-    blob_client = blob_service_client.get_blob_client(container=AZURE_CONTAINER_NAME, blob=blob_name)
-
-    with open(file_path, "rb") as data:
-        blob_client.upload_blob(data, overwrite=True, metadata=metadata,
-            content_settings=ContentSettings(content_type="application/octet-stream"))
-
-    return blob_client.url
+def upload_to_blob(data, blob_name, metadata, length=None):
+    """Stream file data to Azure Blob Storage"""
+    return upload_stream(data, blob_name, metadata=metadata,
+                         content_type="application/octet-stream", length=length)
 
 
 def upload_document():
@@ -50,14 +38,10 @@ def upload_document():
             else:
                 try:
                     with st.spinner("Uploading document..."):
-                        # Save uploaded file to temp location
-                        with tempfile.NamedTemporaryFile(delete=False) as temp_file:
-                            temp_file.write(uploaded_file.read())
-                            file_path = temp_file.name
-                        
                         # Generate unique identifiers
                         guid = str(uuid.uuid4())
-                        file_hash = compute_file_hash(file_path)
+                        document = ingest_upload(uploaded_file)
+                        file_hash = document.sha256
                         file_extension = os.path.splitext(uploaded_file.name)[-1]
                         
                         # Upload to Azure Blob Storage
@@ -66,14 +50,14 @@ def upload_document():
                             "upload_date": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
                         }
                         
-                        blob_url = upload_to_blob(
-                            file_path=file_path,
-                            blob_name=uploaded_file.name,
-                            metadata=metadata
-                        )
-                        
-                        # Clean up temp file
-                        os.remove(file_path)
+                        with document.open() as data:
+                            blob_url = upload_to_blob(
+                                data=data,
+                                blob_name=uploaded_file.name,
+                                metadata=metadata,
+                                length=document.size
+                            )
+                        document.close()
                         
                         # Optional: Extract document info (mock implementation)
                         # result = extract_info(uploaded_file.getvalue())
@@ -0,0 +1,184 @@
+import json
+import os
+import shutil
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import dotenv
+
+dotenv.load_dotenv(Path(__file__).parent.parent / ".env")
+
+DEFAULT_CONTENT_TYPE = "application/octet-stream"
+
+
+class AzureBlobBackend:
+    """Azure Blob Storage container behind one long-lived BlobServiceClient.
+
+    The client and its HTTP session are created once and shared by every
+    upload (the SDK clients are thread-safe), so connections and TLS sessions
+    are reused instead of being rebuilt per file. Payloads larger than
+    ``max_single_put_size`` are sent as staged blocks of ``max_block_size``
+    bytes, ``max_concurrency`` blocks at a time.
+    """
+
+    def __init__(
+        self,
+        connection_string: str,
+        container_name: str,
+        max_block_size: int = 4 * 1024 * 1024,
+        max_single_put_size: int = 8 * 1024 * 1024,
+        max_concurrency: int = 4,
+        connection_pool_size: int = 10,
+    ):
+        import requests
+        from requests.adapters import HTTPAdapter
+        from azure.core.pipeline.transport import RequestsTransport
+        from azure.storage.blob import BlobServiceClient, ContentSettings
+
+        if not connection_string:
+            raise ValueError("AZURE_CONNECTION_STRING is not configured")
+        if not container_name:
+            raise ValueError("AZURE_CONTAINER_NAME is not configured")
+
+        self._content_settings = ContentSettings
+        self.max_concurrency = max(1, max_concurrency)
+
+        # Size the urllib3 pool so parallel block uploads don't queue on it
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=connection_pool_size,
+            pool_maxsize=max(connection_pool_size, self.max_concurrency),
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+
+        self._service_client = BlobServiceClient.from_connection_string(
+            connection_string,
+            transport=RequestsTransport(session=session, session_owner=False),
+            max_block_size=max_block_size,
+            max_single_put_size=max_single_put_size,
+        )
+        self._container_client = self._service_client.get_container_client(container_name)
+
+    def upload(self, data, blob_name: str, metadata: Optional[Dict[str, str]] = None,
+               content_type: str = DEFAULT_CONTENT_TYPE, length: Optional[int] = None) -> str:
+        """Upload bytes or a readable stream and return the blob URL"""
+        blob_client = self._container_client.get_blob_client(blob_name)
+        blob_client.upload_blob(
+            data,
+            length=length,
+            overwrite=True,
+            metadata=metadata,
+            content_settings=self._content_settings(content_type=content_type),
+            max_concurrency=self.max_concurrency,
+        )
+        return blob_client.url
+
+    def download(self, blob_name: str) -> bytes:
+        """Read a whole blob into memory"""
+        blob_client = self._container_client.get_blob_client(blob_name)
+        return blob_client.download_blob(max_concurrency=self.max_concurrency).readall()
+
+
+class LocalBlobBackend:
+    """Filesystem stand-in for the Azure backend, for offline runs and benchmarks.
+
+    Blobs are written under ``root/container_name`` and their metadata and
+    content type go to a ``.meta.json`` file alongside; the returned URL is a
+    ``file://`` URI.
+    """
+
+    def __init__(self, root: str, container_name: str = "local", chunk_size: int = 4 * 1024 * 1024):
+        self.base_dir = Path(root, container_name or "local").resolve()
+        self.base_dir.mkdir(parents=True, exist_ok=True)
+        self.chunk_size = max(64 * 1024, chunk_size)
+
+    def upload(self, data, blob_name: str, metadata: Optional[Dict[str, str]] = None,
+               content_type: str = DEFAULT_CONTENT_TYPE, length: Optional[int] = None) -> str:
+        """Write bytes or a readable stream and return its file:// URL"""
+        target = self._path(blob_name)
+        target.parent.mkdir(parents=True, exist_ok=True)
+
+        with open(target, "wb") as out:
+            if isinstance(data, (bytes, bytearray, memoryview)):
+                out.write(data)
+            else:
+                shutil.copyfileobj(data, out, self.chunk_size)
+
+        with open(f"{target}.meta.json", "w", encoding="utf-8") as meta_file:
+            json.dump({"content_type": content_type, "metadata": metadata or {}}, meta_file)
+
+        return target.as_uri()
+
+    def download(self, blob_name: str) -> bytes:
+        return self._path(blob_name).read_bytes()
+
+    def _path(self, blob_name: str) -> Path:
+        target = (self.base_dir / blob_name).resolve()
+        if self.base_dir not in target.parents:
+            raise ValueError(f"Invalid blob name: {blob_name}")
+        return target
+
+
+_storage = None
+_storage_lock = threading.Lock()
+
+
+def get_blob_storage():
+    """Return the process-wide blob backend, creating it on first use.
+
+    BLOB_STORAGE_BACKEND selects "azure" (default) or "local"; the local
+    backend writes under LOCAL_BLOB_ROOT.
+    """
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                backend = os.getenv("BLOB_STORAGE_BACKEND", "azure").lower()
+                block_size = int(os.getenv("BLOB_MAX_BLOCK_SIZE", str(4 * 1024 * 1024)))
+                if backend == "local":
+                    _storage = LocalBlobBackend(
+                        root=os.getenv("LOCAL_BLOB_ROOT", "local_blobs"),
+                        container_name=os.getenv("AZURE_CONTAINER_NAME") or "local",
+                        chunk_size=block_size,
+                    )
+                elif backend == "azure":
+                    _storage = AzureBlobBackend(
+                        connection_string=os.getenv("AZURE_CONNECTION_STRING"),
+                        container_name=os.getenv("AZURE_CONTAINER_NAME"),
+                        max_block_size=block_size,
+                        max_single_put_size=int(os.getenv("BLOB_MAX_SINGLE_PUT_SIZE", str(8 * 1024 * 1024))),
+                        max_concurrency=int(os.getenv("BLOB_MAX_CONCURRENCY", "4")),
+                        connection_pool_size=int(os.getenv("BLOB_CONNECTION_POOL_SIZE", "10")),
+                    )
+                else:
+                    raise ValueError(f"Unknown BLOB_STORAGE_BACKEND: {backend}")
+    return _storage
+
+
+def upload_bytes(data, blob_name: str, metadata: Optional[Dict[str, Any]] = None,
+                 content_type: str = DEFAULT_CONTENT_TYPE) -> str:
+    """Upload an in-memory payload (bytes) and return its URL"""
+    return get_blob_storage().upload(data, blob_name, metadata=metadata, content_type=content_type,
+                                     length=len(data))
+
+
+def upload_stream(stream, blob_name: str, metadata: Optional[Dict[str, Any]] = None,
+                  content_type: str = DEFAULT_CONTENT_TYPE, length: Optional[int] = None) -> str:
+    """Upload from a readable file object without buffering it whole; returns its URL"""
+    return get_blob_storage().upload(stream, blob_name, metadata=metadata, content_type=content_type,
+                                     length=length)
+
+
+def upload_file(file_path, blob_name: str, metadata: Optional[Dict[str, Any]] = None,
+                content_type: str = DEFAULT_CONTENT_TYPE) -> str:
+    """Stream a file from disk to storage and return its URL"""
+    with open(file_path, "rb") as data:
+        return upload_stream(data, blob_name, metadata=metadata, content_type=content_type,
+                             length=os.path.getsize(file_path))
+
+
+def download_bytes(blob_name: str) -> bytes:
+    """Read a blob previously stored under ``blob_name``"""
+    return get_blob_storage().download(blob_name)
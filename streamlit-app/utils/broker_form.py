@@ -5,7 +5,7 @@ from datetime import date, datetime, timedelta
 import time
 import re
 
-from db_utils import fetch_data
+from db_utils import fetch
 
 
 # def generate_broker_id():
@@ -132,8 +132,8 @@ def broker_form(defaults=None):
                 return form_data, False, back
             
             # Check if FCA Registration Number exists
-            query = f"SELECT Broker_ID, Broker_Name FROM Broker WHERE FCA_Registration_Number = '{fca_registration}'"
-            result = fetch_data(query)
+            query = "SELECT Broker_ID, Broker_Name FROM Broker WHERE FCA_Registration_Number = %s"
+            result = fetch(query, (fca_registration,))
 
             if result and fca_registration.strip():
                 # FCA Registration exists, use the existing Broker ID and Name from DB
@@ -0,0 +1,162 @@
+import math
+import time
+
+from db_utils import db_connection, invalidate_cached_queries, log_performance
+
+STAGE_TABLE = "#backfill_stage"
+# SQL Server allows 2100 parameters per statement and 1000 rows per VALUES list
+_MAX_PARAMS = 2000
+_MAX_VALUES_ROWS = 1000
+
+
+def _quote(name):
+    """[schema].[table] / [column] from a trusted identifier"""
+    return ".".join(f"[{part.strip('[]')}]" for part in name.split("."))
+
+
+def _plain(value):
+    """pymssql-friendly value for numpy/pandas scalars (NaN/NaT -> None)"""
+    if value is None:
+        return None
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if type(value).__name__ == "NaTType":
+        return None
+    if hasattr(value, "to_pydatetime"):
+        return value.to_pydatetime()
+    if hasattr(value, "item"):
+        value = value.item()
+        return None if isinstance(value, float) and math.isnan(value) else value
+    return value
+
+
+def bulk_backfill(table, key_columns, value_columns, rows, dry_run=False, batch_size=5000):
+    """Set ``value_columns`` of ``table`` from ``rows`` matched on ``key_columns``.
+
+    ``rows`` yields tuples ordered as ``key_columns + value_columns`` (e.g.
+    ``df[keys + values].itertuples(index=False, name=None)``). They are
+    staged into a temp table with multi-row INSERTs and applied with one
+    set-based UPDATE ... FROM join, repeated ``batch_size`` rows per
+    transaction. Only rows whose values actually differ are written, so a
+    re-run is a no-op. With ``dry_run`` nothing is written; the result says
+    how many rows would change.
+
+    Returns a dict with staged/matched/changed counts, timings and rows/s.
+    """
+    key_columns, value_columns = list(key_columns), list(value_columns)
+    columns = key_columns + value_columns
+    target = _quote(table)
+    keys_match = " AND ".join(f"t.{_quote(c)} = s.{_quote(c)}" for c in key_columns)
+    # EXCEPT compares NULLs as equal, so unchanged rows (NULL or not) are skipped
+    differs = (
+        f"EXISTS (SELECT {', '.join(f's.{_quote(c)}' for c in value_columns)} "
+        f"EXCEPT SELECT {', '.join(f't.{_quote(c)}' for c in value_columns)})"
+    )
+    column_list = ", ".join(_quote(c) for c in columns)
+    key_list = ", ".join(_quote(c) for c in key_columns)
+    rows_per_insert = max(1, min(_MAX_VALUES_ROWS, _MAX_PARAMS // len(columns)))
+    row_placeholder = "(" + ", ".join(["%s"] * len(columns)) + ")"
+
+    start_time = time.time()
+    with db_connection() as conn, conn.cursor() as cursor:
+        # The connection is pooled, so drop any stage left behind by an earlier failure
+        cursor.execute(f"IF OBJECT_ID('tempdb..{STAGE_TABLE}') IS NOT NULL DROP TABLE {STAGE_TABLE}")
+        try:
+            # Copy the target's column types; the UNION ALL keeps SELECT INTO from copying IDENTITY
+            cursor.execute(
+                f"SELECT {column_list} INTO {STAGE_TABLE} FROM {target} WHERE 1 = 0 "
+                f"UNION ALL SELECT {column_list} FROM {target} WHERE 1 = 0"
+            )
+
+            staged = 0
+            chunk = []
+
+            def flush():
+                cursor.execute(
+                    f"INSERT INTO {STAGE_TABLE} ({column_list}) VALUES "
+                    + ", ".join([row_placeholder] * len(chunk)),
+                    tuple(_plain(value) for row in chunk for value in row),
+                )
+                chunk.clear()
+
+            for row in rows:
+                if len(row) != len(columns):
+                    raise ValueError(f"Expected {len(columns)} values per row ({column_list}), got {len(row)}")
+                chunk.append(row)
+                staged += 1
+                if len(chunk) == rows_per_insert:
+                    flush()
+            if chunk:
+                flush()
+            cursor.execute(
+                f"CREATE CLUSTERED INDEX IX_backfill_stage ON {STAGE_TABLE} ({key_list})"
+            )
+            conn.commit()
+            stage_seconds = time.time() - start_time
+
+            cursor.execute(
+                f"SELECT COUNT(*) FROM (SELECT {key_list} FROM {STAGE_TABLE} "
+                f"GROUP BY {key_list} HAVING COUNT(*) > 1) d"
+            )
+            duplicates = cursor.fetchone()[0]
+            if duplicates:
+                raise ValueError(f"{duplicates} key(s) appear more than once in the back-fill rows")
+
+            cursor.execute(
+                f"""
+                SELECT COUNT(*) AS matched, SUM(changed) AS changed
+                FROM (
+                    SELECT CASE WHEN {differs} THEN 1 ELSE 0 END AS changed
+                    FROM {STAGE_TABLE} s
+                    JOIN {target} t ON {keys_match}
+                ) m
+                """
+            )
+            matched, changed = cursor.fetchone()
+            changed = changed or 0
+
+            updated = 0
+            if not dry_run and changed:
+                assignments = ", ".join(f"{_quote(c)} = s.{_quote(c)}" for c in value_columns)
+                update_sql = f"""
+                UPDATE TOP (%s) t
+                SET {assignments}
+                FROM {target} t
+                JOIN {STAGE_TABLE} s ON {keys_match}
+                WHERE {differs}
+                """
+                while True:
+                    cursor.execute(update_sql, (batch_size,))
+                    batch_rows = cursor.rowcount
+                    conn.commit()
+                    updated += batch_rows
+                    # Updated rows no longer differ, so a short batch means we're done
+                    if batch_rows < batch_size:
+                        break
+        finally:
+            cursor.execute(f"IF OBJECT_ID('tempdb..{STAGE_TABLE}') IS NOT NULL DROP TABLE {STAGE_TABLE}")
+            conn.commit()
+
+    if updated:
+        invalidate_cached_queries(table.split(".")[-1].strip("[]"))
+
+    total_seconds = time.time() - start_time
+    apply_seconds = total_seconds - stage_seconds
+    stats = {
+        "table": table,
+        "dry_run": dry_run,
+        "staged": staged,
+        "matched": matched,
+        "unmatched": staged - matched,
+        "changed": changed,
+        "updated": updated,
+        "stage_seconds": round(stage_seconds, 3),
+        "apply_seconds": round(apply_seconds, 3),
+        "stage_rows_per_second": round(staged / stage_seconds) if stage_seconds else staged,
+        "apply_rows_per_second": round(updated / apply_seconds) if updated and apply_seconds else updated,
+        "rows_per_second": round(staged / total_seconds) if total_seconds else staged,
+    }
+    log_performance(
+        "BULK_BACKFILL", int(total_seconds * 1000), table_name=table, rows_affected=updated, additional_data=stats
+    )
+    return stats
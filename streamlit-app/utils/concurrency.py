@@ -0,0 +1,29 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+except ImportError:  # older/newer Streamlit layouts, or running outside Streamlit
+    add_script_run_ctx = None
+    get_script_run_ctx = None
+
+
+def script_context_executor(max_workers, thread_name_prefix="worker"):
+    """ThreadPoolExecutor whose threads share the calling Streamlit script context.
+
+    Worker threads can then read ``st.session_state`` (e.g. the session id that
+    log_app_event records). Rendering with ``st.*`` must still happen on the
+    script thread.
+    """
+    initializer = None
+    if get_script_run_ctx is not None:
+        ctx = get_script_run_ctx()
+        if ctx is not None:
+            def initializer():
+                add_script_run_ctx(threading.current_thread(), ctx)
+
+    return ThreadPoolExecutor(
+        max_workers=max(1, max_workers),
+        thread_name_prefix=thread_name_prefix,
+        initializer=initializer,
+    )
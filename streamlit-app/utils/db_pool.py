@@ -0,0 +1,254 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no pooled connection becomes available within the borrow timeout"""
+
+
+class _PooledConnection:
+    """Bookkeeping wrapper around a raw DB-API connection"""
+
+    __slots__ = ("conn", "created_at", "last_used")
+
+    def __init__(self, conn):
+        now = time.monotonic()
+        self.conn = conn
+        self.created_at = now
+        self.last_used = now
+
+
+class ConnectionPool:
+    """Thread-safe pool of reusable database connections.
+
+    Connections are created through ``factory`` (e.g. ``get_db_connection``) and
+    handed out with :meth:`connection`. Idle connections older than
+    ``idle_timeout`` or alive longer than ``max_lifetime`` are recycled, and a
+    connection that has been idle for ``health_check_after`` seconds is pinged
+    before it is handed out again. Connections are opened lazily; eviction
+    runs at most every ``eviction_interval`` seconds, on a release, and never
+    shrinks the pool below ``min_size``.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], Any],
+        min_size: int = 1,
+        max_size: int = 10,
+        idle_timeout: float = 300,
+        max_lifetime: float = 1800,
+        borrow_timeout: float = 30,
+        health_check_after: float = 30,
+        eviction_interval: float = 30,
+    ):
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        if min_size < 0 or min_size > max_size:
+            raise ValueError("min_size must be between 0 and max_size")
+
+        self._factory = factory
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.max_lifetime = max_lifetime
+        self.borrow_timeout = borrow_timeout
+        self.health_check_after = health_check_after
+        self.eviction_interval = eviction_interval
+
+        self._idle = deque()
+        self._in_use = 0
+        self._pending = 0
+        self._closed = False
+        self._next_eviction = time.monotonic() + eviction_interval
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+
+        self._stats = {
+            "borrowed": 0,
+            "created": 0,
+            "recycled": 0,
+            "health_check_failures": 0,
+            "borrow_timeouts": 0,
+            "total_wait_ms": 0.0,
+            "max_wait_ms": 0.0,
+        }
+
+    # ------------------------------------------------------------------ #
+    # Public API
+    # ------------------------------------------------------------------ #
+    @contextmanager
+    def connection(self):
+        """Borrow a connection for the duration of a ``with`` block.
+
+        Whatever the block left uncommitted (on an exception, or a clean exit
+        without commit) is rolled back before the connection goes back to the
+        pool, so it never leaks into the next borrower's transaction. If the
+        rollback itself fails the connection is considered broken and is
+        discarded.
+        """
+        pooled = self._borrow()
+        broken = False
+        try:
+            yield pooled.conn
+        finally:
+            try:
+                pooled.conn.rollback()
+            except Exception:
+                broken = True
+            self._release(pooled, broken)
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of pool counters for sizing under load"""
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot.update({
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "size": self._in_use + len(self._idle),
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+            })
+        borrowed = snapshot["borrowed"]
+        snapshot["avg_wait_ms"] = round(snapshot["total_wait_ms"] / borrowed, 3) if borrowed else 0.0
+        snapshot["total_wait_ms"] = round(snapshot["total_wait_ms"], 3)
+        snapshot["max_wait_ms"] = round(snapshot["max_wait_ms"], 3)
+        return snapshot
+
+    def evict_idle(self) -> int:
+        """Close idle connections past their idle timeout or lifetime, keeping min_size"""
+        now = time.monotonic()
+        to_close = []
+        with self._lock:
+            keep = deque()
+            while self._idle:
+                pooled = self._idle.popleft()
+                total = self._in_use + len(keep) + len(self._idle) + 1
+                if self._is_stale(pooled, now) and total > self.min_size:
+                    to_close.append(pooled)
+                else:
+                    keep.append(pooled)
+            self._idle = keep
+            self._stats["recycled"] += len(to_close)
+        for pooled in to_close:
+            self._close_quietly(pooled)
+        return len(to_close)
+
+    def close(self):
+        """Close every idle connection and refuse further borrows"""
+        with self._lock:
+            self._closed = True
+            idle, self._idle = list(self._idle), deque()
+            self._available.notify_all()
+        for pooled in idle:
+            self._close_quietly(pooled)
+
+    # ------------------------------------------------------------------ #
+    # Internals
+    # ------------------------------------------------------------------ #
+    def _borrow(self) -> _PooledConnection:
+        wait_start = time.monotonic()
+        deadline = wait_start + self.borrow_timeout
+
+        while True:
+            create = False
+            with self._lock:
+                while True:
+                    if self._closed:
+                        raise RuntimeError("Connection pool is closed")
+                    if self._idle:
+                        # LIFO keeps the hottest connections in rotation and lets
+                        # the cold tail age out through idle eviction
+                        pooled = self._idle.pop()
+                        self._in_use += 1
+                        break
+                    if self._in_use + self._pending < self.max_size:
+                        self._pending += 1
+                        create = True
+                        pooled = None
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["borrow_timeouts"] += 1
+                        raise PoolTimeoutError(
+                            f"No database connection available after {self.borrow_timeout}s "
+                            f"(max_size={self.max_size})"
+                        )
+                    self._available.wait(remaining)
+
+            if create:
+                try:
+                    pooled = _PooledConnection(self._factory())
+                except Exception:
+                    with self._lock:
+                        self._pending -= 1
+                        self._available.notify()
+                    raise
+                with self._lock:
+                    self._pending -= 1
+                    self._in_use += 1
+                    self._stats["created"] += 1
+            elif not self._is_usable(pooled):
+                with self._lock:
+                    self._in_use -= 1
+                    self._stats["recycled"] += 1
+                    self._available.notify()
+                self._close_quietly(pooled)
+                continue
+
+            wait_ms = (time.monotonic() - wait_start) * 1000
+            with self._lock:
+                self._stats["borrowed"] += 1
+                self._stats["total_wait_ms"] += wait_ms
+                self._stats["max_wait_ms"] = max(self._stats["max_wait_ms"], wait_ms)
+            return pooled
+
+    def _release(self, pooled: _PooledConnection, broken: bool = False):
+        now = time.monotonic()
+        with self._lock:
+            self._in_use -= 1
+            discard = broken or self._closed or (now - pooled.created_at) > self.max_lifetime
+            if discard:
+                self._stats["recycled"] += 1
+            else:
+                pooled.last_used = now
+                self._idle.append(pooled)
+            # Scan the idle list on a timer rather than on every release
+            evict = now >= self._next_eviction
+            if evict:
+                self._next_eviction = now + self.eviction_interval
+            self._available.notify()
+        if discard:
+            self._close_quietly(pooled)
+        if evict:
+            self.evict_idle()
+
+    def _is_stale(self, pooled: _PooledConnection, now: float) -> bool:
+        return (now - pooled.last_used) > self.idle_timeout or (now - pooled.created_at) > self.max_lifetime
+
+    def _is_usable(self, pooled: _PooledConnection) -> bool:
+        """Reject stale connections and ping ones that sat idle for a while"""
+        now = time.monotonic()
+        if self._is_stale(pooled, now):
+            return False
+        if (now - pooled.last_used) < self.health_check_after:
+            return True
+        try:
+            cursor = pooled.conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            cursor.close()
+            return True
+        except Exception:
+            with self._lock:
+                self._stats["health_check_failures"] += 1
+            return False
+
+    @staticmethod
+    def _close_quietly(pooled: _PooledConnection):
+        try:
+            pooled.conn.close()
+        except Exception:
+            pass
@@ -1,14 +1,20 @@
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 import os
 from pathlib import Path
 import pymssql
 import streamlit as st
+import threading
 import time
 import traceback
-import psutil
 import uuid
 import json 
+import re
+from decimal import Decimal
 import dotenv
+from db_pool import ConnectionPool
+from log_sink import AsyncLogSink
+from query_cache import get_query_cache, tables_in
+from system_metrics import get_system_metrics
 
 dotenv.load_dotenv(Path(__file__).parent.parent / ".env")
 
@@ -33,17 +39,349 @@ def get_db_connection():
     )
     return conn
 
-def fetch_data(query):
-    conn = get_db_connection()
-    cursor = conn.cursor(as_dict=True)  # as_dict=True returns results as dictionaries
-    
-    cursor.execute(query)
-    data = cursor.fetchall()
-    
-    cursor.close()
-    conn.close()
-    
-    return data
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_db_pool():
+    """Return the process-wide connection pool, creating it on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    factory=get_db_connection,
+                    min_size=int(os.getenv('DB_POOL_MIN_SIZE', '1')),
+                    max_size=int(os.getenv('DB_POOL_MAX_SIZE', '10')),
+                    idle_timeout=float(os.getenv('DB_POOL_IDLE_TIMEOUT', '300')),
+                    max_lifetime=float(os.getenv('DB_POOL_MAX_LIFETIME', '1800')),
+                    borrow_timeout=float(os.getenv('DB_POOL_BORROW_TIMEOUT', '30')),
+                    health_check_after=float(os.getenv('DB_POOL_HEALTH_CHECK_AFTER', '30')),
+                    eviction_interval=float(os.getenv('DB_POOL_EVICTION_INTERVAL', '30')),
+                )
+    return _pool
+
+
+def db_connection():
+    """Borrow a pooled connection: ``with db_connection() as conn: ...``"""
+    return get_db_pool().connection()
+
+
+def get_pool_stats():
+    """Pool counters (borrow wait time, in-use, created, recycled, ...)"""
+    return get_db_pool().stats()
+
+
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "60"))
+
+_PLACEHOLDER = re.compile(r"%%|%s")
+
+def _sql_type(value):
+    """sp_executesql parameter type for a Python value (fixed lengths keep the declaration stable)"""
+    if isinstance(value, bool):
+        return "bit"
+    if isinstance(value, int):
+        return "bigint"
+    if isinstance(value, float):
+        return "float"
+    if isinstance(value, Decimal):
+        return "decimal(38, 10)"
+    if isinstance(value, datetime):
+        return "datetime2"
+    if isinstance(value, date):
+        return "date"
+    if isinstance(value, (bytes, bytearray)):
+        return "varbinary(max)"
+    if isinstance(value, str) and not value.isascii():
+        return "nvarchar(4000)" if len(value) <= 4000 else "nvarchar(max)"
+    # varchar rather than nvarchar so comparisons against varchar columns can still seek
+    return "varchar(8000)" if value is None or len(str(value)) <= 8000 else "varchar(max)"
+
+def as_sp_executesql(query, params):
+    """Rewrite a ``%s`` query and its params as an ``sp_executesql`` call.
+
+    pymssql substitutes params into the SQL text on the client, so the
+    server would still see a different statement per value. Sending the
+    statement with ``@p0, @p1, ...`` through sp_executesql keeps its text
+    constant and lets SQL Server reuse one cached plan.
+    """
+    params = tuple(params)
+    if not params:
+        return query, None
+    names = iter(range(len(params)))
+    statement = _PLACEHOLDER.sub(lambda m: "%" if m.group() == "%%" else f"@p{next(names)}", query)
+    declarations = ", ".join(f"@p{i} {_sql_type(value)}" for i, value in enumerate(params))
+    assignments = ", ".join(f"@p{i} = %s" for i in range(len(params)))
+    return f"EXEC sp_executesql %s, %s, {assignments}", (statement, declarations, *params)
+
+def _run_query(query, params=None):
+    if params and not isinstance(params, dict):
+        query, params = as_sp_executesql(query, params)
+    with db_connection() as conn, conn.cursor(as_dict=True) as cursor:  # as_dict=True returns results as dictionaries
+        cursor.execute(query, params)
+        return cursor.fetchall()
+
+def fetch(query, params=None, ttl=None, tags=None):
+    """Run a read-only query and return its rows as dicts.
+
+    Pass values through ``params`` (``%s`` placeholders) rather than
+    formatting them into the SQL: the statement text then stays the same
+    for every value, so SQL Server reuses one cached plan, and values can't
+    inject SQL.
+
+    With ``ttl`` (seconds) the result is served from the shared query cache
+    until it expires or a write to one of its tables invalidates it; ``tags``
+    overrides the tables parsed from the query. Without ``ttl`` the query
+    always runs. Cached rows are shared between sessions: don't mutate them.
+    """
+    if not ttl:
+        return _run_query(query, params)
+    return get_query_cache().get_or_load(query, params, lambda: _run_query(query, params), ttl, tags)
+
+def fetch_one(query, params=None):
+    """First row of a parameterized query as a dict, or None"""
+    rows = _run_query(query, params)
+    return rows[0] if rows else None
+
+def fetch_data(query, params=None, ttl=None, tags=None):
+    """Same as fetch (kept for existing callers)"""
+    return fetch(query, params, ttl=ttl, tags=tags)
+
+def invalidate_cached_queries(*tables):
+    """Drop cached results that read any of ``tables``; returns how many were dropped.
+
+    The count is also kept in the "invalidations" counter of get_query_cache_stats.
+    """
+    return get_query_cache().invalidate(*tables)
+
+def get_query_cache_stats():
+    """Hit/miss/eviction counters of the shared query cache"""
+    return get_query_cache().stats()
+
+LATEST_VERSION_TTL = float(os.getenv("LATEST_VERSION_TTL", "30"))
+
+# Versioned tables: each resubmission adds a row, the newest one is current
+_LATEST_VERSION_SOURCES = {
+    "policy": ("New_Policy", "POLICY_NO"),
+    "claim": ("New_Claims", "CLAIM_NO"),
+}
+
+def fetch_latest_versions(kind, numbers, use_cache=True):
+    """Current (newest) row for each policy or claim number, in one round trip.
+
+    ``kind`` is "policy" or "claim". Returns ``{number: row}``; numbers with
+    no rows are left out. The numbers are sent as one JSON parameter and
+    each is resolved with a TOP 1 seek on the (number, Submission_Date DESC,
+    Unique_ID DESC) index, so the statement text is the same for any batch.
+    Results, including misses, are cached for LATEST_VERSION_TTL seconds and
+    dropped when insert_policy/insert_claim write the table; pass
+    ``use_cache=False`` where a stale answer matters (duplicate checks).
+    """
+    table, number_column = _LATEST_VERSION_SOURCES[kind]
+    numbers = list(dict.fromkeys(str(number) for number in numbers if number not in (None, "")))
+    if not numbers:
+        return {}
+    # NULL dates sort last under DESC, as the old CASE WHEN ... IS NULL ordering did
+    query = f"""
+    SELECT k.lookup_no AS Lookup_No, v.*
+    FROM OPENJSON(%s) WITH (lookup_no varchar(255) '$') k
+    CROSS APPLY (
+        SELECT TOP 1 *
+        FROM {table} t
+        WHERE t.{number_column} = k.lookup_no
+        ORDER BY t.Submission_Date DESC, t.Unique_ID DESC
+    ) v
+    """
+
+    def load(missing):
+        rows = _run_query(query, (json.dumps(missing),))
+        return {row.pop("Lookup_No"): row for row in rows}
+
+    if use_cache:
+        rows = get_query_cache().get_many_or_load(
+            f"latest version: {table}", numbers, load, LATEST_VERSION_TTL, tags=(table,)
+        )
+    else:
+        rows = load(numbers)
+    # Copies, so callers can't modify the cached rows
+    return {number: dict(row) for number, row in rows.items() if row is not None}
+
+def fetch_latest_policy(policy_no, use_cache=True):
+    """Newest New_Policy row for ``policy_no`` as a one-row list (empty if none), like fetch"""
+    row = fetch_latest_versions("policy", [policy_no], use_cache).get(str(policy_no))
+    return [row] if row else []
+
+def fetch_latest_claim(claim_no, use_cache=True):
+    """Newest New_Claims row for ``claim_no`` as a one-row list (empty if none), like fetch"""
+    row = fetch_latest_versions("claim", [claim_no], use_cache).get(str(claim_no))
+    return [row] if row else []
+
+def like_prefix(term):
+    """LIKE pattern matching values that start with ``term`` (wildcards in it are escaped)"""
+    escaped = term.replace("[", "[[]").replace("%", "[%]").replace("_", "[_]")
+    return f"{escaped}%"
+
+def search_condition(search, columns, int_columns=()):
+    """``(col1 LIKE %s OR ...)`` prefix match over ``columns``, with its params.
+
+    ``int_columns`` are integer columns matched by equality, and only when
+    the search text is a whole number: a LIKE on them would convert every
+    row and turn the whole OR into a scan.
+    """
+    if not search or not search.strip():
+        return None, ()
+    search = search.strip()
+    clauses = [f"{column} LIKE %s" for column in columns]
+    params = [like_prefix(search)] * len(columns)
+    if search.isdigit() and int(search) < 2 ** 31:
+        clauses.extend(f"{column} = CAST(%s AS int)" for column in int_columns)
+        params.extend([int(search)] * len(int_columns))
+    return "(" + " OR ".join(clauses) + ")", tuple(params)
+
+def keyset_condition(after):
+    """Rows after ``(Submission_Date, Unique_ID)`` in ``Submission_Date DESC, Unique_ID DESC`` order.
+
+    NULL dates sort last in that order, so rows without a date follow every
+    dated row.
+    """
+    if after is None:
+        return None, ()
+    after_date, after_uid = after
+    if after_date is None:
+        return "(Submission_Date IS NULL AND Unique_ID < %s)", (after_uid,)
+    return (
+        "(Submission_Date < %s OR (Submission_Date = %s AND Unique_ID < %s) OR Submission_Date IS NULL)",
+        (after_date, after_date, after_uid),
+    )
+
+def fetch_keyset_page(table, columns="*", conditions=(), page_size=10, after=None, ttl=None):
+    """One page of ``table``, newest first, starting after the ``after`` key.
+
+    ``conditions`` is a list of ``(sql, params)`` pairs ANDed together (None
+    entries are skipped). ``table`` and ``columns`` are trusted identifiers.
+    With ``ttl`` the page is cached like any ``fetch``.
+    """
+    clauses, params = [], []
+    for clause, clause_params in list(conditions) + [keyset_condition(after)]:
+        if clause:
+            clauses.append(clause)
+            params.extend(clause_params)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    query = f"""
+    SELECT TOP (%s) {columns}
+    FROM {table}
+    {where}
+    ORDER BY Submission_Date DESC, Unique_ID DESC
+    """
+    return fetch(query, (int(page_size), *params), ttl=ttl)
+
+def count_rows(table, conditions=(), ttl=None):
+    """``COUNT(*)`` of ``table`` under the same ``(sql, params)`` conditions as fetch_keyset_page"""
+    clauses, params = [], []
+    for clause, clause_params in conditions:
+        if clause:
+            clauses.append(clause)
+            params.extend(clause_params)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    return fetch(f"SELECT COUNT(*) AS row_count FROM {table} {where}", tuple(params), ttl=ttl)[0]["row_count"]
+
+POLICY_SEARCH_COLUMNS = ("POLICY_NO", "CHASSIS_NO", "REGN", "Broker_Name")
+POLICY_SEARCH_INT_COLUMNS = ("CUST_ID",)
+
+def fetch_policy_page(search=None, page_size=10, after=None):
+    """A page of New_Policy rows matching ``search``, newest submission first"""
+    return fetch_keyset_page(
+        "New_Policy", conditions=[search_condition(search, POLICY_SEARCH_COLUMNS, POLICY_SEARCH_INT_COLUMNS)],
+        page_size=page_size, after=after
+    )
+
+def count_policies(search=None):
+    """Number of New_Policy rows matching ``search``"""
+    return count_rows("New_Policy", [search_condition(search, POLICY_SEARCH_COLUMNS, POLICY_SEARCH_INT_COLUMNS)])
+
+CLAIM_SEARCH_COLUMNS = ("CLAIM_NO", "POLICY_NO")
+
+def claim_filter_conditions(search=None, claim_status=None, executive=None, accident_from=None, accident_to=None):
+    """``(sql, params)`` conditions for the Claims Overview filters (all optional)"""
+    conditions = [search_condition(search, CLAIM_SEARCH_COLUMNS)]
+    if claim_status:
+        conditions.append(("CLAIM_STATUS = %s", (claim_status,)))
+    if executive:
+        conditions.append(search_condition(executive, ("EXECUTIVE",)))
+    if accident_from:
+        conditions.append(("DATE_OF_ACCIDENT >= %s", (accident_from,)))
+    if accident_to:
+        # Inclusive end date, whether the column holds dates or datetimes
+        conditions.append(("DATE_OF_ACCIDENT < %s", (accident_to + timedelta(days=1),)))
+    return conditions
+
+TABLE_COLUMNS_TTL = 3600
+
+def existing_columns(table, columns):
+    """The entries of ``columns`` that ``table`` actually has, in the given order.
+
+    Lets a screen keep a fixed column list while tolerating columns missing
+    from a particular database. The table's column names are cached for
+    TABLE_COLUMNS_TTL seconds.
+    """
+    rows = fetch(
+        "SELECT COLUMN_NAME FROM INFORMATION_SCHEMA.COLUMNS WHERE TABLE_NAME = %s",
+        (table,), ttl=TABLE_COLUMNS_TTL,
+    )
+    present = {row["COLUMN_NAME"].lower() for row in rows}
+    if not present:
+        # Metadata not visible to this login: fall back to the full list
+        return list(columns)
+    return [column for column in columns if column.lower() in present]
+
+def fetch_claims_page(filters, columns, page_size=10, after=None, ttl=None):
+    """A page of New_Claims (only those of ``columns`` the table has) matching ``filters``, newest first"""
+    return fetch_keyset_page(
+        "New_Claims", columns=", ".join(existing_columns("New_Claims", columns)),
+        conditions=claim_filter_conditions(**filters),
+        page_size=page_size, after=after, ttl=ttl
+    )
+
+def count_claims(filters, ttl=None):
+    """Number of New_Claims rows matching ``filters``"""
+    return count_rows("New_Claims", claim_filter_conditions(**filters), ttl=ttl)
+
+def fetch_claim_statuses(ttl=QUERY_CACHE_TTL):
+    """Distinct CLAIM_STATUS values, for the status filter; cached until a claim write"""
+    rows = fetch(
+        "SELECT DISTINCT CLAIM_STATUS FROM New_Claims WHERE CLAIM_STATUS IS NOT NULL ORDER BY CLAIM_STATUS",
+        ttl=ttl
+    )
+    return [row["CLAIM_STATUS"] for row in rows]
+
+# Chart periods; TRY_CONVERT tolerates POL_EFF_DATE values that aren't valid dates
+POLICY_CHART_PERIODS = {
+    "Year": "YEAR(TRY_CONVERT(date, POL_EFF_DATE))",
+    "Month": "MONTH(TRY_CONVERT(date, POL_EFF_DATE))",
+}
+
+def active_policy_counts(granularity="Year", ttl=QUERY_CACHE_TTL):
+    """Active policies grouped by effective-date period and POLICYTYPE.
+
+    Counts each policy once, by its current (newest) version, over the
+    whole table. Returns ``[{"Period", "POLICYTYPE", "Active_Policies"}]``;
+    Period is the year or month number (1-12), None when the date is
+    missing. Cached per granularity until a policy insert.
+    """
+    period = POLICY_CHART_PERIODS[granularity]
+    query = f"""
+    WITH current_policy AS (
+        SELECT POL_EFF_DATE, POLICYTYPE, isCancelled,
+               ROW_NUMBER() OVER (PARTITION BY POLICY_NO ORDER BY Submission_Date DESC, Unique_ID DESC) AS version_rank
+        FROM New_Policy
+    )
+    SELECT {period} AS Period, POLICYTYPE, COUNT(*) AS Active_Policies
+    FROM current_policy
+    WHERE version_rank = 1 AND isCancelled = 0
+    GROUP BY {period}, POLICYTYPE
+    """
+    return fetch(query, ttl=ttl)
 
 def insert_policy(policy_data):
     """Insert policy with logging"""
@@ -66,15 +404,15 @@ def insert_policy(policy_data):
             user_ip_address=user_ip,
             request_path=current_page,
         )
-        conn = get_db_connection()
-        cursor = conn.cursor()
         columns = ', '.join(policy_data.keys())
         placeholders = ', '.join(['%s'] * len(policy_data))  # Changed from ? to %s
         sql = f"INSERT INTO New_Policy ({columns}) VALUES ({placeholders})"
-        
-        cursor.execute(sql, list(policy_data.values()))
-        rows_affected = cursor.rowcount
-        conn.commit()
+
+        with db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute(sql, list(policy_data.values()))
+            rows_affected = cursor.rowcount
+            conn.commit()
+        invalidate_cached_queries("New_Policy")
         execution_time = int((time.time() - start_time) * 1000)
         log_database_operation(
             operation="INSERT",
@@ -102,27 +440,67 @@ def insert_policy(policy_data):
             request_path=current_page
         )
         raise
-    finally:
-        if 'conn' in locals():
-            cursor.close()
-            conn.close()
 
-def execute_query(query):
-    conn = get_db_connection()
-    cursor = conn.cursor()
+# SQL Server allows 2100 parameters per statement and 1000 rows per VALUES list
+POLICY_ROWS_PER_INSERT_MAX = 1000
+
+def insert_policies(columns, rows, correlation_id=None, transaction_type=None):
+    """Insert many New_Policy rows in one transaction; returns the number inserted.
+
+    ``rows`` are value tuples ordered as ``columns``. They go in as multi-row
+    INSERTs (as many rows per statement as the parameter limit allows) and
+    are committed together, so either every row lands or none does. One
+    DATABASE log event is written for the whole batch.
+    """
+    start_time = time.time()
+    columns = list(columns)
+    rows = list(rows)
+    rows_per_insert = max(1, min(POLICY_ROWS_PER_INSERT_MAX, 2000 // len(columns)))
+    row_placeholder = "(" + ", ".join(["%s"] * len(columns)) + ")"
     try:
+        with db_connection() as conn, conn.cursor() as cursor:
+            for start in range(0, len(rows), rows_per_insert):
+                chunk = rows[start:start + rows_per_insert]
+                cursor.execute(
+                    f"INSERT INTO New_Policy ({', '.join(columns)}) VALUES "
+                    + ", ".join([row_placeholder] * len(chunk)),
+                    tuple(value for row in chunk for value in row),
+                )
+            conn.commit()
+    except Exception as e:
+        log_error(
+            error=e,
+            module_name="Database",
+            function_name="insert_policies",
+            reference_type="POLICY",
+            correlation_id=correlation_id,
+            additional_data={"rows": len(rows)},
+        )
+        raise
+    if rows:
+        invalidate_cached_queries("New_Policy")
+    log_database_operation(
+        operation="BULK_INSERT",
+        table_name="New_Policy",
+        rows_affected=len(rows),
+        execution_time_ms=int((time.time() - start_time) * 1000),
+        reference_type="POLICY",
+        transaction_type=transaction_type,
+        correlation_id=correlation_id,
+    )
+    return len(rows)
+
+def execute_query(query):
+    with db_connection() as conn, conn.cursor() as cursor:
         cursor.execute(query)
         conn.commit()
-    finally:
-        cursor.close()
-        conn.close()
+    invalidate_cached_queries(*tables_in(query))
 
 def insert_claim(claim_data):
     """Insert new claim into database"""
     start_time = time.time()
     correlation_id = str(uuid.uuid4())
 
-    conn = None
     try:
         log_app_event(
             log_level="INFO",
@@ -135,18 +513,16 @@ def insert_claim(claim_data):
             correlation_id=correlation_id
         )
     
-        conn = get_db_connection()
-        cursor = conn.cursor()
-    
         columns = ', '.join(claim_data.keys())
         placeholders = ', '.join(['%s' for _ in claim_data])  # Changed from ? to %s
         values = tuple(claim_data.values())
     
         query = f"INSERT INTO New_Claims ({columns}) VALUES ({placeholders})"
-        cursor.execute(query, values)
-        rows_affected = cursor.rowcount
-
-        conn.commit()
+        with db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute(query, values)
+            rows_affected = cursor.rowcount
+            conn.commit()
+        invalidate_cached_queries("New_Claims")
         execution_time = int((time.time() - start_time) * 1000)
 
         log_database_operation(
@@ -172,207 +548,180 @@ def insert_claim(claim_data):
             correlation_id=correlation_id
         )
         raise
-    finally:
-        if conn:
-            try:
-                cursor.close()
-                conn.close()
-            except:
-                pass
 
 def insert_broker(broker_data):
     """Insert broker with error handling or update if FCA_Registration_Number exists"""
-    conn = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # First check if the FCA_Registration_Number already exists
-        fca_registration = broker_data.get("FCA_Registration_Number")
-        if fca_registration and fca_registration.strip():
-            # Check if FCA Registration Number exists
-            check_query = "SELECT Broker_ID FROM Broker WHERE FCA_Registration_Number = %s"
-            cursor.execute(check_query, (fca_registration,))
-            existing_record = cursor.fetchone()
-            
-            if existing_record:
-                # Record exists, perform an update instead of insert
-                update_fields = {k: v for k, v in broker_data.items() 
-                               if k not in ["Broker_ID", "FCA_Registration_Number"]}
-                
-                if update_fields:
-                    set_clause = ', '.join([f"{key} = %s" for key in update_fields.keys()])
-                    values = list(update_fields.values()) + [fca_registration]
-                    update_query = f"UPDATE Broker SET {set_clause} WHERE FCA_Registration_Number = %s"
-                    cursor.execute(update_query, values)
-                    conn.commit()
-                    return "updated"
-                else:
-                    return "no_changes"
-        
-        # Proceed with insert
-        insert_query = """
-        INSERT INTO Broker (
-            Broker_ID, Broker_Name, Commission, Date_Of_Onboarding,
-            FCA_Registration_Number, Broker_Type, Market_Access, Delegated_Authority, Longevity_Years, Date_Of_Expiry, Status, Submission_Date, GUID)
-              VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """
-        
-        values = (
-            broker_data.get("Broker_ID"),
-            broker_data.get("Broker_Name"),
-            broker_data.get("Commission"),
-            broker_data.get("Date_Of_Onboarding"),
-            fca_registration,
-            broker_data.get("Broker_Type"),
-            broker_data.get("Market_Access"),
-            broker_data.get("Delegated_Authority"),
-            broker_data.get("Longevity_Years"),
-            broker_data.get("Date_Of_Expiry"),
-            broker_data.get("Status", "Active"),
-            broker_data.get("Submission_Date", datetime.now().strftime("%Y-%m-%d %H:%M:%S")),
-            broker_data.get("GUID", None)
-        )
-        
-        cursor.execute(insert_query, values)
-        conn.commit()
-        return "inserted"
-        
+        with db_connection() as conn, conn.cursor() as cursor:
+            # First check if the FCA_Registration_Number already exists
+            fca_registration = broker_data.get("FCA_Registration_Number")
+            if fca_registration and fca_registration.strip():
+                # Check if FCA Registration Number exists
+                check_query = "SELECT Broker_ID FROM Broker WHERE FCA_Registration_Number = %s"
+                cursor.execute(check_query, (fca_registration,))
+                existing_record = cursor.fetchone()
+
+                if existing_record:
+                    # Record exists, perform an update instead of insert
+                    update_fields = {k: v for k, v in broker_data.items() 
+                                   if k not in ["Broker_ID", "FCA_Registration_Number"]}
+
+                    if update_fields:
+                        set_clause = ', '.join([f"{key} = %s" for key in update_fields.keys()])
+                        values = list(update_fields.values()) + [fca_registration]
+                        update_query = f"UPDATE Broker SET {set_clause} WHERE FCA_Registration_Number = %s"
+                        cursor.execute(update_query, values)
+                        conn.commit()
+                        invalidate_cached_queries("Broker")
+                        return "updated"
+                    else:
+                        return "no_changes"
+
+            # Proceed with insert
+            insert_query = """
+            INSERT INTO Broker (
+                Broker_ID, Broker_Name, Commission, Date_Of_Onboarding,
+                FCA_Registration_Number, Broker_Type, Market_Access, Delegated_Authority, Longevity_Years, Date_Of_Expiry, Status, Submission_Date, GUID)
+                  VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """
+
+            values = (
+                broker_data.get("Broker_ID"),
+                broker_data.get("Broker_Name"),
+                broker_data.get("Commission"),
+                broker_data.get("Date_Of_Onboarding"),
+                fca_registration,
+                broker_data.get("Broker_Type"),
+                broker_data.get("Market_Access"),
+                broker_data.get("Delegated_Authority"),
+                broker_data.get("Longevity_Years"),
+                broker_data.get("Date_Of_Expiry"),
+                broker_data.get("Status", "Active"),
+                broker_data.get("Submission_Date", datetime.now().strftime("%Y-%m-%d %H:%M:%S")),
+                broker_data.get("GUID", None)
+            )
+
+            cursor.execute(insert_query, values)
+            conn.commit()
+            invalidate_cached_queries("Broker")
+            return "inserted"
+
     except pymssql.IntegrityError as e:
-        if conn:
-            conn.rollback()
         st.error(f"Broker data integrity error: {e}")
         st.info("💡 This usually means the Broker ID already exists")
         raise
     except pymssql.Error as e:
-        if conn:
-            conn.rollback()
         st.error(f"Database error during broker operation: {e}")
         raise
     except Exception as e:
-        if conn:
-            conn.rollback()
         st.error(f"Unexpected error during broker operation: {e}")
         raise
-    finally:
-        if conn:
-            cursor.close()
-            conn.close()
 
 def insert_insurer(insurer_data):
     """Insert facility and multiple insurers with error handling"""
-    conn = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Insert each insurer in the facility
-        insurers = insurer_data.get('insurers', [])
-        
-        if not insurers:
-            raise ValueError("No insurers provided in the data")
+        with db_connection() as conn, conn.cursor() as cursor:
+            # Insert each insurer in the facility
+            insurers = insurer_data.get('insurers', [])
 
-        # Find lead insurer (one with max participation)
-        lead_insurer_id = max(insurers, key=lambda x: x.get('Participation', 0)).get('Insurer_ID')
+            if not insurers:
+                raise ValueError("No insurers provided in the data")
+
+            # Find lead insurer (one with max participation)
+            lead_insurer_id = max(insurers, key=lambda x: x.get('Participation', 0)).get('Insurer_ID')
+
+            # Insert each insurer record
+            for i, insurer in enumerate(insurers):
+                insert_query = """
+                    INSERT INTO insurer (
+                        Facility_ID, Facility_Name, Group_Size, Insurer_ID, Insurer_Name, Participation,
+                        Date_Of_Onboarding, FCA_Registration_Number, Insurer_Type, Delegated_Authority, LeadInsurer,
+                        Longevity_Years, Status, Date_Of_Expiry, GUID, Submission_Date
+                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                    """
+
+                values = (
+                    insurer_data.get("Facility_ID"),
+                    insurer_data.get("Facility_Name"),
+                    insurer_data.get("Group_Size"),
+                    insurer.get("Insurer_ID"),
+                    insurer.get("Insurer_Name"),
+                    insurer.get("Participation"),
+                    insurer.get("Date_Of_Onboarding"),
+                    insurer.get("FCA_Registration_Number"),
+                    insurer.get("Insurer_Type"),
+                    insurer.get("Delegated_Authority"),
+                    1 if insurer.get("Insurer_ID") == lead_insurer_id else 0,
+                    insurer.get("Longevity_Years", 0),
+                    insurer.get("Status", "Active"),
+                    insurer.get("Date_Of_Expiry", None),
+                    insurer.get("GUID", None),
+                    insurer.get("Submission_Date", datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+                )
+
+                try:
+                    cursor.execute(insert_query, values)
+                    st.info(f"✓ Inserted Insurer {i+1}: {insurer.get('Insurer_ID')} - {insurer.get('Insurer_Name')}")
+                    time.sleep(2)
+                except Exception as e:
+                    st.error(f"✗ Error inserting Insurer {i+1} ({insurer.get('Insurer_ID', 'Unknown')}): {e}")
+                    raise
+
+            conn.commit()
+            invalidate_cached_queries("insurer")
+            st.success(f"Successfully inserted all {len(insurers)} insurer(s) for facility {insurer_data.get('Facility_ID')}")
+            time.sleep(5)
 
-        # Insert each insurer record
-        for i, insurer in enumerate(insurers):
-            insert_query = """
-                INSERT INTO insurer (
-                    Facility_ID, Facility_Name, Group_Size, Insurer_ID, Insurer_Name, Participation,
-                    Date_Of_Onboarding, FCA_Registration_Number, Insurer_Type, Delegated_Authority, LeadInsurer,
-                    Longevity_Years, Status, Date_Of_Expiry, GUID, Submission_Date
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                """
-            
-            values = (
-                insurer_data.get("Facility_ID"),
-                insurer_data.get("Facility_Name"),
-                insurer_data.get("Group_Size"),
-                insurer.get("Insurer_ID"),
-                insurer.get("Insurer_Name"),
-                insurer.get("Participation"),
-                insurer.get("Date_Of_Onboarding"),
-                insurer.get("FCA_Registration_Number"),
-                insurer.get("Insurer_Type"),
-                insurer.get("Delegated_Authority"),
-                1 if insurer.get("Insurer_ID") == lead_insurer_id else 0,
-                insurer.get("Longevity_Years", 0),
-                insurer.get("Status", "Active"),
-                insurer.get("Date_Of_Expiry", None),
-                insurer.get("GUID", None),
-                insurer.get("Submission_Date", datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
-            )
-            
-            try:
-                cursor.execute(insert_query, values)
-                st.info(f"✓ Inserted Insurer {i+1}: {insurer.get('Insurer_ID')} - {insurer.get('Insurer_Name')}")
-                time.sleep(2)
-            except Exception as e:
-                st.error(f"✗ Error inserting Insurer {i+1} ({insurer.get('Insurer_ID', 'Unknown')}): {e}")
-                raise
-        
-        conn.commit()
-        st.success(f"Successfully inserted all {len(insurers)} insurer(s) for facility {insurer_data.get('Facility_ID')}")
-        time.sleep(5)
-        
     except pymssql.IntegrityError as e:
-        if conn:
-            conn.rollback()
         st.error(f"Data integrity error: {e}")
         st.info("💡 This usually means duplicate IDs or constraint violations")
         raise
     except pymssql.Error as e:
-        if conn:
-            conn.rollback()
         st.error(f"Database error: {e}")
         raise
     except Exception as e:
-        if conn:
-            conn.rollback()
         st.error(f"Unexpected error: {e}")
         raise
-    finally:
-        if conn:
-            cursor.close()
-            conn.close()
 
 def insert_upload_document(document_data):
-    """Insert document with logging"""
+    """Insert document with logging.
+
+    A GUID that is already in the table is left as it is, so a retried
+    extraction job does not record the same document twice.
+    """
     start_time = time.time()
     correlation_id = str(uuid.uuid4())
-    conn = None
 
     try:        
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        insert_query = """
-        INSERT INTO document
-        (Hash, Unique_File_Name, Original_File_Name, GUID, JSON, Type, Transaction_Type, Reference_Number, Blob_Link, UploadDate, ProcessingStatus)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """
-        
-        cursor.execute(insert_query, (
-            document_data["Hash"],
-            document_data["Unique_File_Name"],
-            document_data["Original_File_Name"],
-            document_data["GUID"],
-            document_data["JSON"],
-            document_data["Type"],
-            document_data["Transaction_Type"],
-            document_data["Reference_Number"],
-            document_data["Blob_Link"],
-            document_data["UploadDate"],
-            document_data["ProcessingStatus"]
-        ))
-        rows_affected = cursor.rowcount
-        conn.commit()
+        with db_connection() as conn, conn.cursor() as cursor:
+            insert_query = """
+            INSERT INTO document
+            (Hash, Unique_File_Name, Original_File_Name, GUID, JSON, Type, Transaction_Type, Reference_Number, Blob_Link, UploadDate, ProcessingStatus)
+            SELECT %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s
+            WHERE NOT EXISTS (SELECT 1 FROM document WITH (UPDLOCK, HOLDLOCK) WHERE GUID = %s)
+            """
+
+            cursor.execute(insert_query, (
+                document_data["Hash"],
+                document_data["Unique_File_Name"],
+                document_data["Original_File_Name"],
+                document_data["GUID"],
+                document_data["JSON"],
+                document_data["Type"],
+                document_data["Transaction_Type"],
+                document_data["Reference_Number"],
+                document_data["Blob_Link"],
+                document_data["UploadDate"],
+                document_data["ProcessingStatus"],
+                document_data["GUID"]
+            ))
+            rows_affected = cursor.rowcount
+            conn.commit()
 
         execution_time = int((time.time() - start_time) * 1000)
 
         log_document_operation(
-            action_type="DOCUMENT_INSERTED",
+            action_type="DOCUMENT_INSERTED" if rows_affected else "DOCUMENT_ALREADY_RECORDED",
             document_info={
                 'file_name': document_data.get('Original_File_Name'),
                 'file_size_kb': None,
@@ -385,7 +734,7 @@ def insert_upload_document(document_data):
             correlation_id=correlation_id,
             execution_time_ms=execution_time
         )
-        
+
         return True
 
     except Exception as e:
@@ -397,73 +746,255 @@ def insert_upload_document(document_data):
             correlation_id=correlation_id
         )
         raise
-    finally:
-        if conn:
-            cursor.close()
-            conn.close()
-
-def update_document_unique_id(guid_string, unique_id):
-    """Update document table's Unique_ID based on comma-separated GUID string"""
-    if not guid_string or not unique_id:
-        print(f"DEBUG: Missing data - guid_string: {guid_string}, unique_id: {unique_id}")
-        return
-    
-    conn = None
+
+def find_documents_by_hash(file_hashes):
+    """Latest completed document row for each SHA-256 in ``file_hashes``.
+
+    Returns ``{hash: row}`` with Unique_File_Name, Blob_Link, JSON and
+    UploadDate; hashes that were never uploaded are absent.
+    """
+    file_hashes = sorted(set(h for h in file_hashes if h))
+    if not file_hashes:
+        return {}
+
+    placeholders = ", ".join(["%s"] * len(file_hashes))
+    query = f"""
+    SELECT Hash, Unique_File_Name, Blob_Link, JSON, UploadDate
+    FROM document
+    WHERE Hash IN ({placeholders})
+      AND ProcessingStatus = 'Completed'
+      AND Blob_Link IS NOT NULL
+    ORDER BY UploadDate DESC
+    """
+    with db_connection() as conn, conn.cursor(as_dict=True) as cursor:
+        cursor.execute(query, tuple(file_hashes))
+        rows = cursor.fetchall()
+
+    matches = {}
+    for row in rows:
+        matches.setdefault(row["Hash"], row)
+    return matches
+
+_dedup_stats = {"files": 0, "hits": 0}
+_dedup_stats_lock = threading.Lock()
+
+def lookup_duplicate_documents(file_hashes, correlation_id=None):
+    """Find previously uploaded copies of ``file_hashes`` and record the hit rate.
+
+    Dedup is only an optimisation, so a failed lookup is logged and treated
+    as "no duplicates" rather than failing the upload.
+    """
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Split comma-separated GUIDs
-        guids = [guid.strip() for guid in guid_string.split(',') if guid.strip()]
-        print(f"DEBUG: Processing {len(guids)} GUIDs: {guids}")
-        print(f"DEBUG: Unique_ID to set: {unique_id}")
-        
-        # Check existing records first
-        for guid in guids:
-            check_query = "SELECT GUID, Unique_ID, Original_File_Name FROM document WHERE GUID = %s"
-            cursor.execute(check_query, (guid,))
-            existing = cursor.fetchone()
-            if existing:
-                print(f"DEBUG: Found document - GUID: {existing[0]}, Current Unique_ID: {existing[1]}, File: {existing[2]}")
-            else:
-                print(f"DEBUG: No document found with GUID: {guid}")
-        
-        # Update each document record
-        updated_count = 0
-        for guid in guids:
-            update_query = """
-            UPDATE document 
-            SET Unique_ID = %s 
-            WHERE GUID = %s AND (Unique_ID IS NULL OR Unique_ID = '')
-            """
-            cursor.execute(update_query, (unique_id, guid))
-            rows_affected = cursor.rowcount
-            print(f"DEBUG: Updated {rows_affected} rows for GUID: {guid}")
-            updated_count += rows_affected
-        
-        conn.commit()
-        print(f"DEBUG: Successfully updated {updated_count} document records with Unique_ID: {unique_id}")
-        
-        # Verify the updates
-        for guid in guids:
-            verify_query = "SELECT GUID, Unique_ID FROM document WHERE GUID = %s"
-            cursor.execute(verify_query, (guid,))
-            result = cursor.fetchone()
-            if result:
-                print(f"DEBUG: Verification - GUID: {result[0]}, New Unique_ID: {result[1]}")
-        
+        matches = find_documents_by_hash(file_hashes)
+    except Exception as e:
+        log_error(e, "Document_Management", "lookup_duplicate_documents", correlation_id=correlation_id)
+        return {}
+
+    files = len(file_hashes)
+    hits = sum(1 for h in file_hashes if h in matches)
+    with _dedup_stats_lock:
+        _dedup_stats["files"] += files
+        _dedup_stats["hits"] += hits
+        cumulative = dict(_dedup_stats)
+
+    log_app_event(
+        log_level="INFO",
+        message=f"Document dedup: {hits}/{files} file(s) already uploaded",
+        module_name="Document_Management",
+        action_type="DEDUP_LOOKUP",
+        function_name="lookup_duplicate_documents",
+        correlation_id=correlation_id,
+        additional_data={
+            "files": files,
+            "hits": hits,
+            "hit_rate": round(hits / files, 4) if files else 0.0,
+            "process_files": cumulative["files"],
+            "process_hits": cumulative["hits"],
+            "process_hit_rate": round(cumulative["hits"] / cumulative["files"], 4) if cumulative["files"] else 0.0,
+        }
+    )
+    return matches
+
+def reusable_extraction(file_hashes, duplicates):
+    """Prior extraction JSON for this upload, or None if the API must run.
+
+    Only reused when every file was seen before and all of them came from
+    the same earlier extraction (identical JSON), since the API extracts
+    the files together as one set.
+    """
+    if not file_hashes or any(h not in duplicates for h in file_hashes):
+        return None
+    prior_json = {duplicates[h]["JSON"] for h in file_hashes}
+    if len(prior_json) != 1:
+        return None
+    try:
+        json_data = json.loads(prior_json.pop())
+    except (TypeError, ValueError):
+        return None
+    if not isinstance(json_data, dict) or "error" in json_data:
+        return None
+    return json_data
+
+def get_dedup_stats():
+    """Process-wide dedup counters (files looked up, hits, hit_rate)"""
+    with _dedup_stats_lock:
+        stats = dict(_dedup_stats)
+    stats["hit_rate"] = round(stats["hits"] / stats["files"], 4) if stats["files"] else 0.0
+    return stats
+
+# One statement for the whole GUID set: record every link in Submission_Document, then
+# stamp Unique_ID on documents not yet linked and return those rows.
+_LINK_DOCUMENTS_SQL = """
+SET NOCOUNT ON;
+DECLARE @guids TABLE (GUID varchar(64) PRIMARY KEY);
+INSERT INTO @guids (GUID)
+SELECT DISTINCT value FROM OPENJSON(%s);
+
+INSERT INTO Submission_Document (Unique_ID, Document_GUID)
+SELECT %s, d.GUID
+FROM document d
+JOIN @guids g ON d.GUID = g.GUID
+WHERE NOT EXISTS (
+    SELECT 1 FROM Submission_Document s
+    WHERE s.Unique_ID = %s AND s.Document_GUID = d.GUID
+);
+
+UPDATE d
+SET Unique_ID = %s
+OUTPUT inserted.GUID, inserted.Unique_ID, inserted.Original_File_Name
+FROM document d
+JOIN @guids g ON d.GUID = g.GUID
+WHERE d.Unique_ID IS NULL OR d.Unique_ID = '';
+"""
+
+def update_document_unique_id(guids, unique_id):
+    """Link uploaded documents to a policy/claim submission in one round trip.
+
+    ``guids`` is a list of document GUIDs or the comma-separated string kept
+    in the submission's GUID column. Every document is linked through the
+    Submission_Document table, and documents without a Unique_ID get this
+    one. Returns the document rows that were updated.
+    """
+    if isinstance(guids, str):
+        guids = guids.split(",")
+    guids = [guid.strip() for guid in guids or [] if guid and guid.strip()]
+    if not guids or not unique_id:
+        log_app_event(
+            log_level="WARNING",
+            message="Document link skipped: no document GUIDs or no Unique_ID",
+            module_name="Database",
+            action_type="UPDATE_SKIPPED",
+            function_name="update_document_unique_id",
+            reference_number=unique_id or None,
+            additional_data={"guids": len(guids)},
+        )
+        return []
+
+    start_time = time.time()
+    try:
+        with db_connection() as conn, conn.cursor(as_dict=True) as cursor:
+            cursor.execute(*as_sp_executesql(
+                _LINK_DOCUMENTS_SQL, (json.dumps(guids), unique_id, unique_id, unique_id)
+            ))
+            updated = cursor.fetchall()
+            conn.commit()
     except Exception as e:
-        if conn:
-            conn.rollback()
-        print(f"ERROR: Failed to update document Unique_ID: {e}")
+        log_error(e, "Database", "update_document_unique_id", reference_number=unique_id)
         raise
-    finally:
-        if conn:
-            cursor.close()
-            conn.close()
+
+    log_database_operation(
+        operation="UPDATE",
+        table_name="document",
+        rows_affected=len(updated),
+        execution_time_ms=int((time.time() - start_time) * 1000),
+        function_name="update_document_unique_id",
+        reference_number=unique_id,
+        additional_data={"guids": len(guids)},
+    )
+    return updated
+
+def fetch_submission_documents(unique_id):
+    """Documents linked to a policy/claim submission through Submission_Document"""
+    return fetch(
+        """
+        SELECT d.GUID, d.Original_File_Name, d.Unique_File_Name, d.Blob_Link, d.UploadDate
+        FROM Submission_Document s
+        JOIN document d ON d.GUID = s.Document_GUID
+        WHERE s.Unique_ID = %s
+        ORDER BY d.UploadDate
+        """,
+        (unique_id,),
+    )
 
 # ...existing code... (logging functions remain the same)
 
+APP_LOG_COLUMNS = (
+    "Log_Level", "Log_Message", "Module_Name", "Action_Type", "Function_Name",
+    "User_ID", "Session_ID", "Reference_Type", "Reference_Number", "Document_GUID",
+    "Transaction_Type", "File_Name", "File_Size_KB", "File_Hash", "Blob_URL",
+    "Execution_Time_MS", "Memory_Usage_MB", "CPU_Usage_Percent",
+    "Database_Operation", "Table_Name", "Rows_Affected",
+    "API_Endpoint", "API_Response_Code", "API_Response_Time_MS",
+    "Error_Code", "Stack_Trace", "Additional_Data", "Correlation_ID",
+)
+# SQL Server caps a statement at 2100 parameters
+APP_LOG_ROWS_PER_INSERT = 2000 // len(APP_LOG_COLUMNS)
+APP_LOG_FALLBACK_PATH = "app_logs_fallback.log"
+
+_log_sink = None
+_log_sink_lock = threading.Lock()
+
+
+def _insert_app_log_batch(events):
+    """Write queued (timestamp, row) events to App_Logs with multi-row INSERTs"""
+    rows = [row for _, row in events]
+    row_placeholder = "(" + ", ".join(["%s"] * len(APP_LOG_COLUMNS)) + ")"
+    with db_connection() as conn, conn.cursor() as cursor:
+        for start in range(0, len(rows), APP_LOG_ROWS_PER_INSERT):
+            chunk = rows[start:start + APP_LOG_ROWS_PER_INSERT]
+            insert_query = (
+                f"INSERT INTO App_Logs ({', '.join(APP_LOG_COLUMNS)}) VALUES "
+                + ", ".join([row_placeholder] * len(chunk))
+            )
+            cursor.execute(insert_query, tuple(value for row in chunk for value in row))
+        conn.commit()
+
+
+def _spill_app_logs(events):
+    """Append events the database could not take to the fallback log file"""
+    with open(APP_LOG_FALLBACK_PATH, "a") as f:
+        for logged_at, row in events:
+            f.write(f"{logged_at} - {row[0]} - {row[1]}\n")
+
+
+def get_log_sink():
+    """Return the process-wide background App_Logs writer, starting it on first use"""
+    global _log_sink
+    if _log_sink is None:
+        with _log_sink_lock:
+            if _log_sink is None:
+                _log_sink = AsyncLogSink(
+                    write_batch=_insert_app_log_batch,
+                    spill=_spill_app_logs,
+                    max_queue_size=int(os.getenv('APP_LOG_QUEUE_SIZE', '10000')),
+                    batch_size=int(os.getenv('APP_LOG_BATCH_SIZE', '50')),
+                    flush_interval=float(os.getenv('APP_LOG_FLUSH_INTERVAL', '2')),
+                    full_policy=os.getenv('APP_LOG_FULL_POLICY', 'drop'),
+                    block_timeout=float(os.getenv('APP_LOG_BLOCK_TIMEOUT', '1')),
+                )
+    return _log_sink
+
+
+def flush_app_logs(timeout=10.0):
+    """Wait until queued log events have been written (or spilled)"""
+    return get_log_sink().flush(timeout)
+
+
+def get_log_sink_stats():
+    """Background writer counters (enqueued, written, dropped, spilled, queue depth)"""
+    return get_log_sink().stats()
+
+
 def log_app_event(
     log_level="INFO",
     message="",
@@ -493,44 +1024,28 @@ def log_app_event(
     additional_data=None,
     correlation_id=None
 ):
-    """Log application events to the database"""
-    conn = None
+    """Queue an application event for the background App_Logs writer.
+
+    Returns True once the event is queued; the INSERT happens off the request
+    path in batches (see ``get_log_sink``).
+    """
     try:
-        conn = get_db_connection()
-        if not conn:
-            return False
-            
-        cursor = conn.cursor()
-        
-        # Get system metrics
-        try:
-            memory_usage = psutil.virtual_memory().percent
-            cpu_usage = psutil.cpu_percent()
-        except:
-            memory_usage = None
-            cpu_usage = None
-        
-        # Get user context from session state if available
+        # System metrics come from the shared sampler's cached snapshot;
+        # Memory_Usage_MB holds this process's RSS
+        metrics = get_system_metrics()
+        memory_usage = metrics.get("process_rss_mb")
+        cpu_usage = metrics.get("cpu_usage_percent")
+
+        # Get user context from session state if available. This must happen
+        # here, on the script thread, not in the background writer.
         session_id = None
         try:
             import streamlit as st
             session_id = getattr(st.session_state, 'session_id', None)
         except:
             pass
-        
-        insert_query = """
-        INSERT INTO App_Logs (
-            Log_Level, Log_Message, Module_Name, Action_Type, Function_Name,
-            User_ID, Session_ID, Reference_Type, Reference_Number, Document_GUID,
-            Transaction_Type, File_Name, File_Size_KB, File_Hash, Blob_URL,
-            Execution_Time_MS, Memory_Usage_MB, CPU_Usage_Percent,
-            Database_Operation, Table_Name, Rows_Affected,
-            API_Endpoint, API_Response_Code, API_Response_Time_MS,
-            Error_Code, Stack_Trace, Additional_Data, Correlation_ID
-        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """
-        
-        cursor.execute(insert_query, (
+
+        row = (
             log_level, message, module_name, action_type, function_name,
             user_id, session_id, reference_type, reference_number, document_guid,
             transaction_type, file_name, file_size_kb, file_hash, blob_url,
@@ -539,30 +1054,28 @@ def log_app_event(
             api_endpoint, api_response_code, api_response_time_ms,
             error_code, stack_trace, json.dumps(additional_data) if additional_data else None,
             correlation_id
-        ))
-        
-        conn.commit()
-        return True
-        
+        )
+        return get_log_sink().submit((datetime.now(), row))
+
     except Exception as e:
         print(f"Failed to log to database: {e}")
         # Fallback to file logging
         try:
-            with open("app_logs_fallback.log", "a") as f:
+            with open(APP_LOG_FALLBACK_PATH, "a") as f:
                 f.write(f"{datetime.now()} - {log_level} - {message}\n")
         except:
             pass
         return False
-    finally:
-        if conn:
-            try:
-                cursor.close()
-                conn.close()
-            except:
-                pass
 
 def log_performance(function_name, execution_time_ms, **kwargs):
     """Log performance metrics"""
+    metrics = get_system_metrics()
+    kwargs["additional_data"] = {
+        **(kwargs.get("additional_data") or {}),
+        "process_rss_mb": metrics.get("process_rss_mb"),
+        "memory_used_percent": metrics.get("memory_used_percent"),
+        "cpu_usage_percent": metrics.get("cpu_usage_percent"),
+    }
     return log_app_event(
         log_level="INFO",
         message=f"Performance: {function_name} executed in {execution_time_ms}ms",
@@ -657,61 +1170,58 @@ def insert_cv_metadata(cv_data):
     """Insert CV metadata into APP_CV_DATA table"""
     start_time = time.time()
     correlation_id = str(uuid.uuid4())
-    conn = None
     
     try:
         print(f"DEBUG: Attempting to insert CV metadata: {cv_data}")
 
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        insert_query = """
-        INSERT INTO APP_CV_DATA (
-            Normal_Image_Hash, Annotated_Image_Hash, Normal_Image_Name, 
-            Normal_Image_Unique_Name, Annotated_Image_Name, Annotated_Image_Unique_Name,
-            Normal_Image_Blob_Link, Annotated_Image_Blob_Link, JSON,
-            Normal_Image_GUID, Annotated_Image_GUID, Total_Detections,
-            Severity, Severity_Reason, Dent_Count, Crack_Count, Scratch_Count,
-            Broken_Light_Count, Flat_Tire_Count, Shattered_Glass_Count,
-            Reference_Number, Unique_ID, Created_By
-        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """
-        
-        values = (
-            cv_data.get("normal_image_hash"),
-            cv_data.get("annotated_image_hash"),
-            cv_data.get("normal_image_name"),
-            cv_data.get("normal_image_unique_name"),
-            cv_data.get("annotated_image_name"),
-            cv_data.get("annotated_image_unique_name"),
-            cv_data.get("normal_image_blob_link"),
-            cv_data.get("annotated_image_blob_link"),
-            cv_data.get("json"),
-            cv_data.get("normal_image_guid"),
-            cv_data.get("annotated_image_guid"),
-            cv_data.get("total_detections", 0),
-            cv_data.get("severity"),
-            cv_data.get("severity_reason"),
-            cv_data.get("dent_count", 0),
-            cv_data.get("crack_count", 0),
-            cv_data.get("scratch_count", 0),
-            cv_data.get("broken_light_count", 0),
-            cv_data.get("flat_tire_count", 0),
-            cv_data.get("shattered_glass_count", 0),
-            cv_data.get("reference_number"),
-            cv_data.get("unique_id"),
-            cv_data.get("created_by", "system")
-        )
-        
-        cursor.execute(insert_query, values)
-        conn.commit()
-        
-        # Get the inserted UID
-        cursor.execute("SELECT @@IDENTITY")
-        cv_uid = cursor.fetchone()[0]
-        
+        with db_connection() as conn, conn.cursor() as cursor:
+            insert_query = """
+            INSERT INTO APP_CV_DATA (
+                Normal_Image_Hash, Annotated_Image_Hash, Normal_Image_Name, 
+                Normal_Image_Unique_Name, Annotated_Image_Name, Annotated_Image_Unique_Name,
+                Normal_Image_Blob_Link, Annotated_Image_Blob_Link, JSON,
+                Normal_Image_GUID, Annotated_Image_GUID, Total_Detections,
+                Severity, Severity_Reason, Dent_Count, Crack_Count, Scratch_Count,
+                Broken_Light_Count, Flat_Tire_Count, Shattered_Glass_Count,
+                Reference_Number, Unique_ID, Created_By
+            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """
+
+            values = (
+                cv_data.get("normal_image_hash"),
+                cv_data.get("annotated_image_hash"),
+                cv_data.get("normal_image_name"),
+                cv_data.get("normal_image_unique_name"),
+                cv_data.get("annotated_image_name"),
+                cv_data.get("annotated_image_unique_name"),
+                cv_data.get("normal_image_blob_link"),
+                cv_data.get("annotated_image_blob_link"),
+                cv_data.get("json"),
+                cv_data.get("normal_image_guid"),
+                cv_data.get("annotated_image_guid"),
+                cv_data.get("total_detections", 0),
+                cv_data.get("severity"),
+                cv_data.get("severity_reason"),
+                cv_data.get("dent_count", 0),
+                cv_data.get("crack_count", 0),
+                cv_data.get("scratch_count", 0),
+                cv_data.get("broken_light_count", 0),
+                cv_data.get("flat_tire_count", 0),
+                cv_data.get("shattered_glass_count", 0),
+                cv_data.get("reference_number"),
+                cv_data.get("unique_id"),
+                cv_data.get("created_by", "system")
+            )
+
+            cursor.execute(insert_query, values)
+            conn.commit()
+
+            # Get the inserted UID
+            cursor.execute("SELECT @@IDENTITY")
+            cv_uid = cursor.fetchone()[0]
+
         execution_time = (time.time() - start_time) * 1000
-        
+
         # Log the operation
         log_database_operation(
             operation="INSERT",
@@ -727,12 +1237,10 @@ def insert_cv_metadata(cv_data):
                 "reference_number": cv_data.get("reference_number")
             }
         )
-        
+
         return cv_uid
-        
+
     except Exception as e:
-        if conn:
-            conn.rollback()
         execution_time = (time.time() - start_time) * 1000
         log_error(
             error=e,
@@ -742,146 +1250,181 @@ def insert_cv_metadata(cv_data):
             execution_time_ms=execution_time
         )
         raise e
-    finally:
-        if conn:
-            cursor.close()
-            conn.close()
+
+def find_cv_analysis_by_hash(image_hash):
+    """Most recent APP_CV_DATA row with an analysis for this normal image hash, or None"""
+    if not image_hash:
+        return None
+    with db_connection() as conn, conn.cursor(as_dict=True) as cursor:
+        cursor.execute(
+            """
+            SELECT TOP 1
+                UID, Normal_Image_Hash, Annotated_Image_Hash,
+                Normal_Image_Name, Normal_Image_Unique_Name,
+                Annotated_Image_Name, Annotated_Image_Unique_Name,
+                Normal_Image_Blob_Link, Annotated_Image_Blob_Link, JSON,
+                Normal_Image_GUID, Annotated_Image_GUID, Total_Detections,
+                Severity, Severity_Reason, Dent_Count, Crack_Count, Scratch_Count,
+                Broken_Light_Count, Flat_Tire_Count, Shattered_Glass_Count, Unique_ID
+            FROM APP_CV_DATA
+            WHERE Normal_Image_Hash = %s AND JSON IS NOT NULL
+            ORDER BY Upload_Date DESC
+            """,
+            (image_hash,)
+        )
+        return cursor.fetchone()
+
+_cv_cache_stats = {"lookups": 0, "hits": 0}
+_cv_cache_stats_lock = threading.Lock()
+
+def lookup_cv_analysis(image_hash, correlation_id=None):
+    """Earlier CV analysis of an identical image, recording the cache hit rate.
+
+    Like document dedup this is only an optimisation: a failed lookup is
+    logged and treated as a miss.
+    """
+    try:
+        row = find_cv_analysis_by_hash(image_hash)
+    except Exception as e:
+        log_error(e, "db_utils", "lookup_cv_analysis", correlation_id=correlation_id)
+        return None
+
+    with _cv_cache_stats_lock:
+        _cv_cache_stats["lookups"] += 1
+        if row:
+            _cv_cache_stats["hits"] += 1
+        cumulative = dict(_cv_cache_stats)
+
+    log_app_event(
+        log_level="INFO",
+        message=f"CV analysis cache {'hit' if row else 'miss'} for image {image_hash[:12]}",
+        module_name="db_utils",
+        action_type="CV_CACHE_LOOKUP",
+        function_name="lookup_cv_analysis",
+        file_hash=image_hash,
+        correlation_id=correlation_id,
+        additional_data={
+            "hit": bool(row),
+            "cv_uid": row["UID"] if row else None,
+            "process_lookups": cumulative["lookups"],
+            "process_hits": cumulative["hits"],
+            "process_hit_rate": round(cumulative["hits"] / cumulative["lookups"], 4),
+        }
+    )
+    return row
+
+def get_cv_cache_stats():
+    """Process-wide CV analysis cache counters (lookups, hits, hit_rate)"""
+    with _cv_cache_stats_lock:
+        stats = dict(_cv_cache_stats)
+    stats["hit_rate"] = round(stats["hits"] / stats["lookups"], 4) if stats["lookups"] else 0.0
+    return stats
 
 def fetch_cv_metadata_by_claim_uid(claim_uid):
     """Fetch CV metadata by Claim UID"""
-    conn = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(as_dict=True)
-        
-        query = """
-        SELECT 
-            cv.*,
-            c.CLAIM_NO,
-            c.POLICY_NO,
-            c.MAKE,
-            c.MODEL,
-            c.CLAIM_STATUS
-        FROM APP_CV_DATA cv
-        LEFT JOIN New_Claims c ON cv.Unique_ID = c.Unique_ID
-        WHERE cv.Unique_ID = %s
-        ORDER BY cv.Upload_Date DESC
-        """
-        
-        cursor.execute(query, (claim_uid,))
-        result = cursor.fetchall()
-        
-        return result
-        
+        with db_connection() as conn, conn.cursor(as_dict=True) as cursor:
+            query = """
+            SELECT 
+                cv.*,
+                c.CLAIM_NO,
+                c.POLICY_NO,
+                c.MAKE,
+                c.MODEL,
+                c.CLAIM_STATUS
+            FROM APP_CV_DATA cv
+            LEFT JOIN New_Claims c ON cv.Unique_ID = c.Unique_ID
+            WHERE cv.Unique_ID = %s
+            ORDER BY cv.Upload_Date DESC
+            """
+
+            cursor.execute(query, (claim_uid,))
+            result = cursor.fetchall()
+
+            return result
+
     except Exception as e:
         log_error(e, "db_utils", "fetch_cv_metadata_by_claim_uid")
         return []
-    finally:
-        if conn:
-            cursor.close()
-            conn.close()
 
 def fetch_cv_metadata_by_reference(reference_number):
     """Fetch CV metadata by reference number (Policy/Claim number)"""
-    conn = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(as_dict=True)
-        
-        query = """
-        SELECT 
-            cv.*,
-            c.CLAIM_NO,
-            c.POLICY_NO,
-            c.MAKE,
-            c.MODEL,
-            c.CLAIM_STATUS
-        FROM APP_CV_DATA cv
-        LEFT JOIN New_Claims c ON cv.Unique_ID = c.Unique_ID
-        WHERE cv.Reference_Number = %s
-        ORDER BY cv.Upload_Date DESC
-        """
-        
-        cursor.execute(query, (reference_number,))
-        result = cursor.fetchall()
-        
-        return result
-        
+        with db_connection() as conn, conn.cursor(as_dict=True) as cursor:
+            query = """
+            SELECT 
+                cv.*,
+                c.CLAIM_NO,
+                c.POLICY_NO,
+                c.MAKE,
+                c.MODEL,
+                c.CLAIM_STATUS
+            FROM APP_CV_DATA cv
+            LEFT JOIN New_Claims c ON cv.Unique_ID = c.Unique_ID
+            WHERE cv.Reference_Number = %s
+            ORDER BY cv.Upload_Date DESC
+            """
+
+            cursor.execute(query, (reference_number,))
+            result = cursor.fetchall()
+
+            return result
+
     except Exception as e:
         log_error(e, "db_utils", "fetch_cv_metadata_by_reference")
         return []
-    finally:
-        if conn:
-            cursor.close()
-            conn.close()
 
 def update_cv_metadata_claim_link(cv_uid, claim_uid):
     """Update CV metadata to link with claim UID"""
-    conn = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        query = """
-        UPDATE APP_CV_DATA 
-        SET Unique_ID = %s, Updated_Date = GETDATE() 
-        WHERE UID = %s
-        """
-        
-        cursor.execute(query, (claim_uid, cv_uid))
-        conn.commit()
-        
-        return True
-        
+        with db_connection() as conn, conn.cursor() as cursor:
+            query = """
+            UPDATE APP_CV_DATA 
+            SET Unique_ID = %s, Updated_Date = GETDATE() 
+            WHERE UID = %s
+            """
+
+            cursor.execute(query, (claim_uid, cv_uid))
+            conn.commit()
+
+            return True
+
     except Exception as e:
-        if conn:
-            conn.rollback()
         log_error(e, "db_utils", "update_cv_metadata_claim_link")
         return False
-    finally:
-        if conn:
-            cursor.close()
-            conn.close()
 
 def fetch_all_cv_metadata(limit=100):
     """Fetch all CV metadata with optional limit"""
-    conn = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(as_dict=True)
-        
-        query = f"""
-        SELECT TOP {limit}
-            cv.UID,
-            cv.Normal_Image_Name,
-            cv.Annotated_Image_Name,
-            cv.Normal_Image_Blob_Link,
-            cv.Annotated_Image_Blob_Link,
-            cv.Total_Detections,
-            cv.Severity,
-            cv.Upload_Date,
-            cv.Reference_Number,
-            cv.Created_By,
-            c.CLAIM_NO,
-            c.POLICY_NO,
-            c.CLAIM_STATUS
-        FROM APP_CV_DATA cv
-        LEFT JOIN New_Claims c ON cv.Unique_ID = c.Unique_ID
-        ORDER BY cv.Upload_Date DESC
-        """
-        
-        cursor.execute(query)
-        result = cursor.fetchall()
-        
-        return result
-        
+        with db_connection() as conn, conn.cursor(as_dict=True) as cursor:
+            query = """
+            SELECT TOP (%s)
+                cv.UID,
+                cv.Normal_Image_Name,
+                cv.Annotated_Image_Name,
+                cv.Normal_Image_Blob_Link,
+                cv.Annotated_Image_Blob_Link,
+                cv.Total_Detections,
+                cv.Severity,
+                cv.Upload_Date,
+                cv.Reference_Number,
+                cv.Created_By,
+                c.CLAIM_NO,
+                c.POLICY_NO,
+                c.CLAIM_STATUS
+            FROM APP_CV_DATA cv
+            LEFT JOIN New_Claims c ON cv.Unique_ID = c.Unique_ID
+            ORDER BY cv.Upload_Date DESC
+            """
+
+            cursor.execute(*as_sp_executesql(query, (int(limit),)))
+            result = cursor.fetchall()
+
+            return result
+
     except Exception as e:
         log_error(e, "db_utils", "fetch_all_cv_metadata")
         return []
-    finally:
-        if conn:
-            cursor.close()
-            conn.close()
 
 
 
@@ -891,7 +1434,6 @@ def insert_ml_prediction_metadata(ml_data):
     """Insert ML prediction metadata into APP_ML_DATA table"""
     start_time = time.time()
     correlation_id = str(uuid.uuid4())
-    conn = None
     
     try:
         print(f"DEBUG: ML prediction data received: {ml_data}")
@@ -905,41 +1447,39 @@ def insert_ml_prediction_metadata(ml_data):
                 print(f"WARNING: Invalid unique_id: {unique_id}")
                 unique_id = None
         
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        insert_query = """
-        INSERT INTO APP_ML_DATA (
-            Unique_ID, JSON, PREDICTED_VALUE, INPUT_FEATURES, 
-            REFERENCE_NUMBER, API_ENDPOINT, PROCESSING_TIME_MS, Created_By
-        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-        """
-        
-        values = (
-            unique_id,
-            ml_data.get("json"),
-            ml_data.get("predicted_value"),
-            ml_data.get("input_features"),
-            ml_data.get("reference_number"),
-            ml_data.get("api_endpoint"),
-            ml_data.get("processing_time_ms"),
-            ml_data.get("created_by", "system")
-        )
-        
-        print(f"DEBUG: Executing ML prediction insert with values: {values}")
-        
-        cursor.execute(insert_query, values)
-        conn.commit()
-        
-        # Get the inserted UID
-        cursor.execute("SELECT @@IDENTITY")
-        ml_uid_result = cursor.fetchone()
-        ml_uid = ml_uid_result[0] if ml_uid_result else None
-        
-        print(f"DEBUG: Successfully inserted ML prediction with UID: {ml_uid}")
-        
+        with db_connection() as conn, conn.cursor() as cursor:
+            insert_query = """
+            INSERT INTO APP_ML_DATA (
+                Unique_ID, JSON, PREDICTED_VALUE, INPUT_FEATURES, 
+                REFERENCE_NUMBER, API_ENDPOINT, PROCESSING_TIME_MS, Created_By
+            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            """
+
+            values = (
+                unique_id,
+                ml_data.get("json"),
+                ml_data.get("predicted_value"),
+                ml_data.get("input_features"),
+                ml_data.get("reference_number"),
+                ml_data.get("api_endpoint"),
+                ml_data.get("processing_time_ms"),
+                ml_data.get("created_by", "system")
+            )
+
+            print(f"DEBUG: Executing ML prediction insert with values: {values}")
+
+            cursor.execute(insert_query, values)
+            conn.commit()
+
+            # Get the inserted UID
+            cursor.execute("SELECT @@IDENTITY")
+            ml_uid_result = cursor.fetchone()
+            ml_uid = ml_uid_result[0] if ml_uid_result else None
+
+            print(f"DEBUG: Successfully inserted ML prediction with UID: {ml_uid}")
+
         execution_time = (time.time() - start_time) * 1000
-        
+
         # Log the operation
         log_database_operation(
             operation="INSERT",
@@ -954,12 +1494,10 @@ def insert_ml_prediction_metadata(ml_data):
                 "reference_number": ml_data.get("reference_number")
             }
         )
-        
+
         return ml_uid
-        
+
     except Exception as e:
-        if conn:
-            conn.rollback()
         execution_time = (time.time() - start_time) * 1000
         
         print(f"ERROR: Failed to insert ML prediction: {e}")
@@ -974,106 +1512,79 @@ def insert_ml_prediction_metadata(ml_data):
             additional_data={"ml_data_keys": list(ml_data.keys()) if ml_data else None}
         )
         raise e
-    finally:
-        if conn:
-            cursor.close()
-            conn.close()
 
 def fetch_ml_predictions_by_policy_uid(policy_uid):
     """Fetch ML predictions by Policy UID"""
-    conn = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(as_dict=True)
-        
-        query = """
-        SELECT 
-            ml.*,
-            p.POLICY_NO,
-            p.CUST_ID,
-            p.MAKE,
-            p.MODEL,
-            p.PREMIUM2 as ACTUAL_PREMIUM
-        FROM APP_ML_DATA ml
-        LEFT JOIN New_Policy p ON ml.Unique_ID = p.Unique_ID
-        WHERE ml.Unique_ID = %s
-        ORDER BY ml.PREDICTION_DATE DESC
-        """
-        
-        cursor.execute(query, (policy_uid,))
-        result = cursor.fetchall()
-        
-        return result
-        
+        with db_connection() as conn, conn.cursor(as_dict=True) as cursor:
+            query = """
+            SELECT 
+                ml.*,
+                p.POLICY_NO,
+                p.CUST_ID,
+                p.MAKE,
+                p.MODEL,
+                p.PREMIUM2 as ACTUAL_PREMIUM
+            FROM APP_ML_DATA ml
+            LEFT JOIN New_Policy p ON ml.Unique_ID = p.Unique_ID
+            WHERE ml.Unique_ID = %s
+            ORDER BY ml.PREDICTION_DATE DESC
+            """
+
+            cursor.execute(query, (policy_uid,))
+            result = cursor.fetchall()
+
+            return result
+
     except Exception as e:
         log_error(e, "db_utils", "fetch_ml_predictions_by_policy_uid")
         return []
-    finally:
-        if conn:
-            cursor.close()
-            conn.close()
 
 def fetch_ml_predictions_by_reference(reference_number):
     """Fetch ML predictions by reference number (Policy number)"""
-    conn = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(as_dict=True)
-        
-        query = """
-        SELECT 
-            ml.*,
-            p.POLICY_NO,
-            p.CUST_ID,
-            p.MAKE,
-            p.MODEL,
-            p.PREMIUM2 as ACTUAL_PREMIUM
-        FROM APP_ML_DATA ml
-        LEFT JOIN New_Policy p ON ml.Unique_ID = p.Unique_ID
-        WHERE ml.REFERENCE_NUMBER = %s
-        ORDER BY ml.PREDICTION_DATE DESC
-        """
-        
-        cursor.execute(query, (reference_number,))
-        result = cursor.fetchall()
-        
-        return result
-        
+        with db_connection() as conn, conn.cursor(as_dict=True) as cursor:
+            query = """
+            SELECT 
+                ml.*,
+                p.POLICY_NO,
+                p.CUST_ID,
+                p.MAKE,
+                p.MODEL,
+                p.PREMIUM2 as ACTUAL_PREMIUM
+            FROM APP_ML_DATA ml
+            LEFT JOIN New_Policy p ON ml.Unique_ID = p.Unique_ID
+            WHERE ml.REFERENCE_NUMBER = %s
+            ORDER BY ml.PREDICTION_DATE DESC
+            """
+
+            cursor.execute(query, (reference_number,))
+            result = cursor.fetchall()
+
+            return result
+
     except Exception as e:
         log_error(e, "db_utils", "fetch_ml_predictions_by_reference")
         return []
-    finally:
-        if conn:
-            cursor.close()
-            conn.close()
 
 def update_ml_prediction_policy_link(ml_uid, policy_uid):
     """Update ML prediction to link with policy UID"""
-    conn = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        query = """
-        UPDATE APP_ML_DATA 
-        SET Unique_ID = %s, Updated_Date = GETDATE() 
-        WHERE UID = %s
-        """
-        
-        cursor.execute(query, (policy_uid, ml_uid))
-        conn.commit()
-        
-        return True
-        
+        with db_connection() as conn, conn.cursor() as cursor:
+            query = """
+            UPDATE APP_ML_DATA 
+            SET Unique_ID = %s, Updated_Date = GETDATE() 
+            WHERE UID = %s
+            """
+
+            cursor.execute(query, (policy_uid, ml_uid))
+            conn.commit()
+
+            return True
+
     except Exception as e:
-        if conn:
-            conn.rollback()
         log_error(e, "db_utils", "update_ml_prediction_policy_link")
         return False
-    finally:
-        if conn:
-            cursor.close()
-            conn.close()
 
 # def fetch_all_ml_predictions(limit=100):
 #     """Fetch all ML predictions with optional limit"""
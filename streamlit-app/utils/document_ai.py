@@ -0,0 +1,379 @@
+import json
+import os
+import shutil
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+import dotenv
+import requests
+
+from db_utils import insert_upload_document, log_app_event, log_error
+from extraction_cache import get_cached_extraction, store_extraction
+from ingest import IngestedFile
+from job_queue import JOB_FAILED, JOB_SUCCEEDED, JobNotReady, get_job_queue, start_embedded_workers
+
+dotenv.load_dotenv(Path(__file__).parent.parent / ".env")
+
+API_URL = os.getenv("API_URL")
+API_CODE = os.getenv("API_CODE")
+JOB_SPOOL_DIR = os.getenv("JOB_SPOOL_DIR", "job_files")
+
+EXTRACTION_JOB_KIND = "document_extraction"
+RECORD_DOCUMENTS_JOB_KIND = "document_records"
+
+
+def process_multiple_documents_with_api(documents, bypass_cache=False, correlation_id=None):
+    """Send ingested documents (see ingest.IngestedFile) to API for processing and return the extracted JSON data.
+
+    Results are cached by the files' SHA-256s (see extraction_cache); pass
+    ``bypass_cache=True`` to force a fresh extraction.
+    """
+    correlation_id = correlation_id or str(uuid.uuid4())
+    start_time = time.time()
+    
+    try:
+        # Validate inputs
+        if not documents:
+            raise ValueError("documents cannot be empty")
+
+        cached_result = get_cached_extraction([document.sha256 for document in documents], bypass=bypass_cache)
+        if cached_result is not None:
+            log_app_event(
+                log_level="INFO",
+                message=f"API call skipped, extraction cache hit for {len(documents)} documents",
+                module_name="Document_AI",
+                action_type="API_CACHE_HIT",
+                function_name="process_multiple_documents_with_api",
+                api_endpoint=API_URL,
+                execution_time_ms=int((time.time() - start_time) * 1000),
+                correlation_id=correlation_id
+            )
+            return cached_result
+
+        log_app_event(
+            log_level="INFO",
+            message=f"API call started for {len(documents)} documents",
+            module_name="Document_AI",
+            action_type="API_CALL_START",
+            function_name="process_multiple_documents_with_api",
+            api_endpoint=API_URL,
+            correlation_id=correlation_id
+        )
+        
+        params = {
+            'code': API_CODE
+        }
+        
+        # Validate API configuration
+        if not API_URL:
+            raise ValueError("API_URL is not configured")
+        if not API_CODE:
+            raise ValueError("API_CODE is not configured")
+        
+        # One reader per document (file1, file2, etc.); in-memory uploads are not copied
+        files = {
+            f'file{i+1}': (document.name, document.open(), 'application/octet-stream')
+            for i, document in enumerate(documents)
+        }
+
+        # Make the API request
+        print(f"DEBUG: Making API request to {API_URL} with {len(files)} files")
+        try:
+            response = requests.post(API_URL, files=files, params=params, timeout=300)
+        finally:
+            for _, reader, _ in files.values():
+                reader.close()
+        
+        api_time = int((time.time() - start_time) * 1000)
+        
+        # Log API completion
+        log_app_event(
+            log_level="INFO" if response.status_code == 200 else "ERROR",
+            message=f"API call completed with status {response.status_code}",
+            module_name="Document_AI",
+            action_type="API_CALL_COMPLETE",
+            api_endpoint=API_URL,
+            api_response_code=response.status_code,
+            api_response_time_ms=api_time,
+            correlation_id=correlation_id
+        )
+        
+        # Check if the request was successful
+        if response.status_code == 200:
+            try:
+                result = response.json()
+                print(f"DEBUG: API response received: {type(result)}")
+                store_extraction([document.sha256 for document in documents], result)
+                return result
+            except ValueError as json_error:
+                raise Exception(f"Invalid JSON response from API: {json_error}")
+        else:
+            error_msg = f"API Error: {response.status_code} - {response.text}"
+            print(f"DEBUG: {error_msg}")
+            raise Exception(error_msg)
+            
+    except requests.exceptions.Timeout:
+        error_msg = "API request timed out after 300 seconds"
+        log_error(
+            error=Exception(error_msg),
+            module_name="Document_AI",
+            function_name="process_multiple_documents_with_api",
+            api_endpoint=API_URL,
+            correlation_id=correlation_id,
+            additional_data={"timeout": 300}
+        )
+        raise Exception(error_msg)
+        
+    except requests.exceptions.ConnectionError:
+        error_msg = f"Cannot connect to API at {API_URL}"
+        log_error(
+            error=Exception(error_msg),
+            module_name="Document_AI",
+            function_name="process_multiple_documents_with_api",
+            api_endpoint=API_URL,
+            correlation_id=correlation_id
+        )
+        raise Exception(error_msg)
+        
+    except Exception as e:
+        print(f"DEBUG: Exception in process_multiple_documents_with_api: {e}")
+        log_error(
+            error=e,
+            module_name="Document_AI",
+            function_name="process_multiple_documents_with_api",
+            api_endpoint=API_URL,
+            correlation_id=correlation_id,
+            additional_data={
+                "file_count": len(documents) if documents else 0,
+                "file_names": [document.name for document in documents] if documents else []
+            }
+        )
+        # Re-raise the exception instead of swallowing it
+        raise Exception(f"Error processing documents with API: {e}")
+
+
+
+def classify_extraction(json_data):
+    """Document type, transaction type and reference number from an extraction result"""
+    document_type = None
+    transaction_type = None
+    reference_number = None
+
+    if "classification" in json_data:
+        classification = json_data.get("classification", {})
+        document_type = classification.get("category", "")
+        transaction_type = classification.get("subcategory", "")
+    elif "Type" in json_data:
+        transaction_type = json_data.get("Type", "")
+        if "Policy" in transaction_type or "Business" in transaction_type:
+            document_type = "policy"
+        elif "Claim" in transaction_type:
+            document_type = "claim"
+
+    # Extract reference numbers
+    extracted_fields = json_data.get("extracted_fields", {})
+    if document_type == "policy":
+        reference_number = extracted_fields.get("POLICY_NO", None)
+    elif document_type == "claim":
+        reference_number = extracted_fields.get("CLAIM_NO", None)
+
+    # Fallback extraction
+    if not reference_number:
+        if document_type == "policy":
+            reference_number = json_data.get("POLICY_NO", None)
+        elif document_type == "claim":
+            reference_number = json_data.get("CLAIM_NO", None)
+
+    return document_type, transaction_type, reference_number
+
+
+def record_extracted_documents(document_records, json_data, correlation_id=None):
+    """Fill in the extraction fields on each document record and insert it.
+
+    Returns ``(inserted_records, failures)`` where failures is a list of
+    ``{"file_name", "error"}``; one failed insert does not stop the others.
+    """
+    document_type, transaction_type, reference_number = classify_extraction(json_data)
+
+    inserted, failures = [], []
+    for record in document_records:
+        try:
+            record.update({
+                "JSON": json.dumps(json_data),
+                "Type": document_type,
+                "Transaction_Type": transaction_type,
+                "Reference_Number": reference_number,
+                "ProcessingStatus": "Completed"
+            })
+            insert_upload_document(record)
+            inserted.append(record)
+        except Exception as db_error:
+            log_error(
+                error=db_error,
+                module_name="Document_Upload",
+                function_name="insert_upload_document",
+                correlation_id=correlation_id,
+                additional_data={"document_guid": record.get("GUID")}
+            )
+            failures.append({"file_name": record.get("Original_File_Name"), "error": str(db_error)})
+    return inserted, failures
+
+
+# ---------------------------------------------------------------------- #
+# Background extraction jobs
+# ---------------------------------------------------------------------- #
+def enqueue_extraction_job(documents, bypass_cache=False, correlation_id=None):
+    """Copy the ingested documents to the job spool directory and queue their extraction.
+
+    Called as soon as the files are ingested, before their blob uploads; the
+    worker stores ``{"json_data"}`` as the job result and
+    ``enqueue_record_documents_job`` records the documents once it is done.
+    Returns the job id.
+    """
+    job_id = str(uuid.uuid4())
+    job_dir = os.path.join(JOB_SPOOL_DIR, job_id)
+    os.makedirs(job_dir, exist_ok=True)
+
+    files = []
+    try:
+        for i, document in enumerate(documents):
+            path = os.path.join(job_dir, f"file{i + 1}{os.path.splitext(document.name)[1]}")
+            with document.open() as source, open(path, "wb") as target:
+                shutil.copyfileobj(source, target, 1024 * 1024)
+            files.append({
+                "name": document.name, "path": path, "size": document.size,
+                "sha256": document.sha256, "md5": document.md5,
+            })
+        payload = {
+            "files": files,
+            "bypass_cache": bypass_cache,
+        }
+        get_job_queue().enqueue(EXTRACTION_JOB_KIND, payload, correlation_id=correlation_id, job_id=job_id)
+    except Exception:
+        shutil.rmtree(job_dir, ignore_errors=True)
+        raise
+
+    log_app_event(
+        log_level="INFO",
+        message=f"Extraction job queued for {len(files)} documents",
+        module_name="Document_AI",
+        action_type="JOB_ENQUEUED",
+        function_name="enqueue_extraction_job",
+        correlation_id=correlation_id,
+        additional_data={"job_id": job_id}
+    )
+    return job_id
+
+
+def enqueue_record_documents_job(extraction_job_id, document_records, correlation_id=None):
+    """Queue the insert of ``document_records`` once extraction job ``extraction_job_id`` finishes.
+
+    The job result is ``{"extraction_job_id", "document_records",
+    "failures", "extraction_error"}``; the extracted JSON stays in the
+    extraction job's result. Returns the job id.
+    """
+    return get_job_queue().enqueue(
+        RECORD_DOCUMENTS_JOB_KIND,
+        {"extraction_job_id": extraction_job_id, "document_records": document_records},
+        correlation_id=correlation_id
+    )
+
+
+def _job_documents(job):
+    return [
+        IngestedFile(f["name"], f["size"], f["sha256"], f["md5"], spool_path=f["path"])
+        for f in job["payload"]["files"]
+    ]
+
+
+def _job_document_records(job):
+    records = job["payload"]["document_records"]
+    for record in records:
+        # Serialised with the job payload; the document table wants a datetime
+        if isinstance(record.get("UploadDate"), str):
+            record["UploadDate"] = datetime.fromisoformat(record["UploadDate"])
+    return records
+
+
+def _remove_job_files(job):
+    shutil.rmtree(os.path.join(JOB_SPOOL_DIR, job["job_id"]), ignore_errors=True)
+
+
+def run_extraction_job(job):
+    """Job handler: extract from the spooled files.
+
+    The files are dropped by ``finish_extraction_job`` once the result is
+    stored, so a retry after a lost lease still has its input.
+    """
+    payload = job["payload"]
+    json_data = process_multiple_documents_with_api(
+        _job_documents(job),
+        bypass_cache=payload.get("bypass_cache", False),
+        correlation_id=job.get("correlation_id")
+    )
+    return {"json_data": json_data}
+
+
+def finish_extraction_job(job):
+    """Success handler: drop the spooled files"""
+    _remove_job_files(job)
+
+
+def fail_extraction_job(job, error):
+    """Final-failure handler: drop the spooled files; the record job stores the error"""
+    _remove_job_files(job)
+
+
+def cancel_extraction_job(job_id):
+    """Cancel an extraction job nobody will read, if no worker has started it yet"""
+    if get_job_queue().cancel(job_id):
+        _remove_job_files({"job_id": job_id})
+        return True
+    return False
+
+
+def run_record_documents_job(job):
+    """Job handler: wait for the extraction job, then insert the document records with its result.
+
+    A failed extraction records the documents with the error, as the
+    synchronous path did. Inserts skip GUIDs already recorded, so a retry is safe.
+    """
+    extraction_job_id = job["payload"]["extraction_job_id"]
+    extraction = get_job_queue().get(extraction_job_id)
+    if extraction is None:
+        raise ValueError(f"Extraction job {extraction_job_id} not found")
+
+    extraction_error = None
+    if extraction["status"] == JOB_SUCCEEDED:
+        json_data = extraction["result"]["json_data"]
+    elif extraction["status"] == JOB_FAILED:
+        extraction_error = extraction["error"]
+        json_data = {"error": "API processing failed"}
+    else:
+        raise JobNotReady(f"Extraction job {extraction_job_id} is {extraction['status']}")
+
+    inserted, failures = record_extracted_documents(
+        _job_document_records(job), json_data, correlation_id=job.get("correlation_id")
+    )
+    return {
+        "extraction_job_id": extraction_job_id,
+        # The JSON column repeats the extraction result; it is not needed to report the upload
+        "document_records": [{k: v for k, v in record.items() if k != "JSON"} for record in inserted],
+        "failures": failures,
+        "extraction_error": extraction_error,
+    }
+
+
+EXTRACTION_JOB_HANDLERS = {
+    EXTRACTION_JOB_KIND: run_extraction_job,
+    RECORD_DOCUMENTS_JOB_KIND: run_record_documents_job,
+}
+EXTRACTION_FAILURE_HANDLERS = {EXTRACTION_JOB_KIND: fail_extraction_job}
+EXTRACTION_SUCCESS_HANDLERS = {EXTRACTION_JOB_KIND: finish_extraction_job}
+
+
+def start_extraction_workers():
+    """Make sure this process runs its embedded extraction workers"""
+    return start_embedded_workers(EXTRACTION_JOB_HANDLERS, EXTRACTION_FAILURE_HANDLERS, EXTRACTION_SUCCESS_HANDLERS)
@@ -0,0 +1,172 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+
+import dotenv
+
+dotenv.load_dotenv(Path(__file__).parent.parent / ".env")
+
+
+class ExtractionCache:
+    """Disk-backed cache of Document AI results keyed by the uploaded file set.
+
+    The key is the sorted SHA-256s of the files plus an API version tag, so
+    the same documents uploaded in any order hit the same entry, and bumping
+    the version invalidates everything produced by an older extractor.
+    Entries expire ``ttl_seconds`` after they were stored; beyond
+    ``max_entries`` the least recently read ones are evicted. Stored in
+    SQLite so results survive Streamlit restarts.
+    """
+
+    def __init__(self, path: str, ttl_seconds: float = 86400, max_entries: int = 500):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max(1, max_entries)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS extraction_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    api_version TEXT NOT NULL,
+                    result_json TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+                """
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_extraction_cache_last_access ON extraction_cache (last_access)"
+            )
+
+    @staticmethod
+    def make_key(file_hashes: Iterable[str], api_version: str) -> str:
+        payload = json.dumps({"v": api_version, "files": sorted(file_hashes)})
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, file_hashes: Iterable[str], api_version: str) -> Optional[Any]:
+        """Cached result for this file set, or None on a miss/expired entry"""
+        key = self.make_key(file_hashes, api_version)
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT result_json, created_at FROM extraction_cache WHERE cache_key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl_seconds:
+                if row is not None:
+                    self._conn.execute("DELETE FROM extraction_cache WHERE cache_key = ?", (key,))
+                    self._stats["evictions"] += 1
+                self._stats["misses"] += 1
+                return None
+            self._conn.execute("UPDATE extraction_cache SET last_access = ? WHERE cache_key = ?", (now, key))
+            self._stats["hits"] += 1
+        return json.loads(row[0])
+
+    def put(self, file_hashes: Iterable[str], api_version: str, result: Any):
+        key = self.make_key(file_hashes, api_version)
+        now = time.time()
+        result_json = json.dumps(result)
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                INSERT OR REPLACE INTO extraction_cache
+                (cache_key, api_version, result_json, created_at, last_access)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                (key, api_version, result_json, now, now),
+            )
+            self._stats["stores"] += 1
+            self._evict(now)
+
+    def invalidate(self, file_hashes: Iterable[str], api_version: str):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM extraction_cache WHERE cache_key = ?", (self.make_key(file_hashes, api_version),)
+            )
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM extraction_cache")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["entries"] = self._conn.execute("SELECT COUNT(*) FROM extraction_cache").fetchone()[0]
+        lookups = snapshot["hits"] + snapshot["misses"]
+        snapshot["hit_rate"] = round(snapshot["hits"] / lookups, 4) if lookups else 0.0
+        return snapshot
+
+    def _evict(self, now):
+        """Drop expired entries, then the least recently used beyond max_entries"""
+        expired = self._conn.execute(
+            "DELETE FROM extraction_cache WHERE created_at < ?", (now - self.ttl_seconds,)
+        ).rowcount
+        overflow = self._conn.execute(
+            """
+            DELETE FROM extraction_cache WHERE cache_key IN (
+                SELECT cache_key FROM extraction_cache
+                ORDER BY last_access DESC
+                LIMIT -1 OFFSET ?
+            )
+            """,
+            (self.max_entries,),
+        ).rowcount
+        self._stats["evictions"] += max(0, expired) + max(0, overflow)
+
+
+EXTRACTION_API_VERSION = os.getenv("EXTRACTION_API_VERSION", "1")
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def extraction_cache_enabled() -> bool:
+    return os.getenv("EXTRACTION_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+
+
+def get_extraction_cache() -> ExtractionCache:
+    """Return the shared cache, opening the SQLite file on first use"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ExtractionCache(
+                    path=os.getenv("EXTRACTION_CACHE_PATH", "extraction_cache.sqlite3"),
+                    ttl_seconds=float(os.getenv("EXTRACTION_CACHE_TTL", "86400")),
+                    max_entries=int(os.getenv("EXTRACTION_CACHE_MAX_ENTRIES", "500")),
+                )
+    return _cache
+
+
+def get_cached_extraction(file_hashes, bypass=False):
+    """Cached extraction for this file set, or None (also when disabled/bypassed or on cache errors)"""
+    if bypass or not extraction_cache_enabled() or not file_hashes:
+        return None
+    try:
+        return get_extraction_cache().get(file_hashes, EXTRACTION_API_VERSION)
+    except Exception as e:
+        print(f"Extraction cache lookup failed: {e}")
+        return None
+
+
+def store_extraction(file_hashes, result):
+    """Cache a successful extraction; error payloads are never cached"""
+    if not extraction_cache_enabled() or not file_hashes:
+        return
+    if not isinstance(result, dict) or "error" in result:
+        return
+    try:
+        get_extraction_cache().put(file_hashes, EXTRACTION_API_VERSION, result)
+    except Exception as e:
+        print(f"Extraction cache store failed: {e}")
@@ -0,0 +1,83 @@
+import io
+import os
+import time
+from pathlib import Path
+
+import dotenv
+from PIL import Image, ImageOps
+
+dotenv.load_dotenv(Path(__file__).parent.parent / ".env")
+
+CV_PREPROCESS_ENABLED = os.getenv("CV_PREPROCESS_ENABLED", "true").lower() in ("1", "true", "yes")
+CV_IMAGE_MAX_EDGE = int(os.getenv("CV_IMAGE_MAX_EDGE", "1600"))
+CV_IMAGE_FORMAT = os.getenv("CV_IMAGE_FORMAT", "JPEG").upper()
+CV_IMAGE_QUALITY = int(os.getenv("CV_IMAGE_QUALITY", "85"))
+
+_CONTENT_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp"}
+_EXTENSIONS = {"JPEG": "jpg", "WEBP": "webp"}
+
+
+def prepare_cv_image(image_bytes, filename, max_edge=None, image_format=None, quality=None):
+    """Downscale and re-encode a photo for the CV endpoint.
+
+    Applies the EXIF orientation, shrinks the longest edge to ``max_edge``
+    pixels and re-encodes as JPEG or WebP at ``quality`` (defaults from
+    CV_IMAGE_MAX_EDGE, CV_IMAGE_FORMAT and CV_IMAGE_QUALITY). The original
+    bytes are left untouched for archival. If the image cannot be decoded,
+    or re-encoding would not make it smaller without changing its size or
+    orientation, the original is sent instead.
+
+    Returns ``(payload, filename, content_type, stats)``.
+    """
+    start_time = time.time()
+    max_edge = CV_IMAGE_MAX_EDGE if max_edge is None else max_edge
+    image_format = (image_format or CV_IMAGE_FORMAT).upper()
+    quality = CV_IMAGE_QUALITY if quality is None else quality
+    if image_format not in _CONTENT_TYPES:
+        raise ValueError(f"Unsupported CV_IMAGE_FORMAT: {image_format}")
+
+    stats = {
+        "original_bytes": len(image_bytes),
+        "processed_bytes": len(image_bytes),
+        "bytes_saved": 0,
+        "preprocessed": False,
+    }
+    original = (image_bytes, filename, "image/jpeg", stats)
+    if not CV_PREPROCESS_ENABLED:
+        stats["preprocess_ms"] = 0
+        return original
+
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as source:
+            original_size = source.size
+            stats["original_size"] = f"{original_size[0]}x{original_size[1]}"
+            rotated = source.getexif().get(0x0112, 1) != 1  # EXIF Orientation tag
+            image = ImageOps.exif_transpose(source)
+            if max_edge and max(image.size) > max_edge:
+                image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+            resized = max(image.size) < max(original_size)
+            if image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+
+            buffer = io.BytesIO()
+            image.save(buffer, format=image_format, quality=quality, optimize=True)
+            processed = buffer.getvalue()
+            stats["processed_size"] = f"{image.size[0]}x{image.size[1]}"
+    except Exception as e:
+        print(f"Image preprocessing failed for {filename}, sending original: {e}")
+        stats["preprocess_ms"] = int((time.time() - start_time) * 1000)
+        return original
+
+    stats["preprocess_ms"] = int((time.time() - start_time) * 1000)
+    if len(processed) >= len(image_bytes) and not (resized or rotated):
+        return original
+
+    stats.update({
+        "processed_bytes": len(processed),
+        "bytes_saved": len(image_bytes) - len(processed),
+        "preprocessed": True,
+        "format": image_format,
+        "quality": quality,
+    })
+    stem = filename.rsplit(".", 1)[0] if "." in filename else filename
+    return processed, f"{stem}.{_EXTENSIONS[image_format]}", _CONTENT_TYPES[image_format], stats
@@ -0,0 +1,106 @@
+import hashlib
+import io
+import os
+import tempfile
+from pathlib import Path
+from typing import BinaryIO, Optional
+
+import dotenv
+
+dotenv.load_dotenv(Path(__file__).parent.parent / ".env")
+
+INGEST_CHUNK_SIZE = 1024 * 1024
+INGEST_MEMORY_LIMIT_BYTES = int(float(os.getenv("INGEST_MEMORY_LIMIT_MB", "32")) * 1024 * 1024)
+
+
+class IngestedFile:
+    """An upload read exactly once, with its SHA-256 and MD5 computed on the way.
+
+    Uploads up to the memory limit keep a reference to the source's bytes
+    (no copy); larger ones are spooled to a temp file in fixed-size chunks.
+    Either way :meth:`open` returns an independent reader, so the blob upload
+    and the Document AI request can consume the same file concurrently.
+    Call :meth:`close` to delete the spool file.
+    """
+
+    def __init__(self, name: str, size: int, sha256: str, md5: str,
+                 data: Optional[bytes] = None, spool_path: Optional[str] = None):
+        self.name = name
+        self.size = size
+        self.sha256 = sha256
+        self.md5 = md5
+        self._data = data
+        self.spool_path = spool_path
+
+    @property
+    def in_memory(self) -> bool:
+        return self._data is not None
+
+    def open(self) -> BinaryIO:
+        """New read-only stream positioned at the start of the file"""
+        if self._data is not None:
+            return io.BytesIO(self._data)  # shares the bytes object until written to
+        return open(self.spool_path, "rb")
+
+    def view(self) -> memoryview:
+        """Zero-copy view of an in-memory upload"""
+        if self._data is None:
+            raise ValueError(f"{self.name} is spooled to disk; use open()")
+        return memoryview(self._data)
+
+    def close(self):
+        self._data = None
+        if self.spool_path:
+            try:
+                os.remove(self.spool_path)
+            except OSError as e:
+                print(f"Warning: Could not remove temp file {self.spool_path}: {e}")
+            self.spool_path = None
+
+
+def ingest_upload(source, name: Optional[str] = None, memory_limit: Optional[int] = None) -> IngestedFile:
+    """Stream ``source`` once, hashing it and keeping it in memory or on disk.
+
+    ``source`` is an uploaded file object (or any binary file object).
+    Files larger than ``memory_limit`` bytes (INGEST_MEMORY_LIMIT_MB by
+    default) are written to a temp file chunk by chunk instead of being held
+    as one buffer.
+    """
+    if memory_limit is None:
+        memory_limit = INGEST_MEMORY_LIMIT_BYTES
+    name = name or getattr(source, "name", "upload")
+    sha256 = hashlib.sha256()
+    md5 = hashlib.md5()
+
+    size = getattr(source, "size", None)
+    if hasattr(source, "getvalue") and size is not None and size <= memory_limit:
+        # In-memory uploads (Streamlit's UploadedFile is a BytesIO): getvalue()
+        # returns the existing bytes object, so hashing slices of a view of it
+        # copies nothing
+        data = source.getvalue()
+        view = memoryview(data)
+        for offset in range(0, len(view), INGEST_CHUNK_SIZE):
+            chunk = view[offset:offset + INGEST_CHUNK_SIZE]
+            sha256.update(chunk)
+            md5.update(chunk)
+        if not data:
+            raise ValueError(f"File {name} is empty")
+        return IngestedFile(name, len(data), sha256.hexdigest(), md5.hexdigest(), data=data)
+
+    if hasattr(source, "seek"):
+        source.seek(0)
+    size = 0
+    with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(name)[1]) as spool:
+        try:
+            for chunk in iter(lambda: source.read(INGEST_CHUNK_SIZE), b""):
+                sha256.update(chunk)
+                md5.update(chunk)
+                spool.write(chunk)
+                size += len(chunk)
+            if size == 0:
+                raise ValueError(f"File {name} is empty")
+        except Exception:
+            spool.close()
+            os.remove(spool.name)
+            raise
+    return IngestedFile(name, size, sha256.hexdigest(), md5.hexdigest(), spool_path=spool.name)
@@ -0,0 +1,417 @@
+import json
+import os
+import random
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import dotenv
+
+dotenv.load_dotenv(Path(__file__).parent.parent / ".env")
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+
+class JobNotReady(Exception):
+    """Raised by a handler whose job has to wait; it is re-queued without using up an attempt"""
+
+    def __init__(self, message: str = "", delay: float = 2.0):
+        super().__init__(message)
+        self.delay = delay
+
+
+class JobQueue:
+    """Durable job queue stored in a local SQLite file.
+
+    Jobs move queued -> running -> succeeded/failed. A failed attempt goes
+    back to queued with exponential backoff until ``max_attempts`` is
+    reached. Claims take a lease; if a worker dies mid-job the lease expires
+    and another worker picks the job up again. At most ``max_running`` jobs
+    run at once across every process sharing the file, which caps the load
+    sent to the downstream API.
+    """
+
+    def __init__(self, path: str, max_running: int = 2, lease_seconds: float = 420,
+                 max_attempts: int = 3, backoff_base: float = 5.0, backoff_max: float = 300.0):
+        self.path = path
+        self.max_running = max(1, max_running)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._local = threading.local()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    payload_json TEXT NOT NULL,
+                    result_json TEXT,
+                    error TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    max_attempts INTEGER NOT NULL,
+                    next_run_at REAL NOT NULL,
+                    lease_expires_at REAL,
+                    worker_id TEXT,
+                    correlation_id TEXT,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_jobs_status_next_run ON jobs (status, next_run_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_jobs_created_at ON jobs (created_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        """One connection per thread; SQLite handles locking between them"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return _Transaction(conn)
+
+    # ------------------------------------------------------------------ #
+    # Producer / UI side
+    # ------------------------------------------------------------------ #
+    def enqueue(self, kind: str, payload: Dict[str, Any], correlation_id: Optional[str] = None,
+                max_attempts: Optional[int] = None, job_id: Optional[str] = None) -> str:
+        job_id = job_id or str(uuid.uuid4())
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                """
+                INSERT INTO jobs (job_id, kind, status, payload_json, attempts, max_attempts,
+                                  next_run_at, correlation_id, created_at, updated_at)
+                VALUES (?, ?, ?, ?, 0, ?, ?, ?, ?, ?)
+                """,
+                (job_id, kind, JOB_QUEUED, json.dumps(payload, default=str),
+                 max_attempts or self.max_attempts, now, correlation_id, now, now),
+            )
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return _row_to_job(row) if row else None
+
+    def list_jobs(self, limit: int = 50, kind: Optional[str] = None, status: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Most recent jobs first, without their payloads and results"""
+        clauses, params = [], []
+        if kind:
+            clauses.append("kind = ?")
+            params.append(kind)
+        if status:
+            clauses.append("status = ?")
+            params.append(status)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"""
+                SELECT job_id, kind, status, error, attempts, max_attempts, next_run_at, worker_id,
+                       correlation_id, created_at, started_at, finished_at, updated_at
+                FROM jobs {where}
+                ORDER BY created_at DESC
+                LIMIT ?
+                """,
+                (*params, limit),
+            ).fetchall()
+        return [_row_to_job(row) for row in rows]
+
+    def stats(self) -> Dict[str, int]:
+        with self._connect() as conn:
+            rows = conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        counts = {JOB_QUEUED: 0, JOB_RUNNING: 0, JOB_SUCCEEDED: 0, JOB_FAILED: 0}
+        counts.update({row[0]: row[1] for row in rows})
+        return counts
+
+    def purge(self, older_than_seconds: float) -> int:
+        """Delete finished jobs older than the given age; returns the count"""
+        cutoff = time.time() - older_than_seconds
+        with self._connect() as conn:
+            return conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?",
+                (JOB_SUCCEEDED, JOB_FAILED, cutoff),
+            ).rowcount
+
+    # ------------------------------------------------------------------ #
+    # Worker side
+    # ------------------------------------------------------------------ #
+    def claim(self, worker_id: str, kinds: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        """Lease the next runnable job, or None if nothing is due or the running limit is reached"""
+        now = time.time()
+        kind_filter = ""
+        params: List[Any] = []
+        if kinds:
+            kind_filter = f"AND kind IN ({', '.join('?' * len(kinds))})"
+            params.extend(kinds)
+
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            running = conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = ? AND lease_expires_at > ?", (JOB_RUNNING, now)
+            ).fetchone()[0]
+            if running >= self.max_running:
+                return None
+            row = conn.execute(
+                f"""
+                SELECT job_id FROM jobs
+                WHERE ((status = ? AND next_run_at <= ?) OR (status = ? AND lease_expires_at <= ?))
+                {kind_filter}
+                ORDER BY next_run_at, created_at
+                LIMIT 1
+                """,
+                (JOB_QUEUED, now, JOB_RUNNING, now, *params),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                """
+                UPDATE jobs
+                SET status = ?, attempts = attempts + 1, worker_id = ?, lease_expires_at = ?,
+                    started_at = ?, updated_at = ?
+                WHERE job_id = ?
+                """,
+                (JOB_RUNNING, worker_id, now + self.lease_seconds, now, now, row["job_id"]),
+            )
+            job = conn.execute("SELECT * FROM jobs WHERE job_id = ?", (row["job_id"],)).fetchone()
+        return _row_to_job(job)
+
+    def complete(self, job_id: str, result: Any, worker_id: str) -> bool:
+        """Store the result if ``worker_id`` still holds the lease; returns whether it did"""
+        now = time.time()
+        with self._connect() as conn:
+            return conn.execute(
+                """
+                UPDATE jobs SET status = ?, result_json = ?, error = NULL, lease_expires_at = NULL,
+                                finished_at = ?, updated_at = ?
+                WHERE job_id = ? AND status = ? AND worker_id = ?
+                """,
+                (JOB_SUCCEEDED, json.dumps(result, default=str), now, now, job_id, JOB_RUNNING, worker_id),
+            ).rowcount == 1
+
+    def defer(self, job_id: str, worker_id: str, delay: float) -> bool:
+        """Put a leased job back in the queue for ``delay`` seconds without counting the attempt"""
+        now = time.time()
+        with self._connect() as conn:
+            return conn.execute(
+                """
+                UPDATE jobs SET status = ?, attempts = attempts - 1, next_run_at = ?, lease_expires_at = NULL,
+                                updated_at = ?
+                WHERE job_id = ? AND status = ? AND worker_id = ?
+                """,
+                (JOB_QUEUED, now + delay, now, job_id, JOB_RUNNING, worker_id),
+            ).rowcount == 1
+
+    def cancel(self, job_id: str) -> bool:
+        """Fail a job that no worker has picked up yet; returns whether it was still queued"""
+        now = time.time()
+        with self._connect() as conn:
+            return conn.execute(
+                """
+                UPDATE jobs SET status = ?, error = ?, finished_at = ?, updated_at = ?
+                WHERE job_id = ? AND status = ?
+                """,
+                (JOB_FAILED, "Cancelled", now, now, job_id, JOB_QUEUED),
+            ).rowcount == 1
+
+    def fail(self, job_id: str, error: str, worker_id: str) -> Optional[str]:
+        """Record a failed attempt; returns the new status (queued for a retry, or failed).
+
+        Returns None, leaving the job alone, if ``worker_id`` no longer holds the lease.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT status, worker_id, attempts, max_attempts FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+            if row is None:
+                return JOB_FAILED
+            if row["status"] != JOB_RUNNING or row["worker_id"] != worker_id:
+                return None
+            if row["attempts"] < row["max_attempts"]:
+                # Exponential backoff with jitter so retries don't arrive in lockstep
+                delay = min(self.backoff_max, self.backoff_base * (2 ** (row["attempts"] - 1)))
+                delay *= random.uniform(0.8, 1.2)
+                conn.execute(
+                    """
+                    UPDATE jobs SET status = ?, error = ?, next_run_at = ?, lease_expires_at = NULL, updated_at = ?
+                    WHERE job_id = ?
+                    """,
+                    (JOB_QUEUED, error, now + delay, now, job_id),
+                )
+                return JOB_QUEUED
+            conn.execute(
+                """
+                UPDATE jobs SET status = ?, error = ?, lease_expires_at = NULL, finished_at = ?, updated_at = ?
+                WHERE job_id = ?
+                """,
+                (JOB_FAILED, error, now, now, job_id),
+            )
+            return JOB_FAILED
+
+
+class _Transaction:
+    """``with`` wrapper committing (or rolling back) an autocommit-mode connection"""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def __enter__(self) -> sqlite3.Connection:
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.conn.in_transaction:
+            self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
+
+def _row_to_job(row: sqlite3.Row) -> Dict[str, Any]:
+    job = dict(row)
+    for key in ("payload_json", "result_json"):
+        if key in job:
+            value = job.pop(key)
+            job[key[:-5]] = json.loads(value) if value else None
+    for key in ("created_at", "started_at", "finished_at", "updated_at", "next_run_at"):
+        if job.get(key):
+            job[f"{key}_dt"] = datetime.fromtimestamp(job[key])
+    return job
+
+
+class JobWorker(threading.Thread):
+    """Polls the queue and runs claimed jobs through ``handlers[kind](job)``.
+
+    The handler's return value is stored as the job result; JobNotReady
+    re-queues the job and any other exception records a failed attempt.
+    Once the result is stored, ``success_handlers[kind](job)`` is called (if
+    registered). When the last attempt fails, ``failure_handlers[kind](job,
+    error)`` is called (if registered) so the caller can clean up or record
+    the failure.
+    """
+
+    def __init__(self, job_queue: JobQueue, handlers: Dict[str, Callable[[Dict[str, Any]], Any]],
+                 failure_handlers: Optional[Dict[str, Callable[[Dict[str, Any], str], None]]] = None,
+                 success_handlers: Optional[Dict[str, Callable[[Dict[str, Any]], None]]] = None,
+                 poll_interval: float = 1.0, name: Optional[str] = None):
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{name or uuid.uuid4().hex[:8]}"
+        super().__init__(name=name or "job-worker", daemon=True)
+        self.job_queue = job_queue
+        self.handlers = handlers
+        self.failure_handlers = failure_handlers or {}
+        self.success_handlers = success_handlers or {}
+        self.poll_interval = poll_interval
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                job = self.job_queue.claim(self.worker_id, kinds=list(self.handlers))
+            except Exception as e:
+                print(f"Job queue claim failed: {e}")
+                job = None
+            if job is None:
+                self._stop_event.wait(self.poll_interval)
+                continue
+            self.run_job(job)
+
+    def run_job(self, job: Dict[str, Any]):
+        try:
+            result = self.handlers[job["kind"]](job)
+        except JobNotReady as e:
+            try:
+                self.job_queue.defer(job["job_id"], self.worker_id, e.delay)
+            except Exception as queue_error:
+                print(f"Could not re-queue job {job['job_id']}: {queue_error}")
+            return
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            print(f"Job {job['job_id']} attempt {job['attempts']} failed: {error}")
+            traceback.print_exc()
+            try:
+                status = self.job_queue.fail(job["job_id"], error, self.worker_id)
+            except Exception as queue_error:
+                print(f"Could not record failure for job {job['job_id']}: {queue_error}")
+                return
+            on_failure = self.failure_handlers.get(job["kind"])
+            if status == JOB_FAILED and on_failure:
+                try:
+                    on_failure(job, error)
+                except Exception as handler_error:
+                    print(f"Failure handler for job {job['job_id']} raised: {handler_error}")
+            return
+        try:
+            completed = self.job_queue.complete(job["job_id"], result, self.worker_id)
+        except Exception as queue_error:
+            print(f"Could not record result for job {job['job_id']}: {queue_error}")
+            return
+        if not completed:
+            # Another worker may be running the job again; leave its inputs alone
+            print(f"Job {job['job_id']} lease was lost before it finished; result discarded")
+            return
+        on_success = self.success_handlers.get(job["kind"])
+        if on_success:
+            try:
+                on_success(job)
+            except Exception as handler_error:
+                print(f"Success handler for job {job['job_id']} raised: {handler_error}")
+
+
+_queue = None
+_queue_lock = threading.Lock()
+_embedded_workers: List[JobWorker] = []
+_embedded_workers_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    """Return the shared queue, opening the SQLite file on first use"""
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = JobQueue(
+                    path=os.getenv("JOB_QUEUE_PATH", "jobs.sqlite3"),
+                    max_running=int(os.getenv("JOB_MAX_RUNNING", "2")),
+                    lease_seconds=float(os.getenv("JOB_LEASE_SECONDS", "420")),
+                    max_attempts=int(os.getenv("JOB_MAX_ATTEMPTS", "3")),
+                    backoff_base=float(os.getenv("JOB_BACKOFF_BASE", "5")),
+                    backoff_max=float(os.getenv("JOB_BACKOFF_MAX", "300")),
+                )
+    return _queue
+
+
+def start_embedded_workers(handlers, failure_handlers=None, success_handlers=None, count=None) -> List[JobWorker]:
+    """Start in-process worker threads once per process (JOB_EMBEDDED_WORKERS, default 2).
+
+    Set JOB_EMBEDDED_WORKERS=0 when dedicated worker processes
+    (src/extraction_worker.py) are running instead.
+    """
+    if count is None:
+        count = int(os.getenv("JOB_EMBEDDED_WORKERS", "2"))
+    with _embedded_workers_lock:
+        if not _embedded_workers:
+            for i in range(count):
+                worker = JobWorker(get_job_queue(), handlers, failure_handlers, success_handlers,
+                                   name=f"job-worker-{i + 1}")
+                worker.start()
+                _embedded_workers.append(worker)
+    return list(_embedded_workers)
@@ -0,0 +1,192 @@
+import atexit
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List
+
+
+class _FlushRequest:
+    """Queue marker asking the worker to write everything received so far"""
+
+    def __init__(self):
+        self.done = threading.Event()
+
+
+_STOP = object()
+
+
+class AsyncLogSink:
+    """Bounded in-process queue drained by a background worker in batches.
+
+    ``write_batch`` receives a list of queued events and is expected to persist
+    them in one round trip; if it raises, the batch is handed to ``spill`` so
+    nothing is silently lost while the database is unavailable. A batch is
+    written when it reaches ``batch_size`` events or ``flush_interval`` seconds
+    after its first event, whichever comes first.
+
+    When the queue is full, ``full_policy="drop"`` discards the new event and
+    ``full_policy="block"`` waits up to ``block_timeout`` seconds for space
+    before discarding it.
+    """
+
+    def __init__(
+        self,
+        write_batch: Callable[[List[Any]], None],
+        spill: Callable[[List[Any]], None],
+        max_queue_size: int = 10000,
+        batch_size: int = 50,
+        flush_interval: float = 2.0,
+        full_policy: str = "drop",
+        block_timeout: float = 1.0,
+        name: str = "app-log-sink",
+    ):
+        if full_policy not in ("drop", "block"):
+            raise ValueError("full_policy must be 'drop' or 'block'")
+
+        self._write_batch = write_batch
+        self._spill = spill
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.full_policy = full_policy
+        self.block_timeout = block_timeout
+
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "enqueued": 0,
+            "written": 0,
+            "batches": 0,
+            "dropped": 0,
+            "spilled": 0,
+            "write_failures": 0,
+        }
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, name=name, daemon=True)
+        self._worker.start()
+        atexit.register(self.close)
+
+    # ------------------------------------------------------------------ #
+    # Producer side
+    # ------------------------------------------------------------------ #
+    def submit(self, event) -> bool:
+        """Queue an event; returns False if it was dropped"""
+        if self._closed:
+            self._spill_quietly([event])
+            return False
+        try:
+            if self.full_policy == "block":
+                self._queue.put(event, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(event)
+        except queue.Full:
+            self._bump("dropped")
+            return False
+        self._bump("enqueued")
+        return True
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Block until every event submitted before this call has been handled"""
+        if self._closed or not self._worker.is_alive():
+            return False
+        request = _FlushRequest()
+        try:
+            self._queue.put(request, timeout=timeout)
+        except queue.Full:
+            return False
+        return request.done.wait(timeout)
+
+    def close(self, timeout: float = 10.0):
+        """Flush outstanding events and stop the worker (registered with atexit)"""
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        self._worker.join(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            snapshot = dict(self._stats)
+        snapshot["queue_depth"] = self._queue.qsize()
+        snapshot["full_policy"] = self.full_policy
+        return snapshot
+
+    # ------------------------------------------------------------------ #
+    # Worker side
+    # ------------------------------------------------------------------ #
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            batch = []
+            pending_flushes = []
+            stop = False
+            deadline = time.monotonic() + self.flush_interval
+
+            while True:
+                if item is _STOP:
+                    stop = True
+                    break
+                if isinstance(item, _FlushRequest):
+                    pending_flushes.append(item)
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+
+            if batch:
+                self._write(batch)
+            for request in pending_flushes:
+                request.done.set()
+            if stop:
+                self._drain_after_stop()
+                return
+
+    def _drain_after_stop(self):
+        batch = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(item, _FlushRequest):
+                item.done.set()
+            elif item is not _STOP:
+                batch.append(item)
+            if len(batch) >= self.batch_size:
+                self._write(batch)
+                batch = []
+        if batch:
+            self._write(batch)
+
+    def _write(self, batch):
+        try:
+            self._write_batch(batch)
+        except Exception as e:
+            print(f"Failed to log to database: {e}")
+            self._bump("write_failures")
+            self._spill_quietly(batch)
+            return
+        with self._stats_lock:
+            self._stats["written"] += len(batch)
+            self._stats["batches"] += 1
+
+    def _spill_quietly(self, batch):
+        try:
+            self._spill(batch)
+            with self._stats_lock:
+                self._stats["spilled"] += len(batch)
+        except Exception:
+            pass
+
+    def _bump(self, key):
+        with self._stats_lock:
+            self._stats[key] += 1
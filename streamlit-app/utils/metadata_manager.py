@@ -1,13 +1,13 @@
 import hashlib
 import uuid
 import os
-import psutil
 import streamlit as st
 from datetime import datetime
 from pathlib import Path
 import json
 from typing import Dict, Any, Optional
-from db_utils import get_db_connection
+from db_utils import db_connection
+from system_metrics import get_system_metrics
 import pyodbc
 
 class MetadataManager:
@@ -17,10 +17,16 @@ class MetadataManager:
         self.session_start = datetime.now()
         self.processing_metrics = {}
     
-    def get_enhanced_file_metadata(self, uploaded_file, file_path: str) -> Dict[str, Any]:
-        """Extract comprehensive file metadata"""
+    def get_enhanced_file_metadata(self, uploaded_file, file_path: Optional[str] = None, ingested=None) -> Dict[str, Any]:
+        """Extract comprehensive file metadata
+
+        Pass ``ingested`` (an ingest.IngestedFile) to reuse the hashes computed
+        while the upload was read instead of reading the file again.
+        """
         try:
-            file_stats = os.stat(file_path)
+            file_path = file_path or (ingested.spool_path if ingested else None)
+            file_stats = os.stat(file_path) if file_path else None
+            now = datetime.now().isoformat()
             
             metadata = {
                 # Basic file info
@@ -31,13 +37,13 @@ class MetadataManager:
                 "mime_type": uploaded_file.type or "application/octet-stream",
                 
                 # File system metadata
-                "creation_time": datetime.fromtimestamp(file_stats.st_ctime).isoformat(),
-                "modification_time": datetime.fromtimestamp(file_stats.st_mtime).isoformat(),
-                "access_time": datetime.fromtimestamp(file_stats.st_atime).isoformat(),
+                "creation_time": datetime.fromtimestamp(file_stats.st_ctime).isoformat() if file_stats else now,
+                "modification_time": datetime.fromtimestamp(file_stats.st_mtime).isoformat() if file_stats else now,
+                "access_time": datetime.fromtimestamp(file_stats.st_atime).isoformat() if file_stats else now,
                 
                 # File integrity
-                "file_hash_sha256": self.compute_file_hash(file_path),
-                "file_hash_md5": self.compute_md5_hash(file_path),
+                "file_hash_sha256": ingested.sha256 if ingested else self.compute_file_hash(file_path),
+                "file_hash_md5": ingested.md5 if ingested else self.compute_md5_hash(file_path),
                 
                 # Upload session metadata
                 "upload_timestamp": datetime.now().isoformat(),
@@ -126,7 +132,7 @@ class MetadataManager:
     def get_business_metadata(self, json_data: Dict, form_type: str) -> Dict[str, Any]:
         """Capture business-specific metadata"""
         try:
-            from db_utils import fetch_data
+            from db_utils import fetch
             
             metadata = {
                 # Document routing
@@ -153,7 +159,10 @@ class MetadataManager:
             # Validate policy exists
             if metadata["policy_number"]:
                 try:
-                    policy_result = fetch_data(f"SELECT POLICY_NO, POLICYTYPE, isCancelled, isLapsed FROM Policy WHERE POLICY_NO = '{metadata['policy_number']}'")
+                    policy_result = fetch(
+                        "SELECT POLICY_NO, POLICYTYPE, isCancelled, isLapsed FROM Policy WHERE POLICY_NO = %s",
+                        (metadata["policy_number"],)
+                    )
                     if policy_result:
                         metadata["policy_found"] = True
                         metadata["policy_status"] = "active"
@@ -170,7 +179,10 @@ class MetadataManager:
             # Validate claim exists
             if metadata["claim_number"]:
                 try:
-                    claim_result = fetch_data(f"SELECT CLAIM_NO, CLAIM_STATUS FROM Claims WHERE CLAIM_NO = '{metadata['claim_number']}'")
+                    claim_result = fetch(
+                        "SELECT CLAIM_NO, CLAIM_STATUS FROM Claims WHERE CLAIM_NO = %s",
+                        (metadata["claim_number"],)
+                    )
                     if claim_result:
                         metadata["claim_found"] = True
                         metadata["claim_status"] = claim_result[0].get("CLAIM_STATUS", "unknown")
@@ -190,29 +202,24 @@ class MetadataManager:
     def get_system_performance_metadata(self) -> Dict[str, Any]:
         """Capture system performance metrics"""
         try:
-            # Get memory usage
-            memory_info = psutil.virtual_memory()
-            
-            # Get CPU usage
-            cpu_percent = psutil.cpu_percent(interval=1)
-            
-            # Get disk usage
-            disk_usage = psutil.disk_usage('/')
+            # Read the shared sampler's snapshot rather than blocking on psutil
+            system_metrics = get_system_metrics()
             
             metadata = {
                 # Memory metrics
-                "memory_total_gb": round(memory_info.total / (1024**3), 2),
-                "memory_available_gb": round(memory_info.available / (1024**3), 2),
-                "memory_used_percent": memory_info.percent,
+                "memory_total_gb": system_metrics.get("memory_total_gb"),
+                "memory_available_gb": system_metrics.get("memory_available_gb"),
+                "memory_used_percent": system_metrics.get("memory_used_percent"),
+                "process_rss_mb": system_metrics.get("process_rss_mb"),
                 
                 # CPU metrics
-                "cpu_usage_percent": cpu_percent,
-                "cpu_count": psutil.cpu_count(),
+                "cpu_usage_percent": system_metrics.get("cpu_usage_percent"),
+                "cpu_count": system_metrics.get("cpu_count"),
                 
                 # Disk metrics
-                "disk_total_gb": round(disk_usage.total / (1024**3), 2),
-                "disk_free_gb": round(disk_usage.free / (1024**3), 2),
-                "disk_used_percent": round((disk_usage.used / disk_usage.total) * 100, 2),
+                "disk_total_gb": system_metrics.get("disk_total_gb"),
+                "disk_free_gb": system_metrics.get("disk_free_gb"),
+                "disk_used_percent": system_metrics.get("disk_used_percent"),
                 
                 # Application metrics
                 "timestamp": datetime.now().isoformat(),
@@ -359,69 +366,65 @@ class MetadataManager:
     def insert_metadata_record(self, metadata_record: Dict[str, Any]) -> bool:
         """Insert metadata record into database"""
         try:
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            
-            insert_query = """
-            INSERT INTO DocumentMetadata (
-                metadata_id, document_guid, created_timestamp,
-                file_original_name, file_size_bytes, file_size_mb, file_extension, mime_type,
-                file_hash_sha256, file_hash_md5, session_id, user_agent, client_ip,
-                upload_count, session_start_time, api_processing_time, fields_extracted_count,
-                extraction_confidence, processing_method, pages_processed, document_type,
-                auto_routed_to, routing_confidence, policy_found, claim_found,
-                requires_manual_review, policy_number, claim_number, customer_id,
-                validation_errors, memory_used_percent, cpu_usage_percent, disk_used_percent,
-                environment, application_version, blob_url, container_name, azure_region,
-                full_metadata_json
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """
-            
-            cursor.execute(insert_query, (
-                metadata_record.get("metadata_id"),
-                metadata_record.get("document_guid"),
-                metadata_record.get("created_timestamp"),
-                metadata_record.get("file_original_name"),
-                metadata_record.get("file_size_bytes"),
-                metadata_record.get("file_size_mb"),
-                metadata_record.get("file_extension"),
-                metadata_record.get("mime_type"),
-                metadata_record.get("file_hash_sha256"),
-                metadata_record.get("file_hash_md5"),
-                metadata_record.get("session_id"),
-                metadata_record.get("user_agent"),
-                metadata_record.get("client_ip"),
-                metadata_record.get("upload_count"),
-                metadata_record.get("session_start_time"),
-                metadata_record.get("api_processing_time"),
-                metadata_record.get("fields_extracted_count"),
-                metadata_record.get("extraction_confidence"),
-                metadata_record.get("processing_method"),
-                metadata_record.get("pages_processed"),
-                metadata_record.get("document_type"),
-                metadata_record.get("auto_routed_to"),
-                metadata_record.get("routing_confidence"),
-                metadata_record.get("policy_found"),
-                metadata_record.get("claim_found"),
-                metadata_record.get("requires_manual_review"),
-                metadata_record.get("policy_number"),
-                metadata_record.get("claim_number"),
-                metadata_record.get("customer_id"),
-                metadata_record.get("validation_errors"),
-                metadata_record.get("memory_used_percent"),
-                metadata_record.get("cpu_usage_percent"),
-                metadata_record.get("disk_used_percent"),
-                metadata_record.get("environment"),
-                metadata_record.get("application_version"),
-                metadata_record.get("blob_url"),
-                metadata_record.get("container_name"),
-                metadata_record.get("azure_region"),
-                metadata_record.get("full_metadata_json")
-            ))
-            
-            conn.commit()
-            cursor.close()
-            conn.close()
+            with db_connection() as conn, conn.cursor() as cursor:
+                insert_query = """
+                INSERT INTO DocumentMetadata (
+                    metadata_id, document_guid, created_timestamp,
+                    file_original_name, file_size_bytes, file_size_mb, file_extension, mime_type,
+                    file_hash_sha256, file_hash_md5, session_id, user_agent, client_ip,
+                    upload_count, session_start_time, api_processing_time, fields_extracted_count,
+                    extraction_confidence, processing_method, pages_processed, document_type,
+                    auto_routed_to, routing_confidence, policy_found, claim_found,
+                    requires_manual_review, policy_number, claim_number, customer_id,
+                    validation_errors, memory_used_percent, cpu_usage_percent, disk_used_percent,
+                    environment, application_version, blob_url, container_name, azure_region,
+                    full_metadata_json
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """
+
+                cursor.execute(insert_query, (
+                    metadata_record.get("metadata_id"),
+                    metadata_record.get("document_guid"),
+                    metadata_record.get("created_timestamp"),
+                    metadata_record.get("file_original_name"),
+                    metadata_record.get("file_size_bytes"),
+                    metadata_record.get("file_size_mb"),
+                    metadata_record.get("file_extension"),
+                    metadata_record.get("mime_type"),
+                    metadata_record.get("file_hash_sha256"),
+                    metadata_record.get("file_hash_md5"),
+                    metadata_record.get("session_id"),
+                    metadata_record.get("user_agent"),
+                    metadata_record.get("client_ip"),
+                    metadata_record.get("upload_count"),
+                    metadata_record.get("session_start_time"),
+                    metadata_record.get("api_processing_time"),
+                    metadata_record.get("fields_extracted_count"),
+                    metadata_record.get("extraction_confidence"),
+                    metadata_record.get("processing_method"),
+                    metadata_record.get("pages_processed"),
+                    metadata_record.get("document_type"),
+                    metadata_record.get("auto_routed_to"),
+                    metadata_record.get("routing_confidence"),
+                    metadata_record.get("policy_found"),
+                    metadata_record.get("claim_found"),
+                    metadata_record.get("requires_manual_review"),
+                    metadata_record.get("policy_number"),
+                    metadata_record.get("claim_number"),
+                    metadata_record.get("customer_id"),
+                    metadata_record.get("validation_errors"),
+                    metadata_record.get("memory_used_percent"),
+                    metadata_record.get("cpu_usage_percent"),
+                    metadata_record.get("disk_used_percent"),
+                    metadata_record.get("environment"),
+                    metadata_record.get("application_version"),
+                    metadata_record.get("blob_url"),
+                    metadata_record.get("container_name"),
+                    metadata_record.get("azure_region"),
+                    metadata_record.get("full_metadata_json")
+                ))
+
+                conn.commit()
             
             return True
             
@@ -1,7 +1,7 @@
 import os
 import dotenv
 import streamlit as st
-from db_utils import fetch_data, insert_ml_prediction_metadata
+from db_utils import QUERY_CACHE_TTL, fetch, fetch_data, fetch_latest_policy, insert_ml_prediction_metadata
 from datetime import datetime, date
 import time
 from pathlib import Path
@@ -259,15 +259,8 @@ def get_policy_uid_from_session():
             policy_no = defaults.get("POLICY_NO")
             if policy_no:
                 # This would be for existing policies
-                from db_utils import fetch_data
-                query = f"""
-                SELECT TOP 1 Unique_ID 
-                FROM New_Policy 
-                WHERE POLICY_NO = '{policy_no}'
-                ORDER BY Submission_Date DESC
-                """
-                result = fetch_data(query)
-                if result and len(result) > 0:
+                result = fetch_latest_policy(policy_no)
+                if result:
                     return result[0].get("Unique_ID")
         
         # Try to get from session state keys for new policies
@@ -575,7 +568,7 @@ def policy_manual_form(defaults=None):
 
     try:
         broker_query = "SELECT Broker_ID, Broker_Name, Commission FROM Broker"
-        broker_data = fetch_data(broker_query)
+        broker_data = fetch_data(broker_query, ttl=QUERY_CACHE_TTL)
         broker_names = ["Select Broker"] + [row["Broker_Name"] for row in broker_data] if broker_data else ["No Brokers Found"]
     except Exception as e:
         st.error(f"Failed to fetch broker data: {e}")
@@ -584,7 +577,7 @@ def policy_manual_form(defaults=None):
     
     try:
         insurer_query = "SELECT Facility_ID, Facility_Name, Group_Size, Insurer_ID, Insurer_Name, Participation FROM insurer"
-        insurer_data = fetch_data(insurer_query)
+        insurer_data = fetch_data(insurer_query, ttl=QUERY_CACHE_TTL)
         # Get unique facility names only
         unique_facilities = list(set([row["Facility_Name"] for row in insurer_data])) if insurer_data else []
         facility_names = ["Select Carrier"] + sorted(unique_facilities) if unique_facilities else ["No Carriers Found"]
@@ -659,8 +652,8 @@ def policy_manual_form(defaults=None):
     if policy_no.strip():
         try:            
             # Check if policy exists
-            check_query = f"SELECT COUNT(*) as count FROM New_Policy WHERE POLICY_NO = '{policy_no.strip()}'"
-            result = fetch_data(check_query)
+            check_query = "SELECT COUNT(*) as count FROM New_Policy WHERE POLICY_NO = %s"
+            result = fetch(check_query, (policy_no.strip(),))
             
             if result and result[0]['count'] > 0:
                 st.error("❌ This policy number already exists in the database!")
@@ -0,0 +1,460 @@
+import os
+import re
+import time
+import uuid
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+import dotenv
+import numpy as np
+import pandas as pd
+
+from db_utils import QUERY_CACHE_TTL, fetch_data, fetch_latest_versions, insert_policies, log_performance
+from policy_forms import _build_unique_id
+
+dotenv.load_dotenv(Path(__file__).parent.parent / ".env")
+
+POLICY_IMPORT_CHUNK_SIZE = int(os.getenv("POLICY_IMPORT_CHUNK_SIZE", "5000"))
+
+TRANSACTION_TYPES = ("New Business", "MTA", "Renewal")
+
+# The manual policy form's fields, in the order they are written to New_Policy
+POLICY_COLUMNS = (
+    "CUST_ID", "EXECUTIVE", "Broker_ID", "Broker_Name", "Facility_ID", "Facility_Name",
+    "BODY", "MAKE", "MODEL", "USE_OF_VEHICLE", "MODEL_YEAR", "CHASSIS_NO", "REGN",
+    "POLICY_NO", "POL_EFF_DATE", "POL_EXPIRY_DATE", "SUM_INSURED", "POL_ISSUE_DATE",
+    "PREMIUM2", "DRV_DOB", "DRV_DLI", "VEH_SEATS", "PRODUCT", "POLICYTYPE", "NATIONALITY",
+)
+INSERT_COLUMNS = POLICY_COLUMNS + ("TransactionType", "Submission_Date", "Unique_ID")
+# Columns an import file may carry; Broker_ID and Facility_ID are looked up from the names
+FILE_COLUMNS = ("TransactionType",) + tuple(c for c in POLICY_COLUMNS if c not in ("Broker_ID", "Facility_ID"))
+ERROR_COLUMNS = ("Row", "POLICY_NO", "TransactionType", "Field", "Error")
+
+# Vectorized counterparts of the validate_* helpers in policy_forms; keep the two in step.
+# column -> (label, "int"/"float", min, max, required); MODEL_YEAR's max is the current year
+NUMERIC_RULES = {
+    "CUST_ID": ("Customer ID", "int", 1, 999999, True),
+    "SUM_INSURED": ("Sum Insured", "float", 0.01, 99999999.99, True),
+    "PREMIUM2": ("Premium", "int", 1, 9999999, True),
+    "VEH_SEATS": ("Vehicle Seats", "int", 1, 50, False),
+    "MODEL_YEAR": ("Model Year", "int", 1900, None, False),
+}
+# column -> (label, min length, max length, allowed characters or None)
+TEXT_RULES = {
+    "EXECUTIVE": ("Executive", 2, 100, "ABCDEFGHIJKLMNOPQRSTUVWXYZ abcdefghijklmnopqrstuvwxyz.-'"),
+    "CHASSIS_NO": ("Chassis Number", 10, 17, "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"),
+    "POLICY_NO": ("Policy Number", 5, 50, "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789/-_"),
+    "NATIONALITY": ("Nationality", 2, 50, None),
+}
+# column -> required; dates are read as YYYY-MM-DD (anything after the 10th character is ignored)
+DATE_COLUMNS = {
+    "POL_EFF_DATE": True,
+    "POL_EXPIRY_DATE": True,
+    "POL_ISSUE_DATE": True,
+    "DRV_DOB": False,
+    "DRV_DLI": False,
+}
+
+# Fields the MTA and Renewal forms show read-only: always taken from the current version
+LOCKED_COLUMNS = {
+    "MTA": {
+        "CUST_ID", "EXECUTIVE", "NATIONALITY", "CHASSIS_NO", "POLICY_NO", "POL_ISSUE_DATE",
+        "POL_EFF_DATE", "POL_EXPIRY_DATE", "Broker_ID", "Broker_Name", "Facility_ID", "Facility_Name",
+    },
+    "Renewal": {"CUST_ID", "CHASSIS_NO", "POLICY_NO", "Broker_ID", "Broker_Name", "Facility_ID", "Facility_Name"},
+}
+
+_BROKER_QUERY = "SELECT Broker_ID, Broker_Name, Commission FROM Broker"
+_INSURER_QUERY = "SELECT Facility_ID, Facility_Name, Group_Size, Insurer_ID, Insurer_Name, Participation FROM insurer"
+_HEADER_NAMES = {column.upper(): column for column in POLICY_COLUMNS + ("TransactionType",)}
+
+
+def _cell_text(value):
+    """Spreadsheet/database value as the text a user would have typed into the form"""
+    if value is None:
+        return ""
+    if isinstance(value, float):
+        if value != value:
+            return ""
+        if value.is_integer():
+            return str(int(value))
+    if isinstance(value, datetime):
+        return value.date().isoformat() if value.time() == datetime.min.time() else value.isoformat(sep=" ")
+    return str(value).strip()
+
+
+def _read_csv_chunks(source, chunk_size):
+    # Blank lines are kept (and dropped later) so row numbers match the file's line numbers
+    reader = pd.read_csv(
+        source, dtype=str, keep_default_na=False, chunksize=chunk_size, skip_blank_lines=False, encoding="utf-8-sig"
+    )
+    for chunk in reader:
+        yield chunk
+
+
+def _read_excel_chunks(source, chunk_size):
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(source, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [_cell_text(value) for value in next(rows, ())]
+        width = len(header)
+        batch = []
+        for values in rows:
+            values = [_cell_text(value) for value in values[:width]]
+            batch.append(values + [""] * (width - len(values)))
+            if len(batch) == chunk_size:
+                yield pd.DataFrame(batch, columns=header)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=header)
+    finally:
+        workbook.close()
+
+
+def read_policy_chunks(source, file_name, chunk_size=None):
+    """Stream a CSV or XLSX policy file as DataFrames of at most ``chunk_size`` rows.
+
+    Every cell is text (blank cells are ""), and each chunk's index is the
+    row's line/row number in the file, counting the header as row 1.
+    """
+    chunk_size = chunk_size or POLICY_IMPORT_CHUNK_SIZE
+    extension = Path(file_name).suffix.lower()
+    if extension == ".csv":
+        chunks = _read_csv_chunks(source, chunk_size)
+    elif extension in (".xlsx", ".xlsm"):
+        chunks = _read_excel_chunks(source, chunk_size)
+    else:
+        raise ValueError(f"Unsupported file type: {file_name} (expected .csv or .xlsx)")
+
+    next_row = 2
+    for chunk in chunks:
+        chunk.index = range(next_row, next_row + len(chunk))
+        next_row += len(chunk)
+        yield chunk
+
+
+def _normalize(chunk):
+    """Chunk with canonical column names, stripped text and fully blank rows dropped"""
+    chunk = chunk.rename(columns=lambda name: _HEADER_NAMES.get(str(name).strip().upper(), str(name).strip()))
+    chunk = chunk.loc[:, ~chunk.columns.duplicated()]
+    for column in POLICY_COLUMNS + ("TransactionType",):
+        chunk[column] = chunk[column].fillna("").astype(str).str.strip() if column in chunk else ""
+    chunk = chunk[list(POLICY_COLUMNS) + ["TransactionType"]]
+    chunk = chunk[(chunk != "").any(axis=1)].copy()
+    chunk["TransactionType"] = chunk["TransactionType"].replace("", "New Business")
+    return chunk
+
+
+def _flag(errors, mask, message):
+    """Set ``message`` where ``mask`` holds and the row has no earlier error for the field"""
+    return errors.mask(mask & (errors == ""), message)
+
+
+def check_numeric(values, label, data_type="int", min_val=None, max_val=None, required=True):
+    """Vectorized validate_numeric_input over a Series of stripped strings.
+
+    Returns ``(numbers, errors)``: the converted values (NaN where blank or
+    invalid) and each row's error message ("" when valid).
+    """
+    errors = pd.Series("", index=values.index, dtype=object)
+    blank = values == ""
+    if required:
+        errors = _flag(errors, blank, f"{label} is required")
+    digits = values.str.replace("-", "", regex=False).str.replace(".", "", regex=False).str.isdigit()
+    if data_type == "int":
+        errors = _flag(errors, ~blank & ~digits, f"{label} must contain only numbers")
+        parse_error = f"{label} must be a valid integer"
+    else:
+        bad = ~digits | (values.str.count(r"\.") > 1)
+        errors = _flag(errors, ~blank & bad, f"{label} must be a valid decimal number")
+        parse_error = f"{label} must be a valid decimal number"
+    numbers = pd.to_numeric(values.where(~blank & (errors == "")), errors="coerce")
+    # Passes the character check but still isn't a number, e.g. "1-2"
+    errors = _flag(errors, ~blank & numbers.isna(), parse_error)
+    if data_type == "int":
+        # int(float(value)) truncates towards zero
+        numbers = np.trunc(numbers)
+    if min_val is not None:
+        errors = _flag(errors, numbers < min_val, f"{label} must be at least {min_val}")
+    if max_val is not None:
+        errors = _flag(errors, numbers > max_val, f"{label} must not exceed {max_val}")
+    return numbers.where(errors == ""), errors
+
+
+def check_text(values, label, min_length=None, max_length=None, required=True, allowed_chars=None):
+    """Vectorized validate_text_input over a Series of stripped strings; returns each row's error ("" when valid)"""
+    errors = pd.Series("", index=values.index, dtype=object)
+    if required:
+        errors = _flag(errors, values == "", f"{label} is required")
+    lengths = values.str.len()
+    if min_length is not None:
+        errors = _flag(errors, lengths < min_length, f"{label} must be at least {min_length} characters long")
+    if max_length is not None:
+        errors = _flag(errors, lengths > max_length, f"{label} must not exceed {max_length} characters")
+    if allowed_chars is not None:
+        invalid = values.str.extract(f"([^{re.escape(allowed_chars)}])", expand=False)
+        errors = _flag(errors, invalid.notna(), f"{label} contains invalid character: '" + invalid.fillna("") + "'")
+    return errors
+
+
+def check_date(values, label, required=True):
+    """``(dates, errors)`` for a Series of YYYY-MM-DD strings; dates are NaT where blank or invalid"""
+    errors = pd.Series("", index=values.index, dtype=object)
+    blank = values == ""
+    if required:
+        errors = _flag(errors, blank, f"{label} is required")
+    dates = pd.to_datetime(values.str[:10].where(~blank), format="%Y-%m-%d", errors="coerce")
+    errors = _flag(errors, ~blank & dates.isna(), f"{label} must be a date (YYYY-MM-DD)")
+    return dates, errors
+
+
+def _as_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, str):
+        try:
+            return date.fromisoformat(value[:10])
+        except ValueError:
+            return None
+    return value
+
+
+def _add_year(day):
+    try:
+        return day.replace(year=day.year + 1)
+    except ValueError:  # 29 February
+        return day.replace(year=day.year + 1, day=28)
+
+
+def _renewal_dates(current, today):
+    """(issue, effective, expiry) for renewing ``current``, as policy_renewal_form computes them"""
+    effective, expiry = _as_date(current.get("POL_EFF_DATE")), _as_date(current.get("POL_EXPIRY_DATE"))
+    if effective and expiry and expiry > today:
+        return today, _add_year(effective), _add_year(expiry)
+    return today, today, _add_year(today)
+
+
+def _apply_current_versions(chunk, current, today):
+    """Fill MTA/Renewal rows from the policy's current version.
+
+    Read-only fields (LOCKED_COLUMNS) always come from the current version
+    and blank cells keep the current value, so a file only needs the policy
+    number plus the fields that change. Renewal dates are rolled forward as
+    the renewal form does.
+    """
+    amend = chunk["TransactionType"].isin(LOCKED_COLUMNS) & chunk["POLICY_NO"].isin(current)
+    if not amend.any():
+        return chunk
+    base = pd.DataFrame.from_dict(
+        {number: {column: _cell_text(row.get(column)) for column in POLICY_COLUMNS} for number, row in current.items()},
+        orient="index",
+    )
+    base = base.reindex(chunk["POLICY_NO"]).set_axis(chunk.index)
+    for column in POLICY_COLUMNS:
+        locked = pd.Series(False, index=chunk.index)
+        for transaction_type, columns in LOCKED_COLUMNS.items():
+            if column in columns:
+                locked |= chunk["TransactionType"] == transaction_type
+        chunk[column] = chunk[column].mask(amend & (locked | (chunk[column] == "")), base[column])
+
+    renewals = chunk.index[amend & (chunk["TransactionType"] == "Renewal")]
+    for row_number in renewals:
+        issue, effective, expiry = _renewal_dates(current[chunk.at[row_number, "POLICY_NO"]], today)
+        chunk.loc[row_number, ["POL_ISSUE_DATE", "POL_EFF_DATE", "POL_EXPIRY_DATE"]] = (
+            issue.isoformat(), effective.isoformat(), expiry.isoformat()
+        )
+    return chunk
+
+
+def _reference_ids():
+    """Broker and facility name -> ID maps, from the same cached lookups the manual form uses"""
+    brokers = {row["Broker_Name"]: row["Broker_ID"] for row in fetch_data(_BROKER_QUERY, ttl=QUERY_CACHE_TTL)}
+    facilities = {}
+    for row in fetch_data(_INSURER_QUERY, ttl=QUERY_CACHE_TTL):
+        facilities.setdefault(row["Facility_Name"], row["Facility_ID"])
+    return brokers, facilities
+
+
+def validate_policy_chunk(chunk, seen_new_business, today=None):
+    """Validate a normalized chunk; returns ``(typed, errors)``.
+
+    ``typed`` holds the rows that passed, with New_Policy-ready values, and
+    ``errors`` one row per problem (see ERROR_COLUMNS). Policy numbers of
+    accepted New Business rows are added to ``seen_new_business`` so later
+    chunks reject repeats.
+    """
+    today = today or date.today()
+    field_errors = {}
+
+    ttype = chunk["TransactionType"]
+    field_errors["TransactionType"] = pd.Series("", index=chunk.index, dtype=object).mask(
+        ~ttype.isin(TRANSACTION_TYPES), "TransactionType must be one of: " + ", ".join(TRANSACTION_TYPES)
+    )
+
+    # One round trip for every policy number in the chunk; bypass the cache, as for the form's duplicate check
+    current = fetch_latest_versions("policy", chunk["POLICY_NO"].unique().tolist(), use_cache=False)
+    new_business = ttype == "New Business"
+    amend = ttype.isin(LOCKED_COLUMNS)
+    exists = chunk["POLICY_NO"].isin(current)
+    cancelled = chunk["POLICY_NO"].map(lambda number: current.get(number, {}).get("isCancelled") == 1)
+    lapsed = chunk["POLICY_NO"].map(lambda number: current.get(number, {}).get("isLapsed") == 1)
+    policy_errors = pd.Series("", index=chunk.index, dtype=object)
+    policy_errors = _flag(policy_errors, new_business & exists, "This policy number already exists in the database")
+    policy_errors = _flag(
+        policy_errors,
+        new_business & (chunk["POLICY_NO"].isin(seen_new_business) | chunk["POLICY_NO"].where(new_business).duplicated()),
+        "Policy number appears more than once as New Business in this file",
+    )
+    policy_errors = _flag(policy_errors, amend & ~exists & (chunk["POLICY_NO"] != ""), "No policy found with that number")
+    policy_errors = _flag(policy_errors, amend & cancelled, "Policy is already cancelled")
+    policy_errors = _flag(policy_errors, amend & lapsed, "Policy is already lapsed")
+
+    chunk = _apply_current_versions(chunk, current, today)
+
+    typed = pd.DataFrame(index=chunk.index)
+    for column, (label, data_type, min_val, max_val, required) in NUMERIC_RULES.items():
+        if column == "MODEL_YEAR":
+            max_val = today.year
+        typed[column], field_errors[column] = check_numeric(chunk[column], label, data_type, min_val, max_val, required)
+    for column, (label, min_length, max_length, allowed_chars) in TEXT_RULES.items():
+        field_errors[column] = check_text(chunk[column], label, min_length, max_length, True, allowed_chars)
+    for column, required in DATE_COLUMNS.items():
+        typed[column], field_errors[column] = check_date(chunk[column], column, required)
+    field_errors["POLICY_NO"] = field_errors["POLICY_NO"].mask(field_errors["POLICY_NO"] == "", policy_errors)
+
+    # Brokers and carriers are picked by name, as in the form's dropdowns; amendments keep the current IDs
+    brokers, facilities = _reference_ids()
+    for column, id_column, lookup, label in (
+        ("Broker_Name", "Broker_ID", brokers, "broker"),
+        ("Facility_Name", "Facility_ID", facilities, "carrier"),
+    ):
+        ids = pd.Series([lookup.get(name) for name in chunk[column]], index=chunk.index, dtype=object)
+        errors = pd.Series("", index=chunk.index, dtype=object)
+        errors = _flag(errors, chunk[column] == "", f"{column} is required")
+        errors = _flag(errors, new_business & ids.isna(), f"Unknown {label}: " + chunk[column])
+        field_errors[column] = errors
+        typed[id_column] = ids.where(ids.notna(), chunk[id_column])
+
+    errors = pd.DataFrame(field_errors)
+    # An amendment without a usable current version has nothing to fill from; report just that
+    unresolved = amend & (policy_errors != "")
+    errors.loc[unresolved, errors.columns != "POLICY_NO"] = ""
+    errors.loc[unresolved, "POLICY_NO"] = policy_errors[unresolved]
+    failed = (errors != "").any(axis=1)
+    report = [
+        (row_number, chunk.at[row_number, "POLICY_NO"], chunk.at[row_number, "TransactionType"], field, message)
+        for row_number, row_errors in errors[failed].iterrows()
+        for field, message in row_errors.items()
+        if message
+    ]
+    report = pd.DataFrame(report, columns=list(ERROR_COLUMNS))
+
+    accepted = chunk[~failed]
+    typed = typed[~failed]
+    for column in POLICY_COLUMNS:
+        if column not in typed:
+            typed[column] = accepted[column]
+    typed["TransactionType"] = accepted["TransactionType"]
+    seen_new_business.update(accepted.loc[accepted["TransactionType"] == "New Business", "POLICY_NO"])
+    return typed, report
+
+
+def _insert_rows(typed, submission_start):
+    """New_Policy value tuples for ``typed``, stamped from ``submission_start`` one millisecond apart"""
+    columns = {}
+    for column in POLICY_COLUMNS + ("TransactionType",):
+        series = typed[column]
+        if column in NUMERIC_RULES:
+            cast = int if NUMERIC_RULES[column][1] == "int" else float
+            columns[column] = [None if pd.isna(value) else cast(value) for value in series]
+        elif column in DATE_COLUMNS:
+            columns[column] = [None if pd.isna(value) else value.date() for value in series]
+        else:
+            columns[column] = [None if pd.isna(value) else getattr(value, "item", lambda: value)()
+                               for value in series.astype(object)]
+    # Distinct timestamps keep Unique_IDs unique when a file carries several versions of one policy
+    submitted = [submission_start + timedelta(milliseconds=offset) for offset in range(len(typed))]
+    columns["Submission_Date"] = submitted
+    columns["Unique_ID"] = [
+        _build_unique_id(policy_no, submission_dt) for policy_no, submission_dt in zip(columns["POLICY_NO"], submitted)
+    ]
+    return list(zip(*(columns[column] for column in INSERT_COLUMNS)))
+
+
+def import_policies(source, file_name, chunk_size=None, dry_run=False, on_progress=None):
+    """Import a CSV/XLSX of New Business, MTA and Renewal rows into New_Policy.
+
+    The file is read ``chunk_size`` (POLICY_IMPORT_CHUNK_SIZE) rows at a
+    time. Each chunk is validated with the manual form's rules, and its
+    valid rows are inserted in one transaction; invalid rows are skipped and
+    reported. Columns are named as in New_Policy; TransactionType defaults
+    to New Business, and MTA/Renewal rows only need the fields that change.
+    With ``dry_run`` nothing is written. ``on_progress(rows_read, inserted,
+    rejected)`` is called after each chunk.
+
+    Returns a summary dict; its "errors" entry is a DataFrame with one row
+    per problem (file row number, policy number, field, message).
+    """
+    start_time = time.time()
+    correlation_id = str(uuid.uuid4())
+    seen_new_business = set()
+    reports = []
+    rows_read = valid = inserted = chunks = 0
+    by_type = dict.fromkeys(TRANSACTION_TYPES, 0)
+    next_submission = datetime.now()
+
+    for raw in read_policy_chunks(source, file_name, chunk_size):
+        chunks += 1
+        if chunks == 1 and "POLICY_NO" not in {_HEADER_NAMES.get(str(name).strip().upper()) for name in raw.columns}:
+            raise ValueError(f"{file_name} has no POLICY_NO column")
+        chunk = _normalize(raw)
+        rows_read += len(chunk)
+        typed, report = validate_policy_chunk(chunk, seen_new_business)
+        valid += len(typed)
+
+        if len(typed) and not dry_run:
+            next_submission = max(next_submission, datetime.now())
+            rows = _insert_rows(typed, next_submission)
+            next_submission += timedelta(milliseconds=len(rows))
+            try:
+                inserted += insert_policies(INSERT_COLUMNS, rows, correlation_id=correlation_id,
+                                            transaction_type="Bulk Import")
+            except Exception as e:
+                # The chunk's transaction rolled back, so none of its rows went in
+                seen_new_business.difference_update(typed["POLICY_NO"])
+                report = pd.concat([report, pd.DataFrame({
+                    "Row": typed.index,
+                    "POLICY_NO": typed["POLICY_NO"].to_numpy(),
+                    "TransactionType": typed["TransactionType"].to_numpy(),
+                    "Field": "",
+                    "Error": f"Not inserted, the chunk failed: {e}",
+                }, columns=list(ERROR_COLUMNS))])
+                typed = typed.iloc[0:0]
+        for transaction_type, count in typed["TransactionType"].value_counts().items():
+            by_type[transaction_type] += int(count)
+        reports.append(report)
+        if on_progress:
+            on_progress(rows_read, valid if dry_run else inserted, rows_read - (valid if dry_run else inserted))
+
+    errors = pd.concat(reports, ignore_index=True) if reports else pd.DataFrame(columns=list(ERROR_COLUMNS))
+    seconds = time.time() - start_time
+    summary = {
+        "file": file_name,
+        "dry_run": dry_run,
+        "rows": rows_read,
+        "valid": valid,
+        "inserted": inserted,
+        "rejected": int(errors["Row"].nunique()) if len(errors) else 0,
+        "by_type": by_type,
+        "chunks": chunks,
+        "seconds": round(seconds, 3),
+        "rows_per_minute": round(rows_read * 60 / seconds) if seconds else rows_read,
+    }
+    log_performance(
+        "POLICY_IMPORT", int(seconds * 1000), table_name="New_Policy", rows_affected=inserted,
+        correlation_id=correlation_id, additional_data=summary,
+    )
+    summary["errors"] = errors
+    return summary
@@ -1,14 +1,108 @@
-from db_utils import execute_query
-
-def update_policy_lapsed_status():
-    sql = """
-    UPDATE dbo.Policy
-    SET isLapsed = 
-        CASE 
-            WHEN CAST(GETDATE() AS DATE) < POL_EFF_DATE 
-              OR CAST(GETDATE() AS DATE) > POL_EXPIRY_DATE 
-            THEN 1
-            ELSE 0
-        END;
+import os
+import time
+from pathlib import Path
+
+import dotenv
+
+from db_utils import db_connection, fetch_one, invalidate_cached_queries, log_error, log_performance
+
+dotenv.load_dotenv(Path(__file__).parent.parent / ".env")
+
+LAPSE_JOB_NAME = "policy_lapse_refresh"
+# Kept under SQL Server's 5000-lock escalation threshold so a batch never locks the table
+LAPSE_BATCH_SIZE = int(os.getenv("LAPSE_BATCH_SIZE", "4000"))
+
+_LAPSED = "CASE WHEN %s < POL_EFF_DATE OR %s > POL_EXPIRY_DATE THEN 1 ELSE 0 END"
+
+
+def _update_in_batches(condition, params, today, batch_size):
+    """Set isLapsed for rows matching ``condition`` whose flag is wrong, ``batch_size`` rows per transaction"""
+    sql = f"""
+    UPDATE TOP (%s) dbo.Policy
+    SET isLapsed = {_LAPSED}
+    WHERE ({condition})
+      AND (isLapsed IS NULL OR isLapsed <> {_LAPSED})
     """
-    execute_query(sql)
\ No newline at end of file
+    rows_touched, batches = 0, 0
+    while True:
+        with db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute(sql, (batch_size, today, today, *params, today, today))
+            updated = cursor.rowcount
+            conn.commit()
+        rows_touched += updated
+        batches += 1
+        # Updated rows no longer match, so a short batch means nothing is left
+        if updated < batch_size:
+            return rows_touched, batches
+
+
+def _get_last_run_date():
+    row = fetch_one("SELECT Last_Run_Date FROM Scheduled_Job_State WHERE Job_Name = %s", (LAPSE_JOB_NAME,))
+    return row["Last_Run_Date"] if row else None
+
+
+def _save_run(run_date, rows_touched, duration_ms):
+    with db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(
+            """
+            MERGE Scheduled_Job_State AS j
+            USING (SELECT %s AS Job_Name) AS s ON j.Job_Name = s.Job_Name
+            WHEN MATCHED THEN UPDATE SET
+                Last_Run_Date = %s, Last_Run_At = SYSUTCDATETIME(),
+                Last_Rows_Touched = %s, Last_Duration_MS = %s
+            WHEN NOT MATCHED THEN INSERT (Job_Name, Last_Run_Date, Last_Run_At, Last_Rows_Touched, Last_Duration_MS)
+                VALUES (%s, %s, SYSUTCDATETIME(), %s, %s);
+            """,
+            (LAPSE_JOB_NAME, run_date, rows_touched, duration_ms,
+             LAPSE_JOB_NAME, run_date, rows_touched, duration_ms),
+        )
+        conn.commit()
+
+
+def update_policy_lapsed_status(full=False, batch_size=None):
+    """Bring dbo.Policy.isLapsed up to date for today; returns run metrics.
+
+    A policy is lapsed before POL_EFF_DATE and after POL_EXPIRY_DATE. Since
+    the last run's date, a flag can only have changed where one of those
+    boundaries was crossed, so only those rows (plus rows never flagged) are
+    examined, and only rows whose flag is actually wrong are written. The
+    first run, or ``full=True``, reconciles the whole table. Updates run in
+    batches of ``batch_size`` (LAPSE_BATCH_SIZE) rows, each its own
+    transaction.
+    """
+    batch_size = batch_size or LAPSE_BATCH_SIZE
+    start_time = time.time()
+    try:
+        today = fetch_one("SELECT CAST(GETDATE() AS date) AS Today")["Today"]
+        last_run = None if full else _get_last_run_date()
+        if last_run is None:
+            condition, params = "1 = 1", ()
+        else:
+            # Became effective since the last run, expired since the last run, or never flagged
+            condition = (
+                "(POL_EFF_DATE > %s AND POL_EFF_DATE <= %s)"
+                " OR (POL_EXPIRY_DATE >= %s AND POL_EXPIRY_DATE < %s)"
+                " OR isLapsed IS NULL"
+            )
+            params = (last_run, today, last_run, today)
+
+        rows_touched, batches = _update_in_batches(condition, params, today, batch_size)
+        duration_ms = int((time.time() - start_time) * 1000)
+        _save_run(today, rows_touched, duration_ms)
+    except Exception as e:
+        log_error(e, "Database", "update_policy_lapsed_status")
+        raise
+
+    if rows_touched:
+        invalidate_cached_queries("Policy")
+    metrics = {
+        "mode": "full" if last_run is None else "incremental",
+        "since": str(last_run) if last_run else None,
+        "run_date": str(today),
+        "rows_touched": rows_touched,
+        "batches": batches,
+        "batch_size": batch_size,
+        "duration_ms": duration_ms,
+    }
+    log_performance("POLICY_LAPSE_REFRESH", duration_ms, rows_affected=rows_touched, additional_data=metrics)
+    return metrics
@@ -0,0 +1,176 @@
+import os
+import pickle
+import re
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Optional
+
+import dotenv
+
+dotenv.load_dotenv(Path(__file__).parent.parent / ".env")
+
+_WHITESPACE = re.compile(r"\s+")
+_TABLE_REFERENCE = re.compile(r"\b(?:FROM|JOIN|INTO|UPDATE)\s+([\w\.\[\]]+)", re.IGNORECASE)
+
+
+def normalize_sql(sql: str) -> str:
+    return _WHITESPACE.sub(" ", sql).strip()
+
+
+def table_tag(name: str) -> str:
+    """Tag for a table name, ignoring schema prefix, brackets and case"""
+    return name.replace("[", "").replace("]", "").split(".")[-1].lower()
+
+
+def tables_in(sql: str):
+    """Tags of the tables a statement reads or writes (FROM/JOIN/INTO/UPDATE targets)"""
+    return {table_tag(name) for name in _TABLE_REFERENCE.findall(sql)}
+
+
+class QueryCache:
+    """Read-through cache of query results keyed by normalized SQL and params.
+
+    Each entry has its own TTL and a set of tags (by default the tables the
+    query reads), so a write can drop every cached result that depends on a
+    table. Total size, measured as the pickled size of the results, is kept
+    under ``max_bytes`` by evicting the least recently used entries.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max(0, max_bytes)
+        self._entries = OrderedDict()  # key -> (expires_at, size, tags, value)
+        self._bytes = 0
+        self._generation = 0  # bumped by every invalidation
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    @staticmethod
+    def make_key(sql: str, params=None):
+        return normalize_sql(sql), repr(params)
+
+    def get_or_load(self, sql: str, params, loader: Callable[[], Any], ttl: float,
+                    tags: Optional[Iterable[str]] = None) -> Any:
+        """Cached result for (sql, params), calling ``loader()`` on a miss or after ``ttl`` seconds"""
+        key = self.make_key(sql, params)
+        with self._lock:
+            hit, value = self._lookup(key, time.time())
+            if hit:
+                return value
+            generation = self._generation
+
+        value = loader()
+        self._store(key, value, ttl, self._tags(sql, tags), generation)
+        return value
+
+    def get_many_or_load(self, sql: str, keys: Iterable, loader: Callable[[list], Dict], ttl: float,
+                         tags: Optional[Iterable[str]] = None) -> Dict:
+        """Cached results for each of ``keys`` under one statement.
+
+        The keys that miss are loaded together with a single ``loader(missing)``
+        call, which returns ``{key: value}``; keys it leaves out are cached as
+        None so repeated lookups of absent rows stay cheap too.
+        """
+        results, missing = {}, []
+        with self._lock:
+            now = time.time()
+            for item in keys:
+                hit, value = self._lookup(self.make_key(sql, item), now)
+                if hit:
+                    results[item] = value
+                else:
+                    missing.append(item)
+            generation = self._generation
+        if not missing:
+            return results
+
+        loaded = loader(missing)
+        tags = self._tags(sql, tags)
+        for item in missing:
+            results[item] = loaded.get(item)
+            self._store(self.make_key(sql, item), results[item], ttl, tags, generation)
+        return results
+
+    def invalidate(self, *tags: str) -> int:
+        """Drop every entry carrying any of ``tags``; returns how many were dropped"""
+        tags = {table_tag(t) for t in tags}
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if entry[2] & tags]
+            for key in stale:
+                self._drop(key)
+            self._generation += 1
+            self._stats["invalidations"] += len(stale)
+        return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._generation += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["entries"] = len(self._entries)
+            snapshot["bytes"] = self._bytes
+        lookups = snapshot["hits"] + snapshot["misses"]
+        snapshot["hit_rate"] = round(snapshot["hits"] / lookups, 4) if lookups else 0.0
+        return snapshot
+
+    def _lookup(self, key, now):
+        """(hit, value) for a live entry; caller holds the lock"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > now:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return True, entry[3]
+            self._drop(key)
+            self._stats["expirations"] += 1
+        self._stats["misses"] += 1
+        return False, None
+
+    def _store(self, key, value, ttl, tags, generation):
+        try:
+            size = len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        except Exception:
+            return  # not cacheable
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if self._generation != generation:
+                return  # a write landed while loading; this result may already be stale
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.time() + ttl, size, tags, value)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self._stats["evictions"] += 1
+
+    @staticmethod
+    def _tags(sql, tags):
+        return frozenset(table_tag(t) for t in tags) if tags is not None else frozenset(tables_in(sql))
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+
+_query_cache = None
+_query_cache_lock = threading.Lock()
+
+
+def get_query_cache() -> QueryCache:
+    """Return the process-wide query cache, creating it on first use"""
+    global _query_cache
+    if _query_cache is None:
+        with _query_cache_lock:
+            if _query_cache is None:
+                _query_cache = QueryCache(
+                    max_bytes=int(float(os.getenv("QUERY_CACHE_MAX_MB", "64")) * 1024 * 1024),
+                )
+    return _query_cache
@@ -0,0 +1,243 @@
+import os
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import dotenv
+
+from db_utils import (
+    QUERY_CACHE_TTL, db_connection, fetch, fetch_one, invalidate_cached_queries, log_error, log_performance
+)
+
+dotenv.load_dotenv(Path(__file__).parent.parent / ".env")
+
+ROLLUP_LATE_DAYS = int(os.getenv("ROLLUP_LATE_DAYS", "1"))
+ROLLUP_CHUNK_DAYS = int(os.getenv("ROLLUP_CHUNK_DAYS", "31"))
+
+_AMOUNT = "SUM(TRY_CONVERT(decimal(19, 2), {}))"
+
+# Daily summary tables: one row per (day, dimensions) with additive measures, so
+# dashboards read summary rows instead of scanning New_Policy/New_Claims.
+# Days are always rebuilt whole (delete, then re-aggregate from the base table),
+# which makes refreshes and backfills idempotent.
+# name -> source table, rollup table, dimension columns, {measure column: aggregate over the source}
+ROLLUPS = {
+    "policy": {
+        "source": "New_Policy",
+        "table": "Policy_Daily_Rollup",
+        "dimensions": ("PRODUCT", "POLICYTYPE", "Broker_Name", "Facility_Name", "EXECUTIVE", "TransactionType"),
+        "measures": {
+            "Policy_Count": "COUNT(*)",
+            "Premium_Sum": _AMOUNT.format("PREMIUM2"),
+            "Sum_Insured": _AMOUNT.format("SUM_INSURED"),
+        },
+    },
+    "claims": {
+        "source": "New_Claims",
+        "table": "Claims_Daily_Rollup",
+        "dimensions": ("PRODUCT", "POLICYTYPE", "Broker_Name", "Facility_Name", "EXECUTIVE", "CLAIM_STAGE"),
+        "measures": {
+            "Claim_Count": "COUNT(*)",
+            "Sum_Insured": _AMOUNT.format("SUM_INSURED"),
+            "Intimated_Amount": _AMOUNT.format("INTIMATED_AMOUNT"),
+            "Settled_Amount": _AMOUNT.format("FINAL_SETTLEMENT_AMOUNT"),
+        },
+    },
+}
+
+ROLLUP_PERIODS = {
+    "Day": "Rollup_Date",
+    "Month": "DATEFROMPARTS(YEAR(Rollup_Date), MONTH(Rollup_Date), 1)",
+    "Year": "DATEFROMPARTS(YEAR(Rollup_Date), 1, 1)",
+}
+
+
+def _as_date(value):
+    return value.date() if isinstance(value, datetime) else value
+
+
+def _rebuild_days(cursor, rollup, start, end):
+    """Replace the rollup rows for days in [start, end) with a fresh aggregate of the base table"""
+    dimensions = ", ".join(rollup["dimensions"])
+    measures = ", ".join(rollup["measures"])
+    aggregates = ", ".join(rollup["measures"].values())
+    cursor.execute(
+        f"DELETE FROM {rollup['table']} WHERE Rollup_Date >= %s AND Rollup_Date < %s", (start, end)
+    )
+    cursor.execute(
+        f"""
+        INSERT INTO {rollup['table']} (Rollup_Date, {dimensions}, {measures}, Refreshed_At)
+        SELECT CAST(Submission_Date AS date), {dimensions}, {aggregates}, SYSUTCDATETIME()
+        FROM {rollup['source']}
+        WHERE Submission_Date >= %s AND Submission_Date < %s
+        GROUP BY CAST(Submission_Date AS date), {dimensions}
+        """,
+        (start, end),
+    )
+    return cursor.rowcount
+
+
+def backfill_rollup(name, start, end, on_progress=None):
+    """Rebuild rollup ``name`` for the days ``start`` up to and including ``end``.
+
+    Works in ROLLUP_CHUNK_DAYS slices, each committed on its own, so a long
+    backfill can be stopped and re-run. Returns the number of rollup rows
+    written.
+    """
+    rollup = ROLLUPS[name]
+    start, end = _as_date(start), _as_date(end) + timedelta(days=1)
+    written = 0
+    chunk_start = start
+    while chunk_start < end:
+        chunk_end = min(chunk_start + timedelta(days=max(1, ROLLUP_CHUNK_DAYS)), end)
+        with db_connection() as conn, conn.cursor() as cursor:
+            written += _rebuild_days(cursor, rollup, chunk_start, chunk_end)
+            conn.commit()
+        if on_progress:
+            on_progress(name, chunk_start, chunk_end - timedelta(days=1), written)
+        chunk_start = chunk_end
+    invalidate_cached_queries(rollup["table"])
+    return written
+
+
+def get_watermark(name):
+    """Latest Submission_Date already folded into rollup ``name``, or None"""
+    row = fetch_one(
+        "SELECT Last_Submission_Date FROM Rollup_Watermark WHERE Rollup_Name = %s", (name,)
+    )
+    return row["Last_Submission_Date"] if row else None
+
+
+def _set_watermark(name, last_submission_date, rows_written):
+    with db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(
+            """
+            MERGE Rollup_Watermark AS w
+            USING (SELECT %s AS Rollup_Name) AS s ON w.Rollup_Name = s.Rollup_Name
+            WHEN MATCHED THEN UPDATE SET
+                Last_Submission_Date = %s, Last_Refreshed_At = SYSUTCDATETIME(), Last_Rows_Written = %s
+            WHEN NOT MATCHED THEN INSERT (Rollup_Name, Last_Submission_Date, Last_Refreshed_At, Last_Rows_Written)
+                VALUES (%s, %s, SYSUTCDATETIME(), %s);
+            """,
+            (name, last_submission_date, rows_written, name, last_submission_date, rows_written),
+        )
+        conn.commit()
+
+
+def refresh_rollup(name, late_days=None):
+    """Bring rollup ``name`` up to date from its watermark; returns a summary dict.
+
+    Rebuilds from the watermark's day minus ``late_days`` (default
+    ROLLUP_LATE_DAYS) through the newest submission, then moves the
+    watermark. With no watermark yet this is a full backfill.
+    """
+    rollup = ROLLUPS[name]
+    late_days = ROLLUP_LATE_DAYS if late_days is None else late_days
+    start_time = time.time()
+    try:
+        bounds = fetch_one(
+            f"SELECT MIN(Submission_Date) AS First_Date, MAX(Submission_Date) AS Last_Date FROM {rollup['source']}"
+        )
+        if not bounds or bounds["Last_Date"] is None:
+            return {"rollup": name, "rows_written": 0, "days": 0}
+
+        watermark = get_watermark(name)
+        if watermark is None:
+            start = _as_date(bounds["First_Date"])
+        else:
+            start = _as_date(watermark) - timedelta(days=max(0, late_days))
+        end = _as_date(bounds["Last_Date"])
+
+        rows_written = backfill_rollup(name, start, end)
+        _set_watermark(name, bounds["Last_Date"], rows_written)
+    except Exception as e:
+        log_error(e, "Database", "refresh_rollup", additional_data={"rollup": name})
+        raise
+
+    summary = {
+        "rollup": name,
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "days": (end - start).days + 1,
+        "rows_written": rows_written,
+        "watermark": str(bounds["Last_Date"]),
+    }
+    log_performance("ROLLUP_REFRESH", int((time.time() - start_time) * 1000), additional_data=summary)
+    return summary
+
+
+def check_rollup(name, start, end):
+    """Days in ``start``..``end`` where the rollup's totals differ from the base table.
+
+    Returns one dict per mismatched day with ``Base_<measure>`` and
+    ``Rollup_<measure>`` values; an empty list means they agree. Rows with
+    no Submission_Date are never rolled up and are not compared.
+    """
+    rollup = ROLLUPS[name]
+    start, end = _as_date(start), _as_date(end) + timedelta(days=1)
+    measures = list(rollup["measures"])
+    base_columns = ", ".join(f"{aggregate} AS {column}" for column, aggregate in rollup["measures"].items())
+    rollup_columns = ", ".join(f"SUM({column}) AS {column}" for column in measures)
+    compared = ", ".join(f"b.{column} AS Base_{column}, r.{column} AS Rollup_{column}" for column in measures)
+    differs = " OR ".join(f"ISNULL(b.{column}, 0) <> ISNULL(r.{column}, 0)" for column in measures)
+    query = f"""
+    WITH base AS (
+        SELECT CAST(Submission_Date AS date) AS Day, {base_columns}
+        FROM {rollup['source']}
+        WHERE Submission_Date >= %s AND Submission_Date < %s
+        GROUP BY CAST(Submission_Date AS date)
+    ), rolled AS (
+        SELECT Rollup_Date AS Day, {rollup_columns}
+        FROM {rollup['table']}
+        WHERE Rollup_Date >= %s AND Rollup_Date < %s
+        GROUP BY Rollup_Date
+    )
+    SELECT COALESCE(b.Day, r.Day) AS Day, {compared}
+    FROM base b
+    FULL OUTER JOIN rolled r ON b.Day = r.Day
+    WHERE b.Day IS NULL OR r.Day IS NULL OR {differs}
+    ORDER BY Day
+    """
+    return fetch(query, (start, end, start, end))
+
+
+def rollup_series(name, measure, granularity="Month", dimension=None, start=None, end=None, ttl=QUERY_CACHE_TTL):
+    """``[{"Period", "Dimension", "Value"}]`` summed from rollup ``name``.
+
+    ``measure`` is one of the rollup's measure columns and ``dimension`` one
+    of its dimension columns (None for a single series). Cached until the
+    rollup is next refreshed in this process, or for ``ttl`` seconds.
+    """
+    rollup = ROLLUPS[name]
+    if measure not in rollup["measures"]:
+        raise ValueError(f"Unknown measure for {name} rollup: {measure}")
+    if dimension is not None and dimension not in rollup["dimensions"]:
+        raise ValueError(f"Unknown dimension for {name} rollup: {dimension}")
+    period = ROLLUP_PERIODS[granularity]
+
+    conditions, params = [], []
+    if start:
+        conditions.append("Rollup_Date >= %s")
+        params.append(_as_date(start))
+    if end:
+        conditions.append("Rollup_Date < %s")
+        params.append(_as_date(end) + timedelta(days=1))
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    group_by = f"{period}, {dimension}" if dimension else period
+    query = f"""
+    SELECT {period} AS Period, {dimension or "'All'"} AS Dimension, SUM({measure}) AS Value
+    FROM {rollup['table']}
+    {where}
+    GROUP BY {group_by}
+    ORDER BY Period
+    """
+    return fetch(query, tuple(params) or None, ttl=ttl)
+
+
+def rollup_date_range(name, ttl=QUERY_CACHE_TTL):
+    """First and last day covered by rollup ``name`` as ``(date, date)``, or ``(None, None)``"""
+    rows = fetch(
+        f"SELECT MIN(Rollup_Date) AS First_Day, MAX(Rollup_Date) AS Last_Day FROM {ROLLUPS[name]['table']}",
+        ttl=ttl,
+    )
+    return (rows[0]["First_Day"], rows[0]["Last_Day"]) if rows else (None, None)
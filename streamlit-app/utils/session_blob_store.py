@@ -0,0 +1,141 @@
+import hashlib
+import os
+import shutil
+import string
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional
+
+import dotenv
+
+dotenv.load_dotenv(Path(__file__).parent.parent / ".env")
+
+
+def _check_token(value: str, kind: str) -> str:
+    if not value or any(c not in string.hexdigits for c in value):
+        raise ValueError(f"Invalid {kind}: {value!r}")
+    return value
+
+
+class SessionBlobStore:
+    """Binary payloads for a browser session, on disk instead of in session state.
+
+    ``put`` writes the bytes under ``root/<session_id>/`` and returns a handle
+    (the SHA-256 of the content) that is cheap to keep in st.session_state.
+    Each session may hold ``session_budget_bytes``; beyond that its least
+    recently used payloads are deleted and ``get`` returns None for them.
+    Session directories untouched for ``max_age_seconds`` are purged, which
+    covers sessions that ended without calling ``release_session``.
+    """
+
+    def __init__(self, root: str, session_budget_bytes: int = 256 * 1024 * 1024,
+                 max_age_seconds: float = 6 * 3600):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.session_budget_bytes = max(1, session_budget_bytes)
+        self.max_age_seconds = max_age_seconds
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._last_purge = 0.0
+        self._stats = {"puts": 0, "gets": 0, "misses": 0, "evictions": 0}
+
+    def put(self, session_id: str, data: bytes) -> str:
+        """Store ``data`` for the session and return its handle"""
+        handle = hashlib.sha256(data).hexdigest()
+        directory = self.root / _check_token(session_id, "session id")
+        path = directory / handle
+        if not path.exists():
+            directory.mkdir(parents=True, exist_ok=True)
+            tmp_path = directory / f"{handle}.{threading.get_ident()}.tmp"
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, path)
+
+        with self._lock:
+            entries = self._sessions.setdefault(session_id, OrderedDict())
+            entries[handle] = len(data)
+            entries.move_to_end(handle)
+            self._stats["puts"] += 1
+            self._evict(session_id, entries)
+        self.purge_stale()
+        return handle
+
+    def get(self, session_id: str, handle: str) -> Optional[bytes]:
+        """Payload for a handle, or None if it was evicted or released"""
+        path = self.root / _check_token(session_id, "session id") / _check_token(handle, "handle")
+        try:
+            data = path.read_bytes()
+        except OSError:
+            with self._lock:
+                self._stats["misses"] += 1
+            return None
+        try:
+            os.utime(path.parent)  # keep an active session from looking stale
+        except OSError:
+            pass
+        with self._lock:
+            self._stats["gets"] += 1
+            entries = self._sessions.get(session_id)
+            if entries is not None and handle in entries:
+                entries.move_to_end(handle)
+        return data
+
+    def release_session(self, session_id: str):
+        """Delete everything stored for the session"""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+        shutil.rmtree(self.root / _check_token(session_id, "session id"), ignore_errors=True)
+
+    def purge_stale(self, force: bool = False):
+        """Remove session directories unused for max_age_seconds (checked at most every few minutes)"""
+        now = time.time()
+        if not force and now - self._last_purge < min(600, self.max_age_seconds):
+            return
+        self._last_purge = now
+        for directory in self.root.iterdir():
+            try:
+                if directory.is_dir() and now - directory.stat().st_mtime > self.max_age_seconds:
+                    with self._lock:
+                        self._sessions.pop(directory.name, None)
+                    shutil.rmtree(directory, ignore_errors=True)
+            except OSError as e:
+                print(f"Warning: Could not purge session blobs in {directory}: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["sessions"] = len(self._sessions)
+            snapshot["bytes"] = sum(sum(entries.values()) for entries in self._sessions.values())
+        return snapshot
+
+    def _evict(self, session_id, entries):
+        """Drop the session's least recently used payloads beyond its budget, keeping the newest"""
+        total = sum(entries.values())
+        while total > self.session_budget_bytes and len(entries) > 1:
+            handle, size = entries.popitem(last=False)
+            total -= size
+            self._stats["evictions"] += 1
+            try:
+                os.remove(self.root / session_id / handle)
+            except OSError:
+                pass
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_session_blob_store() -> SessionBlobStore:
+    """Return the shared store, creating it (and purging stale sessions) on first use"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = SessionBlobStore(
+                    root=os.getenv("SESSION_BLOB_DIR", "session_blobs"),
+                    session_budget_bytes=int(float(os.getenv("SESSION_BLOB_BUDGET_MB", "256")) * 1024 * 1024),
+                    max_age_seconds=float(os.getenv("SESSION_BLOB_MAX_AGE", str(6 * 3600))),
+                )
+                _store.purge_stale(force=True)
+    return _store
@@ -0,0 +1,99 @@
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict
+
+import psutil
+
+
+class SystemMetricsSampler:
+    """Refreshes host and process metrics on a background thread.
+
+    Readers get the latest cached snapshot from :meth:`snapshot` instead of
+    issuing psutil syscalls inline. CPU percent is measured across the sampling
+    interval, which is also more meaningful than the instantaneous value
+    ``psutil.cpu_percent()`` returns when called back to back.
+    """
+
+    def __init__(self, interval: float = 5.0):
+        self.interval = max(0.1, interval)
+        self._process = psutil.Process(os.getpid())
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._snapshot: Dict[str, Any] = {}
+
+        # Prime cpu_percent so the first interval yields a real figure
+        psutil.cpu_percent(interval=None)
+        self._process.cpu_percent(interval=None)
+        self._sample()
+
+        self._thread = threading.Thread(target=self._run, name="system-metrics-sampler", daemon=True)
+        self._thread.start()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._snapshot)
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def _sample(self):
+        try:
+            memory_info = psutil.virtual_memory()
+            process_memory = self._process.memory_info()
+            disk_usage = psutil.disk_usage('/')
+            snapshot = {
+                # Host metrics
+                "memory_total_gb": round(memory_info.total / (1024**3), 2),
+                "memory_available_gb": round(memory_info.available / (1024**3), 2),
+                "memory_used_percent": memory_info.percent,
+                "cpu_usage_percent": psutil.cpu_percent(interval=None),
+                "cpu_count": psutil.cpu_count(),
+                "disk_total_gb": round(disk_usage.total / (1024**3), 2),
+                "disk_free_gb": round(disk_usage.free / (1024**3), 2),
+                "disk_used_percent": round((disk_usage.used / disk_usage.total) * 100, 2),
+
+                # This process
+                "process_rss_mb": round(process_memory.rss / (1024**2), 2),
+                "process_cpu_percent": self._process.cpu_percent(interval=None),
+
+                "sampled_at": datetime.now().isoformat(),
+                "sampled_monotonic": time.monotonic(),
+            }
+        except Exception as e:
+            print(f"Failed to sample system metrics: {e}")
+            return
+        with self._lock:
+            self._snapshot = snapshot
+
+
+_sampler = None
+_sampler_lock = threading.Lock()
+
+
+def get_metrics_sampler() -> SystemMetricsSampler:
+    """Return the shared sampler, starting it on first use.
+
+    The refresh interval comes from SYSTEM_METRICS_INTERVAL (seconds, default 5).
+    """
+    global _sampler
+    if _sampler is None:
+        with _sampler_lock:
+            if _sampler is None:
+                _sampler = SystemMetricsSampler(
+                    interval=float(os.getenv("SYSTEM_METRICS_INTERVAL", "5"))
+                )
+    return _sampler
+
+
+def get_system_metrics() -> Dict[str, Any]:
+    """Latest cached metrics snapshot; empty dict if sampling is unavailable"""
+    try:
+        return get_metrics_sampler().snapshot()
+    except Exception:
+        return {}
@@ -0,0 +1,120 @@
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+import dotenv
+from PIL import Image, ImageOps
+
+dotenv.load_dotenv(Path(__file__).parent.parent / ".env")
+
+
+class ThumbnailCache:
+    """Small JPEG previews keyed by image hash, kept in memory and on disk.
+
+    A preview is generated once per (hash, max_edge); after that reruns read
+    it from the in-memory LRU (bounded by ``max_memory_bytes`` of thumbnail
+    data) or from ``directory`` after a restart, without touching the full
+    image again.
+    """
+
+    def __init__(self, directory: str, max_memory_bytes: int = 32 * 1024 * 1024,
+                 max_edge: int = 512, quality: int = 80):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_memory_bytes = max(0, max_memory_bytes)
+        self.max_edge = max_edge
+        self.quality = quality
+        self._entries = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "generated": 0, "evictions": 0}
+
+    def get(self, image_hash: str, load_image: Callable[[], bytes], max_edge: Optional[int] = None) -> bytes:
+        """Thumbnail bytes for ``image_hash``, calling ``load_image()`` only on a full miss"""
+        max_edge = max_edge or self.max_edge
+        key = f"{image_hash}_{max_edge}"
+        with self._lock:
+            thumbnail = self._entries.get(key)
+            if thumbnail is not None:
+                self._entries.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return thumbnail
+
+        path = self.directory / f"{key}.jpg"
+        try:
+            thumbnail = path.read_bytes()
+            stat = "disk_hits"
+        except OSError:
+            thumbnail = make_thumbnail(load_image(), max_edge, self.quality)
+            try:
+                tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+                tmp_path.write_bytes(thumbnail)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                print(f"Warning: Could not write thumbnail {path}: {e}")
+            stat = "generated"
+
+        with self._lock:
+            self._stats[stat] += 1
+            self._remember(key, thumbnail)
+        return thumbnail
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["memory_entries"] = len(self._entries)
+            snapshot["memory_bytes"] = self._memory_bytes
+        return snapshot
+
+    def _remember(self, key, thumbnail):
+        if len(thumbnail) > self.max_memory_bytes:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._memory_bytes -= len(previous)
+        self._entries[key] = thumbnail
+        self._memory_bytes += len(thumbnail)
+        while self._memory_bytes > self.max_memory_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+            self._stats["evictions"] += 1
+
+
+def make_thumbnail(image_bytes: bytes, max_edge: int, quality: int = 80) -> bytes:
+    """EXIF-oriented JPEG preview no larger than ``max_edge`` on its longest side"""
+    with Image.open(io.BytesIO(image_bytes)) as source:
+        image = ImageOps.exif_transpose(source)
+        image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        buffer = io.BytesIO()
+        image.save(buffer, format="JPEG", quality=quality, optimize=True)
+    return buffer.getvalue()
+
+
+def base64_key(data: str) -> str:
+    """Cache key for a base64 attachment, computed without decoding it"""
+    return hashlib.sha256(data.encode("ascii")).hexdigest()
+
+
+_thumbnails = None
+_thumbnails_lock = threading.Lock()
+
+
+def get_thumbnail_cache() -> ThumbnailCache:
+    """Return the shared thumbnail cache, creating it on first use"""
+    global _thumbnails
+    if _thumbnails is None:
+        with _thumbnails_lock:
+            if _thumbnails is None:
+                _thumbnails = ThumbnailCache(
+                    directory=os.getenv("THUMBNAIL_CACHE_DIR", "thumbnails"),
+                    max_memory_bytes=int(float(os.getenv("THUMBNAIL_CACHE_MEMORY_MB", "32")) * 1024 * 1024),
+                    max_edge=int(os.getenv("THUMBNAIL_MAX_EDGE", "512")),
+                    quality=int(os.getenv("THUMBNAIL_QUALITY", "80")),
+                )
+    return _thumbnails